@@ -10,7 +10,7 @@ from uuid import uuid4
 
 from app.core.containers import Container
 from app.core.config import settings
-from app.db.session import scope, SyncSession
+from app.db.session import scope, AsyncDatabase, SyncSession
 from app.utils import errors_const
 
 
@@ -41,13 +41,34 @@ def commit_and_close_session(func):
         scope.set(str(uuid4()))
         try:
             result = await func(*args, **kwargs)
-            db.session.commit()
+            db.scoped_session.commit()
             return result
         except Exception as e:
-            db.session.rollback()
+            db.scoped_session.rollback()
             raise e
         finally:
             # db.session.expunge_all()
             db.scoped_session.remove()
 
     return wrapper
+
+
+def commit_and_close_async_session(func):
+    """
+        То же, что commit_and_close_session, для роутеров на AsyncRepositoryBase.
+    """
+    @wraps(func)
+    @inject
+    async def wrapper(async_db: AsyncDatabase = Depends(Provide[Container.async_db]), *args, **kwargs,):
+        scope.set(str(uuid4()))
+        try:
+            result = await func(*args, **kwargs)
+            await async_db.scoped_session.commit()
+            return result
+        except Exception as e:
+            await async_db.scoped_session.rollback()
+            raise e
+        finally:
+            await async_db.scoped_session.remove()
+
+    return wrapper
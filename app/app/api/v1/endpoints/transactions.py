@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends
+import datetime
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
 from dependency_injector.wiring import inject, Provide
 
-from app.api.deps import commit_and_close_session, get_current_user
+from app.api.deps import commit_and_close_async_session, get_current_user
 
 from app.core.containers import Container
+from app.models.transactions import CryptoTransaction
+from app.models.wallets import CryptocurrencyType
 
 from app.services.transaction_service import CryptoTransactionService
 
@@ -12,18 +18,34 @@ router = APIRouter()
 
 @router.get('/list')
 @inject
-@commit_and_close_session
+@commit_and_close_async_session
 async def list_transactions(
         # user_id: str,
+        cursor: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=200),
+        cryptocurrency: Optional[CryptocurrencyType] = None,
+        type: Optional[CryptoTransaction.TransactionType] = None,
+        status: Optional[CryptoTransaction.StatusCryptoTransaction] = None,
+        date_from: Optional[datetime.datetime] = None,
+        date_to: Optional[datetime.datetime] = None,
         user_id=Depends(get_current_user),
         transactions_service: CryptoTransactionService = Depends(Provide[Container.crypto_transaction_service])
 ):
-    return await transactions_service.list(user_id=user_id)
+    return await transactions_service.list(
+        user_id=user_id,
+        cursor=cursor,
+        limit=limit,
+        cryptocurrency=cryptocurrency,
+        type=type,
+        status=status,
+        date_from=date_from,
+        date_to=date_to
+    )
 
 
 @router.get('/get/{transaction_id}')
 @inject
-@commit_and_close_session
+@commit_and_close_async_session
 async def get_transaction(
         transaction_id: str,
         user_id=Depends(get_current_user),
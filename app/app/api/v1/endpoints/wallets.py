@@ -1,10 +1,13 @@
-from typing import List
+import datetime
 
-from fastapi import APIRouter, Depends
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
 from dependency_injector.wiring import inject, Provide
 
-from app.api.deps import commit_and_close_session, get_current_user
+from app.api.deps import commit_and_close_async_session, get_current_user
 from app.core.containers import Container
+from app.models.transactions import CryptoTransaction
 
 from app.schemas.wallets import WalletCryptocurrencyOut, WalletGetData
 
@@ -17,7 +20,7 @@ router = APIRouter()
 
 @router.get('/list', response_model=List[WalletCryptocurrencyOut])
 @inject
-@commit_and_close_session
+@commit_and_close_async_session
 async def list_wallets(
         # user_id: str,
         user_id=Depends(get_current_user),
@@ -28,14 +31,26 @@ async def list_wallets(
 
 @router.get('/get/{wallet_id}', response_model=WalletGetData)
 @inject
-@commit_and_close_session
+@commit_and_close_async_session
 async def get_wallet(
         # user_id: str,
         wallet_id: str,
+        cursor: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=200),
+        type: Optional[CryptoTransaction.TransactionType] = None,
+        status: Optional[CryptoTransaction.StatusCryptoTransaction] = None,
+        date_from: Optional[datetime.datetime] = None,
+        date_to: Optional[datetime.datetime] = None,
         user_id=Depends(get_current_user),
         wallet_service: WalletService = Depends(Provide[Container.wallet_service])
 ):
     return await wallet_service.get_wallet(
         user_id=user_id,
-        wallet_id=wallet_id
+        wallet_id=wallet_id,
+        cursor=cursor,
+        limit=limit,
+        type=type,
+        status=status,
+        date_from=date_from,
+        date_to=date_to
     )
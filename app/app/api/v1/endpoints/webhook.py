@@ -1,41 +1,43 @@
 from app.core.containers import (
     Container,
     AlchemyNotify,
-    RepositoryWallet,
-    RepositoryCryptoTransaction,
+    AsyncRepositoryWallet,
+    AsyncRepositoryCryptoTransaction,
     Ethereum,
-    RepositorySettings,
+    AsyncRepositorySettings,
     Erc20Token,
-    RepositoryCryptoWallet
+    AsyncRepositoryCryptoWallet
 )
 from app.models.wallets import CryptocurrencyType, NetworkType
 from app.models.transactions import CryptoTransaction
 from app.core.config import settings
 from dependency_injector.wiring import inject, Provide
 from fastapi import APIRouter, Depends
-from app.api.deps import commit_and_close_session
+from app.api.deps import commit_and_close_async_session
 
 router = APIRouter()
 
 
 @router.post("/erc-20")
 @inject
-@commit_and_close_session
+@commit_and_close_async_session
 async def balance_erc20(
         data: dict,
         alchemy: AlchemyNotify = Depends(Provide[Container.alchemy_api]),
-        rep_crypto_transaction: RepositoryCryptoTransaction = Depends(Provide[Container.repository_crypto_transaction]),
-        rep_wallet: RepositoryWallet = Depends(Provide[Container.repository_wallet]),
+        rep_crypto_transaction: AsyncRepositoryCryptoTransaction = Depends(
+            Provide[Container.async_repository_crypto_transaction]
+        ),
+        rep_wallet: AsyncRepositoryWallet = Depends(Provide[Container.async_repository_wallet]),
         ethereum: Ethereum = Depends(Provide[Container.ethereum_service]),
-        rep_settings: RepositorySettings = Depends(Provide[Container.repository_settings]),
-        rep_crypto_wallet: RepositoryCryptoWallet = Depends(Provide[Container.repository_crypto_wallet]),
+        rep_settings: AsyncRepositorySettings = Depends(Provide[Container.async_repository_settings]),
+        rep_crypto_wallet: AsyncRepositoryCryptoWallet = Depends(Provide[Container.async_repository_crypto_wallet]),
         usdt: Erc20Token = Depends(Provide[Container.usdt_service])
 ):
-    db_settings = rep_settings.get()
+    db_settings = await rep_settings.get()
     gas_price = await ethereum.get_middle_cost_transaction()
 
     for update_balance in await alchemy.get_notify_from_alchemy(data):
-        if rep_crypto_transaction.get(transaction_id=update_balance.hash):
+        if await rep_crypto_transaction.get(transaction_id=update_balance.hash):
             continue
 
         if update_balance.contract.address and ethereum.network.to_checksum_address(update_balance.contract.address) == \
@@ -47,11 +49,17 @@ async def balance_erc20(
 
             value = usdt.to_minimal_part(update_balance.value)
 
-            wallet = rep_wallet.get(address=ethereum.network.to_checksum_address(update_balance.destination_address))
+            wallet = await rep_wallet.get(
+                address=ethereum.network.to_checksum_address(update_balance.destination_address)
+            )
             if wallet:
-                wallet_crypto = rep_crypto_wallet.get(wallet_id=wallet.id, cryptocurrency=CryptocurrencyType.usdt)
-                erc20_gas_estimate = db_settings.erc20_gas_estimate or settings.ERC20_GAS_ESTIMATE
-                waiting_to_up_balance_transaction = rep_crypto_transaction.create({
+                wallet_crypto = await rep_crypto_wallet.get(
+                    wallet_id=wallet.id, cryptocurrency=CryptocurrencyType.usdt
+                )
+                erc20_gas_estimate = db_settings.erc20_gas_estimate or await usdt.get_transfer_gas(
+                    sender_address=wallet.address, destination_address=settings.ERC20_ADDRESS, count=value
+                )
+                waiting_to_up_balance_transaction = await rep_crypto_transaction.create({
                     "network": NetworkType.erc20,
                     "type": CryptoTransaction.TransactionType.in_wallet,
                     "cryptocurrency": CryptocurrencyType.usdt,
@@ -63,19 +71,20 @@ async def balance_erc20(
                     "transaction_id": update_balance.hash
                 })
 
-                transaction_commission = rep_crypto_transaction.create({
+                transaction_commission = await rep_crypto_transaction.create({
                     "network": NetworkType.erc20,
-                    "type": CryptoTransaction.TransactionType.commission,
+                    "type": CryptoTransaction.TransactionType.comission,
                     "cryptocurrency": CryptocurrencyType.ethereum,
-                    "count": (gas_price * erc20_gas_estimate + gas_price * 21000),
+                    "count": (gas_price * erc20_gas_estimate + gas_price * ethereum.TRANSFER_GAS),
                     "gas_price": gas_price,
                     "receive_address": wallet.address,
-                    "wallet_crypto_id": rep_crypto_wallet.get(wallet_id=wallet.id,
-                                                              cryptocurrency=CryptocurrencyType.ethereum).id,
+                    "wallet_crypto_id": (await rep_crypto_wallet.get(
+                        wallet_id=wallet.id, cryptocurrency=CryptocurrencyType.ethereum
+                    )).id,
                     "start_on_transaction_id": waiting_to_up_balance_transaction.id
                 })
 
-                rep_crypto_transaction.create({
+                await rep_crypto_transaction.create({
                     "network": NetworkType.erc20,
                     "cryptocurrency": CryptocurrencyType.usdt,
                     "count": value,
@@ -90,11 +99,15 @@ async def balance_erc20(
             if update_balance.value < db_settings.minimum_ethereum_in:
                 return
             value = ethereum.to_minimal_part(update_balance.value)
-            wallet = rep_wallet.get(address=ethereum.network.to_checksum_address(update_balance.destination_address))
+            wallet = await rep_wallet.get(
+                address=ethereum.network.to_checksum_address(update_balance.destination_address)
+            )
             if wallet:
-                wallet_crypto = rep_crypto_wallet.get(wallet_id=wallet.id, cryptocurrency=CryptocurrencyType.ethereum)
+                wallet_crypto = await rep_crypto_wallet.get(
+                    wallet_id=wallet.id, cryptocurrency=CryptocurrencyType.ethereum
+                )
 
-                waiting_to_up_balance_transaction = rep_crypto_transaction.create({
+                waiting_to_up_balance_transaction = await rep_crypto_transaction.create({
                     "network": NetworkType.erc20,
                     "type": CryptoTransaction.TransactionType.in_wallet,
                     "cryptocurrency": CryptocurrencyType.ethereum,
@@ -105,7 +118,7 @@ async def balance_erc20(
                     "gas_price": gas_price,
                     "transaction_id": update_balance.hash
                 })
-                rep_crypto_transaction.create({
+                await rep_crypto_transaction.create({
                     "network": NetworkType.erc20,
                     "cryptocurrency": CryptocurrencyType.ethereum,
                     "count": value,
@@ -29,6 +29,9 @@ class Settings(BaseSettings):
 
     REDIS_URI: Optional[RedisDsn] = None
 
+    ASYNC_DB_POOL_SIZE: int = 20
+    ASYNC_DB_MAX_OVERFLOW: int = 10
+
     # contract token in system
     USDT_ERC20_ADDRESS_CONTRACT: str
     USDT_ERC20_ABI_CONTRACT: str
@@ -46,25 +49,88 @@ class Settings(BaseSettings):
     TRC20_PUBLIC_KEY: str
     TRC20_PRIVATE_KEY: str
 
+    # HD кошельки: account-level xpub сетей (m/84'/0'/0', m/44'/60'/0', m/44'/195'/0')
+    # и BIP39 seed в hex, нужен только воркеру отправки транзакций
+    HD_WALLET_BITCOIN_XPUB: Optional[str] = None
+    HD_WALLET_ERC20_XPUB: Optional[str] = None
+    HD_WALLET_TRC20_XPUB: Optional[str] = None
+    HD_WALLET_SEED: Optional[str] = None
+
+    # пул заранее сгенерированных депозитных адресов (на сеть), 0 - пул выключен
+    DEPOSIT_ADDRESS_POOL_SIZE: int = 500
+    DEPOSIT_ADDRESS_POOL_LOW_WATERMARK: int = 100
+    DEPOSIT_ADDRESS_POOL_REFILL_INTERVAL: int = 60
+
     # access data
     ALCHEMY_API_URL: str
     ALCHEMY_API_KEY: str
 
     WEBHOOK_ALCHEMY_TOKEN: str
     WEBHOOK_ALCHEMY_URL: str
+    WEBHOOK_ALCHEMY_MAX_ADDRESSES: int = 50000
+    WEBHOOK_ADDRESSES_BATCH_SIZE: int = 500
+    WEBHOOK_ADDRESSES_FLUSH_INTERVAL: int = 10
 
     CHECK_RATES_URL_TOKENS: str # позволяет получить стоимость криптовалюты
 
-    ETHERSCAN_API_URL: str
-    ETHERSCAN_API_TOKEN: str
     ERC20_NETWORK_TYPE: str = "ETH_GOERLI"
+    ERC20_FEE_HISTORY_BLOCKS: int = 20  # окно eth_feeHistory для оценки комиссий EIP-1559
+    # запас газа к максимуму наблюдённых оценок transfer токена (перевод на адрес без токенов дороже ~17k)
+    ERC20_TRANSFER_GAS_HEADROOM: int = 20000
+
+    # локальные nonce горячего кошелька ERC20_ADDRESS (секунды): возврат невыданного резерва,
+    # замена зависшей транзакции с повышенной комиссией и максимум таких замен
+    ERC20_NONCE_RESERVE_TIMEOUT: int = 60
+    ERC20_NONCE_STUCK_TIMEOUT: int = 180
+    ERC20_NONCE_MAX_REPLACEMENTS: int = 5
 
     BLOCK_CYPHER_API_URL: str
     BLOCK_CYPHER_API_TOKEN: str
     BLOCK_CYPHER_API_URL_NETWORK: str
 
+    # сведение пополнений bitcoin в одну транзакцию на BITCOIN_ADDRESS (ставка - sat/vbyte)
+    BTC_CONSOLIDATION_ENABLED: bool = False
+    BTC_CONSOLIDATION_MAX_INPUTS: int = 200
+    BTC_CONSOLIDATION_MAX_FEE_RATE: float = 20
+
     BLOCKCHAIR_API_URL: str
     BLOCK_CHAIR_NETWORK: str
+    BLOCK_CHAIR_CHUNK_SIZE: int = 1000
+    BLOCK_CHAIR_MAX_CONCURRENCY: int = 4
+    BLOCK_CHAIR_CHUNK_RETRIES: int = 3
+    BLOCK_CHAIR_CHUNK_TIMEOUT: float = 60
+
+    # http клиенты к апстримам
+    HTTP_TIMEOUT: float = 30.0
+    HTTP_CONNECT_TIMEOUT: float = 10.0
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    # http2 включается явно в окружении деплоя (нужен пакет h2 из extra httpx[http2])
+    HTTP2_ENABLED: bool = False
+
+    # аренда блокировки воркера (секунды), продлевается пока воркер жив
+    WORKER_LEASE_TTL: int = 60
+    # число шардов сканирования и отправки: beat запускает по подзадаче на шард
+    WORKER_SHARDS: int = 1
+
+    # кеш комиссий сетей (секунды): фоновое обновление и максимальный возраст значения
+    FEE_ORACLE_REFRESH_INTERVAL: int = 15
+    FEE_ORACLE_TTL: int = 60
+
+    # инкрементальное сканирование балансов депозитных адресов (интервалы в секундах)
+    INCREMENTAL_BALANCE_SCAN: bool = True
+    DORMANT_SCAN_BASE_INTERVAL: int = 30
+    DORMANT_SCAN_MAX_INTERVAL: int = 3600
+
+    # ограничения параллельных запросов к апстримам (rate - запросов в секунду)
+    BLOCK_CYPHER_MAX_CONCURRENCY: int = 3
+    BLOCK_CYPHER_RATE_LIMIT: float = 3
+    ERC20_RPC_MAX_CONCURRENCY: int = 20
+    ERC20_RPC_RATE_LIMIT: float = 25
+    ERC20_RPC_BATCH_SIZE: int = 100
+    TRON_MAX_CONCURRENCY: int = 10
+    TRON_RATE_LIMIT: float = 10
 
     @validator("SYNC_SQLALCHEMY_DATABASE_URI", pre=True)
     def assemble_sync_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
@@ -112,6 +178,8 @@ class Settings(BaseSettings):
     USDT_TRC20_CONTRACT_ADDRESS: str
 
     TRONSCAN_URL: str
+    TRONGRID_URL: str = "https://api.trongrid.io"
+    TRONGRID_API_KEY: Optional[str] = None
 
     class Config:
         case_sensitive = True
@@ -1,36 +1,57 @@
 from dependency_injector import containers, providers
-from app.db.session import SyncSession
+from redis import Redis
+from app.db.session import AsyncDatabase, SyncSession
 from app.core.config import Settings
 from app.core.celery import celery_app
+from app.core.http_client import HttpClient
 
-from app.models.wallets import CryptocurrencyWallet, Wallet
-from app.models.webhook_erc20 import WebhookErc20Alchemy
+from app.models.wallets import CryptocurrencyWallet, Wallet, NetworkType
+from app.models.webhook_erc20 import WebhookErc20Alchemy, WebhookAddress
 from app.models.settings import Settings as ModelSettings
 from app.models.users import Users
 from app.models.transactions import CryptoTransaction
-
-from app.repository.wallet import RepositoryWallet, RepositoryCryptoWallet
-from app.repository.transactions import RepositoryCryptoTransaction
-from app.repository.webhoook_erc20 import RepositoryWebhookErc20
-from app.repository.settings import RepositorySettings
-from app.repository.user import RepositoryUser
-
-from app.services.crypto.btc import BlockChairApi, BlockCypherApi, Bitcoin
+from app.models.address_scan_state import AddressScanState
+from app.models.deposit_address import DepositAddress
+from app.models.bitcoin_utxo import BitcoinUtxo
+
+from app.repository.wallet import (
+    RepositoryWallet,
+    RepositoryCryptoWallet,
+    AsyncRepositoryWallet,
+    AsyncRepositoryCryptoWallet
+)
+from app.repository.transactions import RepositoryCryptoTransaction, AsyncRepositoryCryptoTransaction
+from app.repository.webhoook_erc20 import RepositoryWebhookErc20, RepositoryWebhookAddress
+from app.repository.deposit_address import RepositoryDepositAddress
+from app.repository.bitcoin_utxo import RepositoryBitcoinUtxo
+from app.repository.settings import RepositorySettings, AsyncRepositorySettings
+from app.repository.user import RepositoryUser, AsyncRepositoryUser
+from app.repository.address_scan_state import RepositoryAddressScanState
+
+from app.services.crypto.btc import BlockChairApi, BlockCypherApi, Bitcoin, UtxoSet
 from app.services.crypto.erc20 import (
-    EtherscanAPI,
+    FeeHistoryApi,
     AlchemyNotify,
     Erc20Token,
     Erc20Network,
     Ethereum
 )
-from app.services.crypto.trc20 import TRXService, USDTTrc20Service, TRC20Network
+from app.services.crypto.trc20 import TronGridApi, TRXService, USDTTrc20Service, TRC20Network
 
 from app.services.rate import CheckCurrentCryptoCost
+from app.services.balance_scan import BalanceScanService
+from app.services.webhook_registrar import AlchemyWebhookRegistrar
+from app.services.deposit_address_pool import DepositAddressPool
+from app.services.fee_oracle import FeeOracle
+from app.services.nonce_manager import NonceManager
 from app.services.crypto import CryptoService
+from app.services.crypto.hd_wallet import HDWallet
 from app.services.transaction_service import CryptoTransactionService
 from app.services.wallet import WalletService
 
 from app.workers.add_address_to_webhook import AddAddressToWebhookErc20
+from app.workers.refill_deposit_address_pool import RefillDepositAddressPool
+from app.workers.refresh_fees import RefreshFees
 from app.workers.check_transactions import CheckTransaction, SendTransaction
 from app.workers.check_bitcoin_wallets import CheckBitcoinWallet
 from app.workers.check_trc20_wallets import CheckTRC20Wallets
@@ -73,6 +94,13 @@ class Container(containers.DeclarativeContainer):
 
     config = providers.Singleton(Settings)
     db = providers.Singleton(SyncSession, db_url=config.provided.SYNC_SQLALCHEMY_DATABASE_URI)
+    async_db = providers.Singleton(
+        AsyncDatabase,
+        db_url=config.provided.ASYNC_SQLALCHEMY_DATABASE_URI,
+        pool_size=config.provided.ASYNC_DB_POOL_SIZE,
+        max_overflow=config.provided.ASYNC_DB_MAX_OVERFLOW
+    )
+    redis = providers.Singleton(Redis.from_url, url=config.provided.REDIS_URI, decode_responses=True)
 
     repository_user = providers.Singleton(RepositoryUser, model=Users, session=db)
 
@@ -91,49 +119,158 @@ class Container(containers.DeclarativeContainer):
     )
 
     repository_webhook_erc20 = providers.Singleton(RepositoryWebhookErc20, model=WebhookErc20Alchemy, session=db)
+    repository_webhook_address = providers.Singleton(RepositoryWebhookAddress, model=WebhookAddress, session=db)
+    repository_deposit_address = providers.Singleton(RepositoryDepositAddress, model=DepositAddress, session=db)
+    repository_bitcoin_utxo = providers.Singleton(RepositoryBitcoinUtxo, model=BitcoinUtxo, session=db)
+    repository_address_scan_state = providers.Singleton(
+        RepositoryAddressScanState,
+        model=AddressScanState,
+        session=db
+    )
+
+    # репозитории api на asyncpg
+    async_repository_user = providers.Singleton(AsyncRepositoryUser, model=Users, async_db=async_db)
+    async_repository_wallet = providers.Singleton(AsyncRepositoryWallet, model=Wallet, async_db=async_db)
+    async_repository_crypto_wallet = providers.Singleton(
+        AsyncRepositoryCryptoWallet,
+        model=CryptocurrencyWallet,
+        async_db=async_db
+    )
+    async_repository_crypto_transaction = providers.Singleton(
+        AsyncRepositoryCryptoTransaction,
+        model=CryptoTransaction,
+        async_db=async_db
+    )
+    async_repository_settings = providers.Singleton(AsyncRepositorySettings, model=ModelSettings, async_db=async_db)
+
+    # один пул соединений на каждый апстрим
+    http_client = providers.Factory(
+        HttpClient,
+        http2=config.provided.HTTP2_ENABLED,
+        max_connections=config.provided.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.provided.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.provided.HTTP_KEEPALIVE_EXPIRY,
+        timeout=config.provided.HTTP_TIMEOUT,
+        connect_timeout=config.provided.HTTP_CONNECT_TIMEOUT
+    )
+    block_chair_http_client = providers.Singleton(http_client)
+    block_cypher_http_client = providers.Singleton(http_client, http2=False)
+    alchemy_http_client = providers.Singleton(http_client)
+    ethereum_rpc_http_client = providers.Singleton(http_client)
+    tronscan_http_client = providers.Singleton(http_client)
+    trongrid_http_client = providers.Singleton(http_client)
+    rate_http_client = providers.Singleton(http_client)
+
+    http_clients = providers.List(
+        block_chair_http_client,
+        block_cypher_http_client,
+        alchemy_http_client,
+        ethereum_rpc_http_client,
+        tronscan_http_client,
+        trongrid_http_client,
+        rate_http_client
+    )
 
-    trx_service = providers.Factory(TRXService, tronscan_url=config.provided.TRONSCAN_URL)
+    trongrid_api = providers.Factory(
+        TronGridApi,
+        base_url=config.provided.TRONGRID_URL,
+        api_key=config.provided.TRONGRID_API_KEY,
+        http_client=trongrid_http_client,
+        max_concurrency=config.provided.TRON_MAX_CONCURRENCY,
+        rate_limit=config.provided.TRON_RATE_LIMIT
+    )
+    trx_service = providers.Factory(
+        TRXService,
+        tronscan_url=config.provided.TRONSCAN_URL,
+        http_client=tronscan_http_client
+    )
     usdt_trc20_service = providers.Factory(
         USDTTrc20Service,
         usdt_trc20_contract_address=config.provided.USDT_TRC20_CONTRACT_ADDRESS,
-        tronscan_url=config.provided.TRONSCAN_URL
+        tronscan_url=config.provided.TRONSCAN_URL,
+        http_client=tronscan_http_client,
+        trongrid_api=trongrid_api
     )
 
     block_chair_api = providers.Factory(
         BlockChairApi,
         base_url=config.provided.BLOCKCHAIR_API_URL,
-        bitcoin_network=config.provided.BLOCK_CHAIR_NETWORK
+        bitcoin_network=config.provided.BLOCK_CHAIR_NETWORK,
+        http_client=block_chair_http_client,
+        chunk_size=config.provided.BLOCK_CHAIR_CHUNK_SIZE,
+        max_concurrency=config.provided.BLOCK_CHAIR_MAX_CONCURRENCY,
+        chunk_retries=config.provided.BLOCK_CHAIR_CHUNK_RETRIES,
+        chunk_timeout=config.provided.BLOCK_CHAIR_CHUNK_TIMEOUT
     )
     block_cypher_api = providers.Factory(
         BlockCypherApi,
         base_url=config.provided.BLOCK_CYPHER_API_URL,
         api_key=config.provided.BLOCK_CYPHER_API_TOKEN,
-        network=config.provided.BLOCK_CYPHER_API_URL_NETWORK
-    )
-    etherscan_api = providers.Factory(
-        EtherscanAPI,
-        base_url=config.provided.ETHERSCAN_API_URL,
-        api_key=config.provided.ETHERSCAN_API_TOKEN
+        network=config.provided.BLOCK_CYPHER_API_URL_NETWORK,
+        http_client=block_cypher_http_client
     )
     alchemy_api = providers.Factory(
         AlchemyNotify,
         base_url=config.provided.WEBHOOK_ALCHEMY_URL,
-        api_key=config.provided.WEBHOOK_ALCHEMY_TOKEN
+        api_key=config.provided.WEBHOOK_ALCHEMY_TOKEN,
+        http_client=alchemy_http_client
+    )
+    fee_history_api = providers.Factory(
+        FeeHistoryApi,
+        rpc_url=config.provided.ALCHEMY_API_URL,
+        http_client=ethereum_rpc_http_client,
+        block_count=config.provided.ERC20_FEE_HISTORY_BLOCKS
+    )
+    fee_oracle = providers.Singleton(
+        FeeOracle,
+        redis=redis,
+        fee_history_api=fee_history_api,
+        block_cypher_api=block_cypher_api,
+        ttl=config.provided.FEE_ORACLE_TTL
+    )
+    utxo_set = providers.Singleton(
+        UtxoSet,
+        repository_bitcoin_utxo=repository_bitcoin_utxo,
+        block_chair_api=block_chair_api
+    )
+    bitcoin_service = providers.Singleton(
+        Bitcoin,
+        block_cypher_api=block_cypher_api,
+        block_chair_api=block_chair_api,
+        utxo_set=utxo_set,
+        fee_oracle=fee_oracle,
+        network=config.provided.BLOCK_CYPHER_API_URL_NETWORK
+    )
+    nonce_manager = providers.Singleton(
+        NonceManager,
+        redis=redis,
+        addresses=providers.List(config.provided.ERC20_ADDRESS),
+        reserve_timeout=config.provided.ERC20_NONCE_RESERVE_TIMEOUT,
+        stuck_timeout=config.provided.ERC20_NONCE_STUCK_TIMEOUT,
+        max_replacements=config.provided.ERC20_NONCE_MAX_REPLACEMENTS
     )
-    bitcoin_service = providers.Singleton(Bitcoin, block_cypher_api=block_cypher_api, block_chair_api=block_chair_api)
     ethereum_service = providers.Singleton(
-        Ethereum, etherscan_api=etherscan_api,
+        Ethereum,
         alchemy=alchemy_api,
-        ethereum_network_url=config.provided.ALCHEMY_API_URL
+        ethereum_network_url=config.provided.ALCHEMY_API_URL,
+        rpc_http_client=ethereum_rpc_http_client,
+        fee_oracle=fee_oracle,
+        nonce_manager=nonce_manager,
+        rpc_batch_size=config.provided.ERC20_RPC_BATCH_SIZE
     )
     usdt_service = providers.Singleton(
         Erc20Token,
         contract_address=config.provided.USDT_ERC20_ADDRESS_CONTRACT,
         erc20_abi=config.provided.USDT_ERC20_ABI_CONTRACT,
         decimals=6,
-        etherscan_api=etherscan_api,
+        redis=redis,
+        gas_headroom=config.provided.ERC20_TRANSFER_GAS_HEADROOM,
         alchemy=alchemy_api,
-        ethereum_network_url=config.provided.ALCHEMY_API_URL
+        ethereum_network_url=config.provided.ALCHEMY_API_URL,
+        rpc_http_client=ethereum_rpc_http_client,
+        fee_oracle=fee_oracle,
+        nonce_manager=nonce_manager,
+        rpc_batch_size=config.provided.ERC20_RPC_BATCH_SIZE
     )
 
     trc20_network = providers.Singleton(TRC20Network, trx_service=trx_service, usdt_trc20_service=usdt_trc20_service)
@@ -145,73 +282,136 @@ class Container(containers.DeclarativeContainer):
         bitcoin_network=bitcoin_service,
     )
 
+    hd_wallet = providers.Singleton(
+        HDWallet,
+        xpubs=providers.Dict({
+            NetworkType.bitcoin_network: config.provided.HD_WALLET_BITCOIN_XPUB,
+            NetworkType.erc20: config.provided.HD_WALLET_ERC20_XPUB,
+            NetworkType.trc20: config.provided.HD_WALLET_TRC20_XPUB,
+        }),
+        seed=config.provided.HD_WALLET_SEED,
+        bitcoin_network=config.provided.BLOCK_CYPHER_API_URL_NETWORK
+    )
+
     rate_service = providers.Singleton(
         CheckCurrentCryptoCost,
         base_url=config.provided.CHECK_RATES_URL_TOKENS,
+        http_client=rate_http_client
     )
 
     crypto_transaction_service = providers.Singleton(
         CryptoTransactionService,
-        repository_user=repository_user,
-        repository_crypto_wallet=repository_crypto_wallet,
-        repository_crypto_transactions=repository_crypto_transaction
+        repository_user=async_repository_user,
+        repository_crypto_wallet=async_repository_crypto_wallet,
+        repository_crypto_transactions=async_repository_crypto_transaction
+    )
+
+    balance_scan_service = providers.Singleton(
+        BalanceScanService,
+        repository_address_scan_state=repository_address_scan_state,
+        repository_wallet=repository_wallet,
+        enabled=config.provided.INCREMENTAL_BALANCE_SCAN,
+        base_interval=config.provided.DORMANT_SCAN_BASE_INTERVAL,
+        max_interval=config.provided.DORMANT_SCAN_MAX_INTERVAL
     )
 
     check_balance_bitcoin_task = CustomTaskProvider(
         CheckBitcoinWallet,
         session=db,
+        redis=redis,
         bitcoin_service=bitcoin_service,
         repository_wallet=repository_wallet,
         repository_cryptocurrency_wallet=repository_crypto_wallet,
         repository_crypto_transaction=repository_crypto_transaction,
-        repository_settings=repository_settings
+        repository_settings=repository_settings,
+        balance_scan_service=balance_scan_service
     )
 
     check_trc20_wallets_task = CustomTaskProvider(
         CheckTRC20Wallets,
         session=db,
+        redis=redis,
         usdt_trc20_service=usdt_trc20_service,
         repository_wallet=repository_wallet,
         repository_cryptocurrency_wallet=repository_crypto_wallet,
         repository_crypto_transaction=repository_crypto_transaction,
-        repository_settings=repository_settings
+        repository_settings=repository_settings,
+        balance_scan_service=balance_scan_service
     )
 
     send_transaction_task = CustomTaskProvider(
         SendTransaction,
         session=db,
+        redis=redis,
         crypto_service=crypto_service,
         repository_crypto_transaction=repository_crypto_transaction,
-        settings_repository=repository_settings,
-        repository_crypto_wallet=repository_crypto_wallet
+        repository_crypto_wallet=repository_crypto_wallet,
+        hd_wallet=hd_wallet
     )
     check_transaction_task = CustomTaskProvider(
         CheckTransaction,
         session=db,
+        redis=redis,
         repository_crypto_transaction=repository_crypto_transaction,
         repository_cryptocurrency_wallet=repository_crypto_wallet,
-        settings_repository=repository_settings,
         rate_service=rate_service,
         crypto_service=crypto_service,
         repository_user=repository_user
     )
 
-    add_address_to_webhook_erc20_task = CustomTaskProvider(
-        AddAddressToWebhookErc20,
+    webhook_registrar = providers.Singleton(
+        AlchemyWebhookRegistrar,
+        redis=redis,
         repository_webhook_erc20=repository_webhook_erc20,
+        repository_webhook_address=repository_webhook_address,
         alchemy_api=alchemy_api,
+        batch_size=config.provided.WEBHOOK_ADDRESSES_BATCH_SIZE,
+        max_addresses=config.provided.WEBHOOK_ALCHEMY_MAX_ADDRESSES
+    )
+
+    add_address_to_webhook_erc20_task = CustomTaskProvider(
+        AddAddressToWebhookErc20,
+        webhook_registrar=webhook_registrar,
+        session=db
+    )
+
+    deposit_address_pool = providers.Singleton(
+        DepositAddressPool,
+        repository_deposit_address=repository_deposit_address,
+        repository_wallet=repository_wallet,
+        crypto_service=crypto_service,
+        hd_wallet=hd_wallet,
+        webhook_registrar=webhook_registrar,
+        size=config.provided.DEPOSIT_ADDRESS_POOL_SIZE,
+        low_watermark=config.provided.DEPOSIT_ADDRESS_POOL_LOW_WATERMARK
+    )
+
+    refresh_fees_task = CustomTaskProvider(
+        RefreshFees,
+        fee_oracle=fee_oracle,
         session=db
     )
 
+    refill_deposit_address_pool_task = CustomTaskProvider(
+        RefillDepositAddressPool,
+        deposit_address_pool=deposit_address_pool,
+        session=db,
+        redis=redis
+    )
+
     wallet_service = providers.Singleton(
         WalletService,
         repository_cryptocurrency_wallet=repository_crypto_wallet,
         repository_wallet=repository_wallet,
         repository_settings=repository_settings,
         crypto_service=crypto_service,
+        deposit_address_pool=deposit_address_pool,
         repository_crypto_transaction=repository_crypto_transaction,
         add_address_to_webhook_erc20_task=add_address_to_webhook_erc20_task,
-        repository_user=repository_user
+        webhook_registrar=webhook_registrar,
+        repository_user=async_repository_user,
+        async_repository_cryptocurrency_wallet=async_repository_crypto_wallet,
+        async_repository_crypto_transaction=async_repository_crypto_transaction
     )
 
 
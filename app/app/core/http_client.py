@@ -0,0 +1,79 @@
+import asyncio
+from typing import Optional
+
+import httpx
+
+
+class HttpClient:
+    """
+        Пул keep-alive соединений к одному апстриму.
+
+        httpx.AsyncClient привязан к event loop, в котором открыты его соединения,
+        поэтому клиент пересоздаётся, если вызов пришёл из другого loop.
+        В воркере loop один на процесс (WorkerRuntime), и пул живёт между запусками задач.
+    """
+
+    def __init__(
+            self,
+            base_url: str = "",
+            http2: bool = False,
+            max_connections: int = 20,
+            max_keepalive_connections: int = 10,
+            keepalive_expiry: float = 30.0,
+            timeout: float = 30.0,
+            connect_timeout: float = 10.0,
+    ) -> None:
+        self._base_url = base_url
+        self._http2 = http2
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._close_stale_client()
+            self._client = httpx.AsyncClient(
+                base_url=self._base_url,
+                http2=self._http2,
+                limits=self._limits,
+                timeout=self._timeout
+            )
+            self._loop = loop
+        return self._client
+
+    def _close_stale_client(self) -> None:
+        """
+            Соединения старого клиента закрываются в его собственном loop.
+            Если тот loop уже закрыт, его транспорты закрыть нельзя, сокеты освободит сборщик мусора.
+        """
+        if self._client is None or self._client.is_closed or self._loop is None or self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        return await self.client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    async def aclose(self) -> None:
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
@@ -1,6 +1,12 @@
+import asyncio
+
+from typing import Any, Callable
+from weakref import WeakValueDictionary
+
 from loguru import logger
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session, async_sessionmaker, create_async_engine
 from contextvars import ContextVar
 
 scope: ContextVar = ContextVar('db_session_scope')
@@ -13,6 +19,23 @@ def scopefunc():
         logger.info("SCOPE NOT SET")
 
 
+_scope_locks: WeakValueDictionary = WeakValueDictionary()
+
+
+async def run_sync(fn: Callable, *args, **kwargs) -> Any:
+    """
+        Синхронная работа с БД из корутины: выполняется в потоке и не блокирует event loop.
+        Поток получает копию контекста, поэтому работает с сессией scoped_session того же scope.
+        Session не потокобезопасна: вызовы одного scope идут по очереди, разных scope - параллельно.
+    """
+    key = scopefunc()
+    lock = _scope_locks.get(key)
+    if lock is None:
+        lock = _scope_locks[key] = asyncio.Lock()
+    async with lock:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+
 class SyncSession:
 
     def __init__(self, db_url: str, dispose_session: bool = False):
@@ -22,3 +45,30 @@ class SyncSession:
         self.sync_session_factory = sessionmaker(bind=self.sync_engine, autoflush=False, expire_on_commit=False)
         self.scoped_session = scoped_session(self.sync_session_factory, scopefunc=scopefunc)
         self.session = self.scoped_session()
+
+
+class AsyncDatabase:
+    """
+        async engine на asyncpg (ASYNC_SQLALCHEMY_DATABASE_URI).
+        Соединения пула привязаны к event loop, поэтому экземпляр используется только в loop api.
+        scoped_session, как и у SyncSession, привязан к scope запроса (commit_and_close_async_session).
+    """
+
+    def __init__(self, db_url: str, pool_size: int = 20, max_overflow: int = 10):
+        self.db_url = db_url
+        self.async_engine = create_async_engine(
+            self.db_url,
+            pool_pre_ping=True,
+            pool_size=pool_size,
+            max_overflow=max_overflow
+        )
+        self.async_session_factory = async_sessionmaker(
+            bind=self.async_engine,
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False
+        )
+        self.scoped_session = async_scoped_session(self.async_session_factory, scopefunc=scopefunc)
+
+    def session(self) -> AsyncSession:
+        return self.async_session_factory()
@@ -35,4 +35,24 @@ class TransactionError(BaseException):
 
 
 class TooMuchTransfer(BaseException):
-    pass
\ No newline at end of file
+    pass
+
+class LeaseNotAcquired(BaseException):
+    """
+    Блокировку держит другой воркер.
+    """
+    pass
+
+
+class LeaseLost(BaseException):
+    """
+    Аренда блокировки истекла или перешла к другому воркеру.
+    """
+    pass
+
+
+class InvalidCursor(BaseException):
+    """
+    Курсор пагинации не удалось разобрать.
+    """
+    pass
@@ -48,3 +48,10 @@ class InsufficientFundsForGas(Erc20Error, NotEnoughBalance):
     и мы пытаемся отрпавить транзакцию
     """
     pass
+
+
+class WebhookError(Erc20Error):
+    """
+    Возникает, когда alchemy не создал вебхук или не принял адреса.
+    """
+    pass
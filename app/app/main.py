@@ -15,6 +15,7 @@ from app.core.config import settings
 from app.core.containers import Container
 from app.exceptions.base import (
     BaseNotFound,
+    InvalidCursor,
     YouHaveNoRights
 )
 
@@ -37,6 +38,8 @@ def create_app():
         allow_headers=["*"],
     )
     fastapi_app.container = container
+    # несовпадение xpub и seed обнаруживается при старте, а не при первом выводе
+    container.hd_wallet()
 
     fastapi_app.include_router(api.api_router, prefix=settings.API_V1_STR)
     return fastapi_app
@@ -45,6 +48,13 @@ def create_app():
 app = create_app()
 
 
+@app.on_event("shutdown")
+async def close_http_clients():
+    for http_client in app.container.http_clients():
+        await http_client.aclose()
+    await app.container.async_db().async_engine.dispose()
+
+
 @app.exception_handler(BaseNotFound)
 async def custom_http_exception_handler(request, exc):
     print(exc)
@@ -55,3 +65,8 @@ async def custom_http_exception_handler(request, exc):
 async def custom_http_exception_handler(request, exc):
     print(exc)
     return Response(status_code=403, content=str(exc))
+
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_exception_handler(request, exc):
+    return Response(status_code=400, content=str(exc))
@@ -5,6 +5,7 @@ from celery.signals import task_failure
 
 from app.core.celery import celery_app
 from app.core.config import settings
+from app.workers.fan_out import fan_out
 
 
 container = CeleryContainer()
@@ -14,7 +15,26 @@ container.init_resources()
 
 config = container.config.provided()
 
-celery_app.add_periodic_task(30, container.check_balance_bitcoin_task.provided())
-celery_app.add_periodic_task(30, container.send_transaction_task.provided())
-celery_app.add_periodic_task(30, container.check_transaction_task.provided())
-celery_app.add_periodic_task(30, container.check_trc20_wallets_task.provided())
+
+def add_sharded_periodic_task(interval, task):
+    if config.WORKER_SHARDS > 1:
+        celery_app.add_periodic_task(
+            interval, fan_out, args=(task.name, config.WORKER_SHARDS), name=f"{task.name}.fan_out"
+        )
+    else:
+        celery_app.add_periodic_task(interval, task)
+
+
+add_sharded_periodic_task(30, container.check_balance_bitcoin_task.provided())
+add_sharded_periodic_task(30, container.send_transaction_task.provided())
+add_sharded_periodic_task(30, container.check_transaction_task.provided())
+add_sharded_periodic_task(30, container.check_trc20_wallets_task.provided())
+celery_app.add_periodic_task(
+    config.WEBHOOK_ADDRESSES_FLUSH_INTERVAL,
+    container.add_address_to_webhook_erc20_task.provided()
+)
+celery_app.add_periodic_task(
+    config.DEPOSIT_ADDRESS_POOL_REFILL_INTERVAL,
+    container.refill_deposit_address_pool_task.provided()
+)
+celery_app.add_periodic_task(config.FEE_ORACLE_REFRESH_INTERVAL, container.refresh_fees_task.provided())
@@ -2,4 +2,7 @@ from .transactions import CryptoTransaction
 from .users import Users
 from .wallets import Wallet, CryptocurrencyWallet
 from .settings import Settings
-from .webhook_erc20 import WebhookErc20Alchemy
+from .webhook_erc20 import WebhookErc20Alchemy, WebhookAddress
+from .address_scan_state import AddressScanState
+from .deposit_address import DepositAddress
+from .bitcoin_utxo import BitcoinUtxo
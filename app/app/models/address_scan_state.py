@@ -0,0 +1,29 @@
+import datetime
+
+from uuid import uuid4
+
+from app.db.base_class import Base
+from app.models.types.decimals_int import NumericInt
+from app.models.wallets import NetworkType
+
+from sqlalchemy import Column, DateTime, Enum, String, BigInteger, Integer, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+
+
+class AddressScanState(Base):
+    """
+        Последний увиденный баланс адреса, по нему сканеры находят только пополненные адреса.
+    """
+    __tablename__ = "addressscanstates"
+    __table_args__ = (
+        UniqueConstraint("network", "address", name="uq_addressscanstates_network_address"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    network = Column(Enum(NetworkType), nullable=False)
+    address = Column(String, nullable=False)
+    last_balance = Column(NumericInt(precision=30, scale=0), default=0)
+    last_block_height = Column(BigInteger, nullable=True)
+    idle_checks = Column(Integer, default=0)  # сколько проверок подряд баланс не менялся
+    last_checked_at = Column(DateTime, default=datetime.datetime.utcnow)
+    next_check_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
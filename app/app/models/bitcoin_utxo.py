@@ -0,0 +1,27 @@
+import datetime
+
+from uuid import uuid4
+
+from app.db.base_class import Base
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+
+
+class BitcoinUtxo(Base):
+    """
+        Непотраченные выходы bitcoin адресов системы, из них локально собираются транзакции.
+        spent_txid - транзакция, которая потратила выход (пусто - выход свободен).
+    """
+    __tablename__ = "bitcoinutxos"
+    __table_args__ = (
+        UniqueConstraint("txid", "vout", name="uq_bitcoinutxos_txid_vout"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    txid = Column(String, nullable=False)
+    vout = Column(Integer, nullable=False)
+    address = Column(String, nullable=False, index=True)
+    value = Column(BigInteger, nullable=False)
+    spent_txid = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -0,0 +1,29 @@
+import datetime
+
+from uuid import uuid4
+
+from app.db.base_class import Base
+from app.models.wallets import NetworkType
+
+from sqlalchemy import Boolean, Column, DateTime, Enum, Index, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+
+
+class DepositAddress(Base):
+    """
+        Заранее сгенерированный адрес, ожидающий выдачи пользователю.
+        ready - адрес уже отслеживается (erc20 - зарегистрирован в вебхуке alchemy).
+    """
+    __tablename__ = "depositaddresses"
+    __table_args__ = (
+        Index("ix_depositaddresses_network_ready", "network", "ready"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    network = Column(Enum(NetworkType), nullable=False)
+    address = Column(String, nullable=False, unique=True)
+    public_key = Column(String)
+    private_key = Column(String, nullable=True)
+    derivation_index = Column(Integer, nullable=True)
+    ready = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
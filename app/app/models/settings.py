@@ -1,20 +1,12 @@
-import enum
-
 from uuid import uuid4
 
 from app.db.base_class import Base
 from app.models.wallets import CryptocurrencyType
 
-from sqlalchemy import Column, Integer, Enum, Float
+from sqlalchemy import Column, Integer, Float
 from sqlalchemy.dialects.postgresql import UUID
 
 
-class TaskType(enum.Enum):
-    not_working = "not_working"
-    pending = "pending"
-    stoping = "stoping"
-
-
 class Settings(Base):
     __tablename__ = 'settings'
 
@@ -38,11 +30,6 @@ class Settings(Base):
     erc20_gas_estimate = Column(Integer, nullable=True)
     usdt_trc_fee_limit = Column(Integer, nullable=True)
 
-    transaction_active = Column(Enum(TaskType), default=TaskType.not_working)
-    transaction_check_active = Column(Enum(TaskType), default=TaskType.not_working)
-    transaction_bitcoin_wallet_check = Column(Enum(TaskType), default=TaskType.not_working)
-    transaction_trc20_check = Column(Enum(TaskType), default=TaskType.not_working)
-
     def get_commision_for_out(self, cryptocurrency: CryptocurrencyType):
         if cryptocurrency == CryptocurrencyType.bitcoin:
             return self.btc_comission_out_percent
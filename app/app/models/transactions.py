@@ -9,13 +9,32 @@ from app.db.base_class import Base
 from app.models.wallets import NetworkType, CryptocurrencyType
 from app.core.config import settings
 
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, String, Numeric
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Index, String, Numeric, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
 
 class CryptoTransaction(Base):
     __tablename__ = "cryptocurrencytransactions"
+    __table_args__ = (
+        # очередь воркеров отправки и проверки: только незавершённые транзакции
+        Index(
+            "ix_cryptocurrencytransactions_active", "status", "created_at", "id",
+            postgresql_where=text("status IN ('not_send', 'pending')")
+        ),
+        # поиск незавершённого пополнения кошелька
+        Index(
+            "ix_cryptocurrencytransactions_wallet_type_status",
+            "wallet_crypto_id", "type", "status", "cryptocurrency"
+        ),
+        # история кошелька, keyset пагинация по (created_at, id)
+        Index("ix_cryptocurrencytransactions_wallet_created_at", "wallet_crypto_id", "created_at", "id"),
+        # сведённые пополнения bitcoin делят один hash, поэтому уникальность - в пределах кошелька
+        Index(
+            "uq_cryptocurrencytransactions_transaction_id", "transaction_id", "wallet_crypto_id",
+            unique=True, postgresql_where=text("transaction_id IS NOT NULL")
+        ),
+    )
 
     class TransactionType(enum.Enum):
         out_system = "out"  # вывод денег из главного кошелька
@@ -90,6 +109,12 @@ class CryptoTransaction(Base):
             if self.start_on_transaction.type == self.TransactionType.comission:
                 return self.start_on_transaction.gas_price
 
+    @property
+    def funded_fee(self):
+        if self.start_on_transaction:
+            if self.start_on_transaction.type == self.TransactionType.comission:
+                return self.start_on_transaction.count
+
     @property
     def use_transaction_price(self):
         if self.type == self.TransactionType.out_system:
@@ -4,7 +4,7 @@ import enum
 from app.models.types.decimals_int import NumericInt
 from app.db.base_class import Base
 
-from sqlalchemy import Column, Enum, ForeignKey, BigInteger, String
+from sqlalchemy import Column, Enum, ForeignKey, BigInteger, Index, Integer, Sequence, String, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -36,14 +36,27 @@ def get_normal_name(type) -> str:
         return "TRX"
 
 
+# индексы HD деривации выдаются одним nextval на пачку кошельков (RepositoryWallet.next_derivation_indexes)
+derivation_index_seq = Sequence("wallets_derivation_index_seq", start=0, minvalue=0, metadata=Base.metadata)
+
+
 class Wallet(Base):
     __tablename__ = "wallets"
+    __table_args__ = (
+        Index("uq_wallets_address", "address", unique=True),
+        Index("ix_wallets_user_id_network", "user_id", "network"),
+        Index(
+            "uq_wallets_network_derivation_index", "network", "derivation_index",
+            unique=True, postgresql_where=text("derivation_index IS NOT NULL")
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid4)
     network = Column(Enum(NetworkType))
     address = Column(String)
     public_key = Column(String)
-    private_key = Column(String)
+    private_key = Column(String, nullable=True)  # не заполняется у HD кошельков
+    derivation_index = Column(Integer, nullable=True)  # индекс из wallets_derivation_index_seq
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     user = relationship("Users")
 
@@ -53,6 +66,10 @@ class Wallet(Base):
 
 class CryptocurrencyWallet(Base):
     __tablename__ = "tokenwallets"
+    __table_args__ = (
+        Index("ix_tokenwallets_wallet_id_cryptocurrency", "wallet_id", "cryptocurrency"),
+        Index("ix_tokenwallets_user_id", "user_id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid4)
     wallet_id = Column(UUID(as_uuid=True), ForeignKey("wallets.id"))
@@ -2,8 +2,9 @@ from uuid import uuid4
 
 from app.db.base_class import Base
 
-from sqlalchemy import Column, String
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
 
 
 class WebhookErc20Alchemy(Base):
@@ -11,4 +12,13 @@ class WebhookErc20Alchemy(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     webhook_id = Column(String, index=True)
-    address = Column(JSONB, default=[])
+
+
+class WebhookAddress(Base):
+    __tablename__ = "webhook_addresses"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    webhook_id = Column(UUID(as_uuid=True), ForeignKey("webhookerc20alchemies.id", ondelete="CASCADE"), index=True)
+    address = Column(String, unique=True, index=True)  # адрес отслеживается только одним вебхуком
+
+    webhook = relationship("WebhookErc20Alchemy")
@@ -0,0 +1,62 @@
+import datetime
+
+from .base import RepositoryBase, in_shard
+from app.models.address_scan_state import AddressScanState
+from app.models.wallets import Wallet, NetworkType
+
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects.postgresql import insert
+
+
+class RepositoryAddressScanState(RepositoryBase[AddressScanState]):
+
+    def list_due_addresses(
+            self,
+            network: NetworkType,
+            now: datetime.datetime,
+            shard: int = 0,
+            shards: int = 1
+    ) -> list[str]:
+        """
+            Адреса кошельков сети (шарда), у которых ещё нет состояния или подошло время следующей проверки.
+            Кошельки захватываются до конца транзакции, занятые другим запуском пропускаются.
+        """
+        rows = self._session.query(Wallet.address).outerjoin(
+            self._model,
+            and_(self._model.network == Wallet.network, self._model.address == Wallet.address)
+        ).filter(
+            Wallet.network == network,
+            or_(self._model.id.is_(None), self._model.next_check_at <= now),
+            in_shard(Wallet.address, shard, shards)
+        ).with_for_update(skip_locked=True, key_share=True, of=Wallet).all()
+        return [row[0] for row in rows]
+
+    def list_by_addresses(
+            self,
+            network: NetworkType,
+            addresses: list[str],
+            chunk_size: int = 5000
+    ) -> list[AddressScanState]:
+        result = []
+        for start in range(0, len(addresses), chunk_size):
+            result += self._session.query(self._model).filter(
+                self._model.network == network,
+                self._model.address.in_(addresses[start:start + chunk_size])
+            ).all()
+        return result
+
+    def bulk_upsert(self, objs_in: list[dict]) -> None:
+        if not objs_in:
+            return
+        stmt = insert(self._model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self._model.network, self._model.address],
+            set_={
+                "last_balance": stmt.excluded.last_balance,
+                "last_block_height": stmt.excluded.last_block_height,
+                "idle_checks": stmt.excluded.idle_checks,
+                "last_checked_at": stmt.excluded.last_checked_at,
+                "next_check_at": stmt.excluded.next_check_at,
+            }
+        )
+        self._session.execute(stmt, objs_in)
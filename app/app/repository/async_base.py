@@ -0,0 +1,58 @@
+from typing import Generic, List, Optional, Type
+
+from sqlalchemy import insert, select
+
+from .base import ModelType, values_update
+
+
+class AsyncRepositoryBase(Generic[ModelType, ]):
+    """
+        Репозиторий на AsyncSession (asyncpg) с тем же интерфейсом, что и RepositoryBase.
+        Сессия - async_scoped_session запроса, commit выполняет commit_and_close_async_session.
+    """
+
+    def __init__(self, model: Type[ModelType], async_db) -> None:
+        self._model = model
+        self._session = async_db.scoped_session
+
+    def _select(self, *args, **kwargs):
+        return select(self._model).filter(*args).filter_by(**kwargs)
+
+    async def create(self, obj_in) -> ModelType:
+        db_obj = self._model(**dict(obj_in))
+        self._session.add(db_obj)
+        await self._session.flush()
+        return db_obj
+
+    async def bulk_create(self, objs_in: list) -> None:
+        """
+            Один многострочный INSERT без загрузки объектов в сессию.
+        """
+        if not objs_in:
+            return
+        await self._session.execute(insert(self._model), [dict(obj_in) for obj_in in objs_in])
+
+    async def get(self, *args, **kwargs) -> Optional[ModelType]:
+        return (await self._session.scalars(self._select(*args, **kwargs).limit(1))).first()
+
+    async def list(self, *args, **kwargs) -> List[ModelType]:
+        return list(await self._session.scalars(self._select(*args, **kwargs)))
+
+    async def update(self, *, db_obj: ModelType, obj_in) -> ModelType:
+        update_data = obj_in if isinstance(obj_in, dict) else obj_in.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(db_obj, field, value)
+        self._session.add(db_obj)
+        return db_obj
+
+    async def bulk_update(self, mappings: List[dict]) -> None:
+        """
+            Пачка изменений одним UPDATE ... FROM (VALUES ...), как RepositoryBase.bulk_update.
+        """
+        if not mappings:
+            return
+        await self._session.execute(values_update(self._model, mappings))
+
+    async def delete(self, *, db_obj: ModelType) -> None:
+        await self._session.delete(db_obj)
+        await self._session.flush()
@@ -1,14 +1,41 @@
-from typing import Generic, Optional, Type, TypeVar
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import select
+from typing import Generic, List, Optional, Type, TypeVar
+from sqlalchemy import String, cast, column, func, insert, select, true, update, values
 
 ModelType = TypeVar("ModelType")
 
 
+def in_shard(column, shard: int, shards: int):
+    """
+        Условие принадлежности строки шарду: hashtext(column) по модулю shards.
+        Знаковый бит сбрасывается, чтобы остаток был неотрицательным.
+    """
+    if shards <= 1:
+        return true()
+    return func.hashtext(cast(column, String)).op("&")(0x7FFFFFFF) % shards == shard
+
+
+def values_update(model, mappings: List[dict]):
+    """
+        UPDATE ... FROM (VALUES ...) по первичному ключу id: одна команда на всю пачку.
+        Набор полей берётся из первого словаря, значения приводятся к типам колонок таблицы.
+    """
+    table = model.__table__
+    names = list(mappings[0])
+    rows = values(
+        *[column(name, table.c[name].type) for name in names],
+        name="data"
+    ).data([tuple(mapping[name] for name in names) for mapping in mappings])
+    return update(table).where(
+        table.c.id == cast(rows.c.id, table.c.id.type)
+    ).values({
+        name: cast(rows.c[name], table.c[name].type) for name in names if name != "id"
+    })
+
+
 class RepositoryBase(Generic[ModelType, ]):
     def __init__(self, model: Type[ModelType], session) -> None:
         self._model = model
-        self._session = session.session
+        self._session = session.scoped_session
 
     def create(
         self, obj_in, commit=False
@@ -21,6 +48,14 @@ class RepositoryBase(Generic[ModelType, ]):
         #     self._session.commit()
         return db_obj
 
+    def bulk_create(self, objs_in: list) -> None:
+        """
+            Один многострочный INSERT без загрузки объектов в сессию.
+        """
+        if not objs_in:
+            return
+        self._session.execute(insert(self._model), [dict(obj_in) for obj_in in objs_in])
+
     def get(self, *args, **kwargs,) -> Optional[ModelType]:
         return self._session.query(self._model).filter(*args).filter_by(**kwargs).first()
 
@@ -33,20 +68,28 @@ class RepositoryBase(Generic[ModelType, ]):
             db_obj: ModelType,
             obj_in
     ) -> ModelType:
-        obj_data = jsonable_encoder(db_obj)
-        print(jsonable_encoder(db_obj))
+        """
+            Меняет только переданные поля, запись уходит в БД при flush/commit.
+            Границу транзакции задаёт вызывающий (commit_and_close_session, Base.life_cycle).
+        """
         if isinstance(obj_in, dict):
             update_data = obj_in
         else:
             update_data = obj_in.dict(exclude_unset=True)
-        for field in obj_data:
-            if field in update_data:
-                setattr(db_obj, field, update_data[field])
+        for field, value in update_data.items():
+            setattr(db_obj, field, value)
         self._session.add(db_obj)
-        self._session.flush()
-        self._session.commit()
         return db_obj
 
+    def bulk_update(self, mappings: List[dict]) -> None:
+        """
+            Пачка изменений одним UPDATE ... FROM (VALUES ...): в каждом словаре id и одинаковый набор полей.
+            Объекты, уже загруженные в сессию, не обновляются.
+        """
+        if not mappings:
+            return
+        self._session.execute(values_update(self._model, mappings))
+
     def delete(self, *args, db_obj: Optional[ModelType], **kwargs) -> ModelType:
         self._session.delete(db_obj)
         self._session.flush()
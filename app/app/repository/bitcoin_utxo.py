@@ -0,0 +1,44 @@
+from .base import RepositoryBase
+from app.models.bitcoin_utxo import BitcoinUtxo
+
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+
+
+class RepositoryBitcoinUtxo(RepositoryBase[BitcoinUtxo]):
+
+    def list_unspent(self, addresses: list[str]) -> list[BitcoinUtxo]:
+        """
+            Свободные выходы от старых к новым.
+        """
+        return list(self._session.scalars(
+            select(self._model).where(
+                self._model.address.in_(addresses),
+                self._model.spent_txid.is_(None)
+            ).order_by(self._model.created_at, self._model.txid, self._model.vout)
+        ))
+
+    def replace_unspent(self, addresses: list[str], objs_in: list[dict]) -> None:
+        """
+            Синхронизирует выходы адресов с сетью: свободные выходы, которых больше нет в сети, удаляются,
+            новые добавляются. Выходы, уже потраченные нашими транзакциями, остаются потраченными.
+        """
+        outpoints = [(obj_in["txid"], obj_in["vout"]) for obj_in in objs_in]
+        stmt = delete(self._model).where(
+            self._model.address.in_(addresses),
+            self._model.spent_txid.is_(None)
+        )
+        if outpoints:
+            stmt = stmt.where(tuple_(self._model.txid, self._model.vout).not_in(outpoints))
+        self._session.execute(stmt)
+        if objs_in:
+            self._session.execute(insert(self._model).on_conflict_do_nothing(), objs_in)
+
+    def mark_spent(self, outpoints: list[tuple[str, int]], spent_txid: str) -> None:
+        if not outpoints:
+            return
+        self._session.execute(
+            update(self._model).where(
+                tuple_(self._model.txid, self._model.vout).in_(outpoints)
+            ).values(spent_txid=spent_txid)
+        )
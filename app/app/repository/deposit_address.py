@@ -0,0 +1,48 @@
+from typing import Optional
+
+from .base import RepositoryBase
+from app.models.deposit_address import DepositAddress
+from app.models.wallets import NetworkType
+
+from sqlalchemy import delete, func, select, update
+
+
+class RepositoryDepositAddress(RepositoryBase[DepositAddress]):
+
+    def claim(self, network: NetworkType) -> Optional[dict]:
+        """
+            Забирает из пула один готовый адрес сети.
+            SKIP LOCKED - параллельные регистрации получают разные адреса, не дожидаясь друг друга.
+        """
+        claimed_id = select(self._model.id).where(
+            self._model.network == network,
+            self._model.ready.is_(True)
+        ).order_by(self._model.created_at).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+
+        row = self._session.execute(
+            delete(self._model).where(self._model.id == claimed_id).returning(
+                self._model.address,
+                self._model.public_key,
+                self._model.private_key,
+                self._model.derivation_index
+            )
+        ).first()
+        return dict(row._mapping) if row else None
+
+    def count_by_network(self) -> dict[NetworkType, int]:
+        rows = self._session.execute(
+            select(self._model.network, func.count()).group_by(self._model.network)
+        ).all()
+        return dict(rows)
+
+    def list_not_ready_addresses(self, network: NetworkType) -> list[str]:
+        return list(self._session.scalars(
+            select(self._model.address).where(self._model.network == network, self._model.ready.is_(False))
+        ))
+
+    def mark_ready(self, addresses: list[str]) -> None:
+        if not addresses:
+            return
+        self._session.execute(
+            update(self._model).where(self._model.address.in_(addresses)).values(ready=True)
+        )
@@ -1,6 +1,11 @@
 from .base import RepositoryBase
+from .async_base import AsyncRepositoryBase
 from app.models.settings import Settings
 
 
 class RepositorySettings(RepositoryBase[Settings]):
     pass
+
+
+class AsyncRepositorySettings(AsyncRepositoryBase[Settings]):
+    pass
@@ -1,6 +1,14 @@
+import datetime
+
+from typing import List, Optional
+from uuid import UUID
+
 from app.models.transactions import CryptoTransaction
-from .base import RepositoryBase
-from sqlalchemy import or_
+from app.models.wallets import CryptocurrencyType, CryptocurrencyWallet, Wallet
+from .base import RepositoryBase, in_shard
+from .async_base import AsyncRepositoryBase
+from sqlalchemy import String, case, cast, or_, select, true, tuple_
+from sqlalchemy.orm import aliased, contains_eager, joinedload
 
 
 class RepositoryCryptoTransaction(RepositoryBase[CryptoTransaction]):
@@ -12,3 +20,100 @@ class RepositoryCryptoTransaction(RepositoryBase[CryptoTransaction]):
                 self._model.type == CryptoTransaction.TransactionType.out_system
             ), self._model.wallet_crypto_id == wallet_crypto_id
         ).all()
+
+    def _sender_key(self):
+        """
+            Ключ шарда отправки - отправитель (как CryptoTransaction.sender_address): все out_system и comission
+            сети уходят с одного горячего кошелька, in_system - с адреса депозитного кошелька,
+            общего для токен-кошельков сети (eth и usdt). Транзакции одного отправителя попадают в один шард.
+        """
+        return case(
+            (
+                self._model.type.in_([
+                    CryptoTransaction.TransactionType.out_system,
+                    CryptoTransaction.TransactionType.comission
+                ]),
+                cast(self._model.network, String)
+            ),
+            else_=Wallet.address
+        )
+
+    def list_for_send(self, shard: int = 0, shards: int = 1):
+        """
+            Неотправленные транзакции шарда вместе с родителем (start_on_transaction) и кошельком отправителя
+            одним запросом, в порядке создания. Шардируются по отправителю, чтобы порядок отправки
+            с одного адреса соблюдался и между шардами.
+            Строки не блокируются: SendTransaction коммитит после каждой отправки, и блокировка
+            не пережила бы первый commit. От повторной отправки защищает аренда шарда (LeaseLock),
+            а шарды не пересекаются по отправителям.
+        """
+        return self._session.query(self._model).outerjoin(
+            self._model.wallet_crypto
+        ).outerjoin(
+            CryptocurrencyWallet.wallet
+        ).options(
+            contains_eager(self._model.wallet_crypto).contains_eager(CryptocurrencyWallet.wallet)
+        ).filter(
+            self._model.status == CryptoTransaction.StatusCryptoTransaction.not_send,
+            in_shard(self._sender_key(), shard, shards)
+        ).order_by(
+            self._model.created_at, self._model.id
+        ).all()
+
+    def list_pending(self, shard: int = 0, shards: int = 1):
+        return self._session.query(self._model).options(
+            joinedload(self._model.wallet_crypto)
+        ).filter(
+            self._model.status == CryptoTransaction.StatusCryptoTransaction.pending,
+            in_shard(self._model.wallet_crypto_id, shard, shards)
+        ).with_for_update(skip_locked=True, of=self._model).all()
+
+
+class AsyncRepositoryCryptoTransaction(AsyncRepositoryBase[CryptoTransaction]):
+    HISTORY_TYPES = (CryptoTransaction.TransactionType.in_wallet, CryptoTransaction.TransactionType.out_system)
+
+    async def transaction_history(
+            self,
+            user_id: UUID,
+            wallet_crypto_id: Optional[UUID] = None,
+            cryptocurrency: Optional[CryptocurrencyType] = None,
+            type: Optional[CryptoTransaction.TransactionType] = None,
+            status: Optional[CryptoTransaction.StatusCryptoTransaction] = None,
+            date_from: Optional[datetime.datetime] = None,
+            date_to: Optional[datetime.datetime] = None,
+            after: Optional[tuple[datetime.datetime, UUID]] = None,
+            limit: int = 50
+    ) -> List[CryptoTransaction]:
+        """
+            Страница истории пользователя (или одного его кошелька) от новых к старым,
+            after - (created_at, id) последней записи предыдущей страницы.
+            Один запрос: для каждого кошелька пользователя LATERAL подзапрос берёт не больше limit записей
+            по индексу (wallet_crypto_id, created_at, id), затем страницы кошельков сливаются.
+        """
+        filters = [
+            self._model.wallet_crypto_id == CryptocurrencyWallet.id,
+            self._model.type.in_([history_type for history_type in self.HISTORY_TYPES if type in (None, history_type)])
+        ]
+        if status:
+            filters.append(self._model.status == status)
+        if date_from:
+            filters.append(self._model.created_at >= date_from)
+        if date_to:
+            filters.append(self._model.created_at < date_to)
+        if after:
+            filters.append(tuple_(self._model.created_at, self._model.id) < tuple_(*after))
+
+        order_by = (self._model.created_at.desc(), self._model.id.desc())
+        page = aliased(
+            self._model,
+            select(self._model).filter(*filters).order_by(*order_by).limit(limit).lateral("page")
+        )
+        query = select(page).select_from(CryptocurrencyWallet).join(page, true()).filter(
+            CryptocurrencyWallet.user_id == user_id
+        )
+        if wallet_crypto_id:
+            query = query.filter(CryptocurrencyWallet.id == wallet_crypto_id)
+        if cryptocurrency:
+            query = query.filter(CryptocurrencyWallet.cryptocurrency == cryptocurrency)
+        query = query.order_by(page.created_at.desc(), page.id.desc()).limit(limit)
+        return list(await self._session.scalars(query))
@@ -1,6 +1,11 @@
 from app.models.users import Users
 from .base import RepositoryBase
+from .async_base import AsyncRepositoryBase
 
 
 class RepositoryUser(RepositoryBase[Users]):
     pass
+
+
+class AsyncRepositoryUser(AsyncRepositoryBase[Users]):
+    pass
@@ -1,7 +1,10 @@
 from .base import RepositoryBase
-from app.models.wallets import Wallet, CryptocurrencyWallet
-from typing import Optional
-from sqlalchemy.orm import joinedload
+from .async_base import AsyncRepositoryBase
+from app.models.wallets import Wallet, CryptocurrencyWallet, CryptocurrencyType, derivation_index_seq
+from app.models.transactions import CryptoTransaction
+from typing import List, Optional
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import joinedload, contains_eager
 
 from loguru import logger
 
@@ -17,6 +20,16 @@ class RepositoryWallet(RepositoryBase[Wallet]):
     def get_list_addresses(self, *args, **kwargs):
         return self._session.query(self._model.address).filter(*args).filter_by(**kwargs).all()
 
+    def next_derivation_indexes(self, count: int) -> List[int]:
+        """
+            Индексы HD деривации для count новых кошельков одним запросом.
+        """
+        if not count:
+            return []
+        return list(self._session.scalars(
+            select(derivation_index_seq.next_value()).select_from(func.generate_series(1, count))
+        ))
+
 
 class RepositoryCryptoWallet(RepositoryBase[CryptocurrencyWallet]):
 
@@ -36,3 +49,43 @@ class RepositoryCryptoWallet(RepositoryBase[CryptocurrencyWallet]):
         return self._session.query(self._model).options(
             joinedload(self._model.wallet)
         ).filter(self._model.cryptocurrency == cryptocurrency).join(Wallet).filter_by(address=address).first()
+
+    def list_for_deposit_scan(
+            self,
+            addresses: List[str],
+            cryptocurrency: CryptocurrencyType,
+            chunk_size: int = 5000
+    ) -> List[tuple[CryptocurrencyWallet, bool]]:
+        """
+            Токен-кошельки по списку адресов (один запрос на chunk_size адресов)
+            и флаг, есть ли по кошельку неотправленная или ожидающая in_system транзакция.
+        """
+        has_in_system = exists().where(
+            CryptoTransaction.wallet_crypto_id == self._model.id,
+            CryptoTransaction.type == CryptoTransaction.TransactionType.in_system,
+            CryptoTransaction.status.in_([
+                CryptoTransaction.StatusCryptoTransaction.not_send,
+                CryptoTransaction.StatusCryptoTransaction.pending
+            ])
+        ).label("has_in_system")
+
+        result = []
+        for start in range(0, len(addresses), chunk_size):
+            result += self._session.query(self._model, has_in_system).join(self._model.wallet).options(
+                contains_eager(self._model.wallet)
+            ).filter(
+                Wallet.address.in_(addresses[start:start + chunk_size]),
+                self._model.cryptocurrency == cryptocurrency
+            ).all()
+        return result
+
+
+class AsyncRepositoryWallet(AsyncRepositoryBase[Wallet]):
+    pass
+
+
+class AsyncRepositoryCryptoWallet(AsyncRepositoryBase[CryptocurrencyWallet]):
+
+    def _select(self, *args, **kwargs):
+        # схемы кошельков читают wallet, ленивая загрузка в async сессии недоступна
+        return super()._select(*args, **kwargs).options(joinedload(self._model.wallet))
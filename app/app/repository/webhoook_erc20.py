@@ -1,6 +1,51 @@
+from typing import Optional
+from uuid import UUID
+
 from .base import RepositoryBase
-from app.models.webhook_erc20 import WebhookErc20Alchemy
+from app.models.webhook_erc20 import WebhookErc20Alchemy, WebhookAddress
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload
 
 
 class RepositoryWebhookErc20(RepositoryBase[WebhookErc20Alchemy]):
     pass
+
+
+class RepositoryWebhookAddress(RepositoryBase[WebhookAddress]):
+
+    def get_by_address(self, address: str) -> Optional[WebhookAddress]:
+        return self._session.query(self._model).options(
+            joinedload(self._model.webhook)
+        ).filter_by(address=address).first()
+
+    def list_registered(self, addresses: list[str]) -> set[str]:
+        """
+            Какие из переданных адресов уже закреплены за каким-либо вебхуком.
+        """
+        if not addresses:
+            return set()
+        rows = self._session.query(self._model.address).filter(self._model.address.in_(addresses)).all()
+        return {row[0] for row in rows}
+
+    def count_by_webhook(self) -> dict[UUID, int]:
+        rows = self._session.query(self._model.webhook_id, func.count(self._model.id)).group_by(
+            self._model.webhook_id
+        ).all()
+        return {webhook_id: count for webhook_id, count in rows}
+
+    def bulk_add(self, webhook_id: UUID, addresses: list[str]) -> None:
+        if not addresses:
+            return
+        self._session.execute(
+            insert(self._model).on_conflict_do_nothing(index_elements=[self._model.address]),
+            [{"webhook_id": webhook_id, "address": address} for address in addresses]
+        )
+
+    def bulk_remove(self, addresses: list[str]) -> None:
+        if not addresses:
+            return
+        self._session.query(self._model).filter(
+            self._model.address.in_(addresses)
+        ).delete(synchronize_session=False)
@@ -1,6 +1,7 @@
 from uuid import UUID
 
 from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel, validator
 from dependency_injector.wiring import Provide
@@ -43,3 +44,4 @@ class CryptoTransactionHistory(BaseModel):
 class WalletGetData(BaseModel):
     wallet: WalletCryptocurrencyOut
     history: list[CryptoTransactionHistory]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,116 @@
+import datetime
+
+from typing import Iterable, Optional
+
+from app.models.address_scan_state import AddressScanState
+from app.models.wallets import NetworkType, Wallet
+from app.repository.address_scan_state import RepositoryAddressScanState
+from app.repository.base import in_shard
+from app.repository.wallet import RepositoryWallet
+
+
+class BalanceScanService:
+    """
+        Инкрементальное сканирование балансов депозитных адресов.
+
+        Запоминает последний увиденный баланс адреса и отдаёт на создание транзакций
+        только адреса, баланс которых вырос. Адреса без изменений проверяются
+        всё реже: base_interval * 2 ** idle_checks, но не реже max_interval.
+        При enabled=False сканируются все адреса сети на каждом запуске.
+    """
+
+    def __init__(
+            self,
+            repository_address_scan_state: RepositoryAddressScanState,
+            repository_wallet: RepositoryWallet,
+            enabled: bool = True,
+            base_interval: int = 30,
+            max_interval: int = 3600
+    ) -> None:
+        self._repository_address_scan_state = repository_address_scan_state
+        self._repository_wallet = repository_wallet
+        self._enabled = enabled
+        self._base_interval = base_interval
+        self._max_interval = max_interval
+
+    def get_due_addresses(self, network: NetworkType, shard: int = 0, shards: int = 1) -> list[str]:
+        """
+            Адреса шарда: hash(address) % shards == shard.
+        """
+        if not self._enabled:
+            return [
+                wallet[0] for wallet in self._repository_wallet.get_list_addresses(
+                    in_shard(Wallet.address, shard, shards),
+                    network=network
+                )
+            ]
+        return self._repository_address_scan_state.list_due_addresses(
+            network=network,
+            now=datetime.datetime.utcnow(),
+            shard=shard,
+            shards=shards
+        )
+
+    def get_states(self, network: NetworkType, addresses: list[str]) -> dict[str, AddressScanState]:
+        if not self._enabled:
+            return {}
+        return {
+            state.address: state
+            for state in self._repository_address_scan_state.list_by_addresses(network=network, addresses=addresses)
+        }
+
+    @staticmethod
+    def get_grown(balances: dict[str, int], states: dict[str, AddressScanState]) -> dict[str, int]:
+        """
+            Адреса, баланс которых больше последнего увиденного.
+        """
+        return {
+            address: balance for address, balance in balances.items()
+            if balance > (states[address].last_balance if address in states else 0)
+        }
+
+    def save(
+            self,
+            network: NetworkType,
+            balances: dict[str, int],
+            states: dict[str, AddressScanState],
+            block_height: Optional[int] = None,
+            keep_active: Iterable[str] = ()
+    ) -> None:
+        """
+            keep_active - адреса, пополнение которых ещё не выведено (в том числе только что созданные выводы):
+            их баланс не запоминается, и они проверяются на следующем запуске.
+            Если вывод завершится неудачей, баланс останется выше last_balance и get_grown снова его вернёт.
+        """
+        if not self._enabled:
+            return
+
+        now = datetime.datetime.utcnow()
+        keep_active = set(keep_active)
+        rows = []
+        for address, balance in balances.items():
+            state = states.get(address)
+            last_balance = state.last_balance if state else 0
+            idle_checks = (state.idle_checks or 0) if state else 0
+
+            if address in keep_active:
+                balance, idle_checks, next_check_at = last_balance, 0, now
+            elif state is None or balance != last_balance:
+                idle_checks, next_check_at = 0, now + datetime.timedelta(seconds=self._base_interval)
+            else:
+                idle_checks += 1
+                next_check_at = now + datetime.timedelta(
+                    seconds=min(self._base_interval * 2 ** min(idle_checks, 16), self._max_interval)
+                )
+
+            rows.append({
+                "network": network,
+                "address": address,
+                "last_balance": balance,
+                "last_block_height": block_height,
+                "idle_checks": idle_checks,
+                "last_checked_at": now,
+                "next_check_at": next_check_at,
+            })
+
+        self._repository_address_scan_state.bulk_upsert(rows)
@@ -1,6 +1,9 @@
+from contextlib import nullcontext
 from enum import Enum
 from typing import NamedTuple, Optional
 
+from app.utils.rate_limiter import RateLimiter
+
 
 class StatusTransaction(Enum):
     pending = "pending"
@@ -10,7 +13,7 @@ class StatusTransaction(Enum):
 
 class Wallet(NamedTuple):
     public_key: str
-    private_key: str
+    private_key: Optional[str]
     address: str
 
 
@@ -34,13 +37,28 @@ class CryptocurrencyInterface:
             destination_address: str,
             sender_address: str,
             transaction_price: Optional[int] = None,
-            use_transaction_price: bool = True
+            use_transaction_price: bool = True,
+            funded_fee: Optional[int] = None
     ) -> str:
         raise NotImplementedError
 
     async def check_transaction(self, transaction_id: str) -> StatusTransaction:
         raise NotImplementedError
 
+    async def check_transactions(
+            self,
+            transaction_ids: list[str],
+            limiter: Optional[RateLimiter] = None
+    ) -> dict[str, StatusTransaction]:
+        """
+            limiter занимается на каждый запрос к апстриму.
+        """
+        result = {}
+        for transaction_id in transaction_ids:
+            async with limiter or nullcontext():
+                result[transaction_id] = await self.check_transaction(transaction_id)
+        return result
+
     def from_minimal_part(self, count: int) -> float:
         raise NotImplementedError
 
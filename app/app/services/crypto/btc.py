@@ -1,26 +1,77 @@
+import asyncio
+import hashlib
+import math
+import secrets
+import time
+
+import base58
+import httpx
+
+from loguru import logger
 from urllib.parse import urljoin
-from typing import Union, Optional
+from typing import NamedTuple, Union, Optional
 from bitcoin import (
-    der_encode_sig,
-    ecdsa_raw_sign,
-    ecdsa_raw_verify,
-    der_decode_sig
+    N,
+    bin_hash160,
+    compress,
+    privtopub
 )
+from coincurve import PrivateKey
 from app.services.crypto.base import (
     CryptocurrencyInterface, StatusTransaction, Wallet
 )
+from app.services.fee_oracle import FeeOracle, FeeTier
+from app.models.wallets import NetworkType
+from app.repository.bitcoin_utxo import RepositoryBitcoinUtxo
 from app.exceptions import btc_exceptions
-import httpx
+from app.core.http_client import HttpClient
+from app.db.session import run_sync
+from app.utils.bech32 import decode_segwit_v0, encode_segwit_v0
+
+
+class ChunkMetric(NamedTuple):
+    index: int
+    size: int
+    elapsed: float
+    attempts: int
+    success: bool
+    block_height: Optional[int] = None
+
+
+class Utxo(NamedTuple):
+    txid: str
+    vout: int
+    value: int
+    address: str
 
 
 class BlockChairApi:
-    def __init__(self, base_url, bitcoin_network) -> None:
+    # dashboards api принимает не больше 100 адресов в запросе
+    UTXO_CHUNK_SIZE = 100
+    UTXO_LIMIT = 10000
+
+    def __init__(
+            self,
+            base_url,
+            bitcoin_network,
+            http_client: HttpClient,
+            chunk_size: int = 1000,
+            max_concurrency: int = 4,
+            chunk_retries: int = 3,
+            chunk_timeout: float = 60
+    ) -> None:
         self._base_url = base_url
         self._bitcoin_network = bitcoin_network
+        self._http_client = http_client
+        self._chunk_size = chunk_size
+        self._max_concurrency = max_concurrency
+        self._chunk_retries = chunk_retries
+        self._chunk_timeout = chunk_timeout
 
     async def check_balance(
             self,
-            btc_addresses: list[str]) -> dict:
+            btc_addresses: list[str],
+            metrics: Optional[list[ChunkMetric]] = None) -> dict:
         """
         input:
             [
@@ -33,28 +84,97 @@ class BlockChairApi:
                 "address_2": "balance_2"
             }
 
+        Адреса отправляются чанками по chunk_size параллельно (не более max_concurrency запросов).
+        Адреса успешного чанка без баланса возвращаются с 0.
+        Чанк, который не удалось получить после всех попыток, пропускается,
+        если в metrics передан список, в него добавляется ChunkMetric по каждому чанку.
         """
-
+        chunks = [
+            btc_addresses[start:start + self._chunk_size]
+            for start in range(0, len(btc_addresses), self._chunk_size)
+        ]
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        results = await asyncio.gather(*[
+            self._check_balance_chunk(index, chunk, semaphore) for index, chunk in enumerate(chunks)
+        ])
+
+        balances = {}
+        for chunk_balances, metric in results:
+            if metrics is not None:
+                metrics.append(metric)
+            balances.update(chunk_balances)
+
+        if chunks and not any(metric.success for _, metric in results):
+            raise btc_exceptions.BtcNetworkError("BlockChair: не удалось получить балансы ни по одному чанку")
+        return balances
+
+    async def _check_balance_chunk(
+            self,
+            index: int,
+            btc_addresses: list[str],
+            semaphore: asyncio.Semaphore) -> tuple[dict, ChunkMetric]:
         url = urljoin(self._base_url, f"/{self._bitcoin_network}/addresses/balances")
-        send_post_request = await self._post(
-            url,
-            data={'addresses': ",".join(btc_addresses)}
+        async with semaphore:
+            started_at = time.monotonic()
+            for attempt in range(1, self._chunk_retries + 1):
+                try:
+                    response = await self._post(url, data={'addresses': ",".join(btc_addresses)})
+                    response.raise_for_status()
+                    response_data = response.json()
+                    return {**dict.fromkeys(btc_addresses, 0), **response_data['data']}, ChunkMetric(
+                        index=index,
+                        size=len(btc_addresses),
+                        elapsed=time.monotonic() - started_at,
+                        attempts=attempt,
+                        success=True,
+                        block_height=response_data.get('context', {}).get('state')
+                    )
+                except Exception as e:
+                    logger.warning(f"BLOCKCHAIR CHUNK {index} ATTEMPT {attempt} ERROR: {e}")
+                    if attempt < self._chunk_retries:
+                        await asyncio.sleep(2 ** attempt)
+
+        return {}, ChunkMetric(
+            index=index,
+            size=len(btc_addresses),
+            elapsed=time.monotonic() - started_at,
+            attempts=self._chunk_retries,
+            success=False
         )
-        return send_post_request.json()['data']
+
+    async def get_utxos(self, btc_addresses: list[str]) -> list[Utxo]:
+        """
+            Непотраченные выходы адресов, один запрос на UTXO_CHUNK_SIZE адресов.
+        """
+        utxos = []
+        for start in range(0, len(btc_addresses), self.UTXO_CHUNK_SIZE):
+            chunk = btc_addresses[start:start + self.UTXO_CHUNK_SIZE]
+            response = await self._http_client.get(
+                urljoin(self._base_url, f"/{self._bitcoin_network}/dashboards/addresses/{','.join(chunk)}"),
+                params={"limit": f"0,{self.UTXO_LIMIT}"},
+                timeout=self._chunk_timeout
+            )
+            response.raise_for_status()
+            utxos += [
+                Utxo(txid=utxo["transaction_hash"], vout=utxo["index"], value=utxo["value"], address=utxo["address"])
+                for utxo in response.json()["data"]["utxo"]
+            ]
+        return utxos
 
     async def _post(
             self,
             url: str,
-            data: Union[dict, list]) -> Union[list, dict]:
-        res = httpx.post(url, json=data, timeout=60 * 15)
+            data: Union[dict, list]) -> httpx.Response:
+        res = await self._http_client.post(url, json=data, timeout=self._chunk_timeout)
         return res
 
 
 class BlockCypherApi:
-    def __init__(self, base_url, api_key, network) -> None:
+    def __init__(self, base_url, api_key, network, http_client: HttpClient) -> None:
         self._base_url = base_url
         self._api_key = api_key
         self._network = network
+        self._http_client = http_client
 
     def _get_address(self, method: str):
         """
@@ -69,22 +189,6 @@ class BlockCypherApi:
     def _satochi_to_btc(self, satoshi_amount: int) -> float:
         return satoshi_amount / 100_000_000
 
-    async def _create_btc_wallet(self) -> Wallet:
-
-        response = httpx.post(self._get_address("addrs"), headers={}, data={})
-
-        if response.status_code != 201:
-            raise btc_exceptions.WalletDidntCreated(
-                response.text
-            )
-
-        response = response.json()
-        return Wallet(
-            address=response['address'],
-            private_key=response['private'],
-            public_key=response['public'],
-        )
-
     async def _get_transaction_by_hash(
             self,
             hash: str,
@@ -96,7 +200,7 @@ class BlockCypherApi:
             output:
                 - status transaction in current network
         """
-        resp = httpx.get(self._get_address(f"txs/{hash}"))
+        resp = await self._http_client.get(self._get_address(f"txs/{hash}"))
 
         resp_data = resp.json()
 
@@ -108,164 +212,16 @@ class BlockCypherApi:
         else:
             return StatusTransaction.pending
 
-    async def _get_middle_fee(self) -> int:
-
-        resp = httpx.get(self._base_url)
-        resp_data = resp.json()
-        middle_fee = resp_data.get("medium_fee_per_kb")
-        if not middle_fee:
-            raise btc_exceptions.BtcNetworkError(resp.text)
-
-        return middle_fee
-
-    async def _send_transaction(
-            self,
-            sender_address: str,
-            destination_address: str,
-            value_in_satoshi: int,
-            private_key: str,
-            public_key: str,
-            use_transaction_price: bool = True) -> str:
-        """
-            input:
-                sender_address - maker transactions
-                destination_address - taker transactions
-
-            result:
-                - hash new transactions
-        """
-        fees = await self._get_middle_fee()
-
-        if use_transaction_price:
-            price = value_in_satoshi - fees
-        else:
-            price = value_in_satoshi
-
-        privkey_list = []
-        pubkey_list = []
-        try:
-            unsigned_tx = await self._create_unsigned_tx_object(
-                sender_address,
-                destination_address,
-                price,
-                fees=fees
-            )
-        except TypeError:
-            raise btc_exceptions.JSONError(
-                "Not correct data"
-            )
-
-        to_sign_list = unsigned_tx.get("tosign")
-        for _ in range(len(to_sign_list)):
-            privkey_list.append(private_key)
-            pubkey_list.append(public_key)
-
-        # Создаем цифровую подпись
-        try:
-            signature = await self._make_tx_signatures(
-                txs_to_sign=to_sign_list,
-                privkey_list=privkey_list,
-                pubkey_list=pubkey_list,
-                use_prefix=destination_address.startswith('bc1')
-            )
-        except Exception:
-            raise btc_exceptions.SignError(
-                "Произошла ошибка при подписи объекта транзакции"
-            )
-
-        # Отправляем транзакцию в сеть
-        sended_tx = await self._broadcast_signed_transaction(
-            unsigned_tx=unsigned_tx,
-            signatures=signature,
-            pubkeys=pubkey_list,
-            api_key=self.api_key,
-        )
-        return sended_tx
-
-    async def _create_unsigned_tx_object(
-            self,
-            sender_address: str,
-            destination_address: str,
-            value_in_satoshi: int,
-            fees: int
-    ) -> dict:
-
-        data = {
-            "fees": fees,
-            "inputs": [
-                {"addresses": [sender_address]}
-            ],
-            "outputs": [
-                {
-                    "addresses": [destination_address],
-                    "value": value_in_satoshi
-                }
-            ]
-        }
-
-        unsigned_tx = httpx.post(self._get_address("txs/new"), json=data, headers={}).json()
-
-        if unsigned_tx.get("errors"):
-            for error in unsigned_tx.get("errors"):
-                error = error.get("error")
-                if error == f"Unable to find a transaction to spend for address {sender_address}.":
-                    raise btc_exceptions.TXObjectNotCreated(f"{error} Look's like you don't have enough money")
-                if error[:19] == "Not enough funds in":
-                    raise btc_exceptions.NotEnoughFee(error)
-                if error[:22] == "Not enough funds after":
-                    raise btc_exceptions.NotEnoughFee(error)
-                if error == "Error validating generated transaction: Transaction missing input or output.":
-                    raise btc_exceptions.InvalidAddresses(error)
-
-        return unsigned_tx
-
-    async def _make_tx_signatures(
-            self,
-            txs_to_sign: list[str],
-            privkey_list: list[str],
-            pubkey_list: list[str],
-            use_prefix=False) -> list[str]:
+    async def _get_fees(self) -> dict:
         """
-        Loops through txs_to_sign and makes signatures
-        using privkey_list and pubkey_list
-
-        Not sure what privkeys and pubkeys to supply?
-        Use get_input_addresses() to return a list of addresses.
-        Matching those addresses to keys is up to you
-        and how you store your private keys.
-        A future version of this library may handle this for you,
-        but it is not trivial.
-
-        Note that if spending multisig funds the process
-        is significantly more complicated.
-        Each tx_to_sign must be signed by *each* private key.
-        In a 2-of-3 transaction, two of [privkey1, privkey2, privkey3]
-        must sign each tx_to_sign
-
-        http://dev.blockcypher.com/#multisig-transactions
+            low/medium/high_fee_per_kb из информации о сети, satoshi за kb.
         """
+        resp = await self._http_client.get(self._base_url)
+        resp_data = resp.json()
+        if not resp_data.get("medium_fee_per_kb"):
+            raise btc_exceptions.GetFeeError(resp.text)
 
-        signatures = []
-        for cnt, tx_to_sign in enumerate(txs_to_sign):
-            try:
-                sig = der_encode_sig(*ecdsa_raw_sign(
-                    tx_to_sign.rstrip(' \t\r\n\0'), privkey_list[0])
-                                     )
-                err_msg = 'Bad Signature: sig %s for tx %s with pubkey %s' % (
-                    sig,
-                    tx_to_sign,
-                    pubkey_list[0],
-                )
-                assert ecdsa_raw_verify(
-                    tx_to_sign, der_decode_sig(sig), pubkey_list[0]), err_msg
-            except IndexError:
-                continue
-
-            if use_prefix:
-                sig += '01'
-
-            signatures.append(sig)
-        return signatures
+        return resp_data
 
     async def _get_valid_json(self, request, allow_204=False) -> bool:
         """
@@ -284,76 +240,356 @@ class BlockCypherApi:
             msg = 'JSON deserialization failed: {}'.format(str(error))
             raise btc_exceptions.JSONError(msg)
 
-    async def _broadcast_signed_transaction(
-            self,
-            unsigned_tx: dict,
-            signatures: list[str],
-            pubkeys: list[str],
-    ) -> str:
-        '''
-        Broadcasts the transaction from create_unsigned_tx
-        '''
-        data = unsigned_tx.copy()
-        data['signatures'] = signatures
-        data['pubkeys'] = pubkeys
-        params = {'token': self._api_key}
-
-        response = httpx.post(
-            self._get_address("/txs/send"),
-            params=params,
-            json=data,
+    async def _push_raw_transaction(self, tx_hex: str) -> str:
+        """
+            Отправляет в сеть подписанную транзакцию, возвращает её hash.
+        """
+        response = await self._http_client.post(
+            self._get_address("txs/push"),
+            params={'token': self._api_key},
+            json={"tx": tx_hex},
             timeout=10
         )
         response_dict = await self._get_valid_json(response)
-        sender_address = unsigned_tx.get("tx").get("addresses")[0]
-        if response_dict.get("errors"):
-            for error in response_dict.get("errors"):
-                error = error.get("error")
-                if error == f"Unable to find a transaction to spend for address {sender_address}.":
-                    raise btc_exceptions.TXObjectNotCreated(error)
-                if error[:19] == "Not enough funds in":
-                    raise btc_exceptions.NotEnoughFee(error)
-                if error[:22] == "Not enough funds after":
-                    raise btc_exceptions.NotEnoughFee(error)
-                if error == "Error validating generated transaction: Transaction missing input or output.":
-                    raise btc_exceptions.InvalidAddresses(error)
-                if "Couldn't deserialize request: json:" in error:
-                    raise btc_exceptions.InvalidAddresses(error)
-
-        elif error := response_dict.get('error'):
-            if error == f"Unable to find a transaction to spend for address {sender_address}.":
-                raise btc_exceptions.TXObjectNotCreated(error)
-            if error[:19] == "Not enough funds in":
-                raise btc_exceptions.NotEnoughFee(error)
-            if error[:22] == "Not enough funds after":
-                raise btc_exceptions.NotEnoughFee(error)
-            if error == "Error validating generated transaction: Transaction missing input or output.":
-                raise btc_exceptions.InvalidAddresses(error)
-            if "Couldn't deserialize request: json:" in error:
-                raise btc_exceptions.InvalidAddresses(error)
-
+        if error := response_dict.get("error"):
+            raise btc_exceptions.TransactionNotSend(error)
+        if errors := response_dict.get("errors"):
+            raise btc_exceptions.TransactionNotSend("; ".join(error.get("error", "") for error in errors))
         return response_dict.get("tx").get("hash")
 
 
+# виртуальные размеры (vbytes) частей транзакции для оценки комиссии
+TX_OVERHEAD_VSIZE = 11
+P2WPKH_INPUT_VSIZE = 68
+P2PKH_INPUT_VSIZE = 148
+DUST_LIMIT = 546
+
+
+def _sha256d(data: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def _varint(value: int) -> bytes:
+    if value < 0xfd:
+        return value.to_bytes(1, "little")
+    if value <= 0xffff:
+        return b"\xfd" + value.to_bytes(2, "little")
+    if value <= 0xffffffff:
+        return b"\xfe" + value.to_bytes(4, "little")
+    return b"\xff" + value.to_bytes(8, "little")
+
+
+def _push_data(data: bytes) -> bytes:
+    return len(data).to_bytes(1, "little") + data
+
+
+def _p2pkh_script(pubkey_hash: bytes) -> bytes:
+    return b"\x76\xa9\x14" + pubkey_hash + b"\x88\xac"
+
+
+def _output_vsize(script: bytes) -> int:
+    return 8 + len(_varint(len(script))) + len(script)
+
+
+class BitcoinTransactionBuilder:
+    """
+        Сборка и подпись транзакций без апстрима.
+        Входы P2WPKH подписываются по BIP143, P2PKH - legacy sighash, подпись - libsecp256k1 (coincurve).
+    """
+    VERSION = (2).to_bytes(4, "little")
+    SEQUENCE = b"\xff\xff\xff\xfd"
+    LOCKTIME = (0).to_bytes(4, "little")
+    SIGHASH_ALL = 1
+
+    def __init__(self, network: str = "main") -> None:
+        testnet = network.startswith("test")
+        self._hrp = "tb" if testnet else "bc"
+        self._p2pkh_version = 0x6f if testnet else 0x00
+        self._p2sh_version = 0xc4 if testnet else 0x05
+
+    def is_segwit(self, address: str) -> bool:
+        return decode_segwit_v0(self._hrp, address) is not None
+
+    def p2wpkh_address(self, public_key: str) -> str:
+        return encode_segwit_v0(self._hrp, bin_hash160(bytes.fromhex(public_key)))
+
+    def input_vsize(self, address: str) -> int:
+        return P2WPKH_INPUT_VSIZE if self.is_segwit(address) else P2PKH_INPUT_VSIZE
+
+    def address_to_script(self, address: str) -> bytes:
+        if (witness_program := decode_segwit_v0(self._hrp, address)) is not None:
+            return b"\x00" + _push_data(witness_program)
+        try:
+            decoded = base58.b58decode_check(address)
+        except ValueError:
+            raise btc_exceptions.InvalidAddresses(f"Неверный адрес {address}")
+        if len(decoded) == 21 and decoded[0] == self._p2pkh_version:
+            return _p2pkh_script(decoded[1:])
+        if len(decoded) == 21 and decoded[0] == self._p2sh_version:
+            return b"\xa9\x14" + decoded[1:] + b"\x87"
+        raise btc_exceptions.InvalidAddresses(f"Неверный адрес {address}")
+
+    def build(
+            self,
+            inputs: list[Utxo],
+            outputs: list[tuple[bytes, int]],
+            private_keys: dict[str, str]) -> tuple[str, str]:
+        """
+            private_keys - приватный ключ для адреса каждого входа. Возвращает (txid, raw hex).
+        """
+        keys = {address: PrivateKey(bytes.fromhex(private_key)) for address, private_key in private_keys.items()}
+
+        script_sigs, witnesses = [], []
+        for index, utxo in enumerate(inputs):
+            key = keys[utxo.address]
+            public_key = key.public_key.format(compressed=True)
+            script_code = _p2pkh_script(bin_hash160(public_key))
+            if self.is_segwit(utxo.address):
+                sighash = self._segwit_sighash(inputs, outputs, index, script_code)
+                script_sigs.append(b"")
+                witnesses.append([self._sign(key, sighash), public_key])
+            else:
+                sighash = self._legacy_sighash(inputs, outputs, index, script_code)
+                script_sigs.append(_push_data(self._sign(key, sighash)) + _push_data(public_key))
+                witnesses.append([])
+
+        txid = _sha256d(self._serialize(inputs, outputs, script_sigs))[::-1].hex()
+        has_witness = any(witnesses)
+        raw = self._serialize(inputs, outputs, script_sigs, witnesses if has_witness else None)
+        return txid, raw.hex()
+
+    def _sign(self, key: PrivateKey, sighash: bytes) -> bytes:
+        # coincurve отдаёт DER подпись с low-S
+        return key.sign(sighash, hasher=None) + self.SIGHASH_ALL.to_bytes(1, "little")
+
+    @staticmethod
+    def _outpoint(utxo: Utxo) -> bytes:
+        return bytes.fromhex(utxo.txid)[::-1] + utxo.vout.to_bytes(4, "little")
+
+    @staticmethod
+    def _serialize_outputs(outputs: list[tuple[bytes, int]]) -> bytes:
+        return b"".join(value.to_bytes(8, "little") + _varint(len(script)) + script for script, value in outputs)
+
+    def _serialize(
+            self,
+            inputs: list[Utxo],
+            outputs: list[tuple[bytes, int]],
+            script_sigs: list[bytes],
+            witnesses: Optional[list[list[bytes]]] = None) -> bytes:
+        result = self.VERSION
+        if witnesses:
+            result += b"\x00\x01"
+        result += _varint(len(inputs))
+        for utxo, script_sig in zip(inputs, script_sigs):
+            result += self._outpoint(utxo) + _varint(len(script_sig)) + script_sig + self.SEQUENCE
+        result += _varint(len(outputs)) + self._serialize_outputs(outputs)
+        if witnesses:
+            for items in witnesses:
+                result += _varint(len(items)) + b"".join(_varint(len(item)) + item for item in items)
+        return result + self.LOCKTIME
+
+    def _legacy_sighash(
+            self,
+            inputs: list[Utxo],
+            outputs: list[tuple[bytes, int]],
+            index: int,
+            script_code: bytes) -> bytes:
+        script_sigs = [script_code if position == index else b"" for position in range(len(inputs))]
+        return _sha256d(
+            self._serialize(inputs, outputs, script_sigs) + self.SIGHASH_ALL.to_bytes(4, "little")
+        )
+
+    def _segwit_sighash(
+            self,
+            inputs: list[Utxo],
+            outputs: list[tuple[bytes, int]],
+            index: int,
+            script_code: bytes) -> bytes:
+        utxo = inputs[index]
+        preimage = (
+            self.VERSION
+            + _sha256d(b"".join(self._outpoint(item) for item in inputs))
+            + _sha256d(self.SEQUENCE * len(inputs))
+            + self._outpoint(utxo)
+            + _push_data(script_code)
+            + utxo.value.to_bytes(8, "little")
+            + self.SEQUENCE
+            + _sha256d(self._serialize_outputs(outputs))
+            + self.LOCKTIME
+            + self.SIGHASH_ALL.to_bytes(4, "little")
+        )
+        return _sha256d(preimage)
+
+
+class CoinSelection:
+    """
+        Выбор входов транзакции.
+        target - сумма получателю, base_vsize - размер транзакции без входов и сдачи,
+        change_vsize - размер выхода сдачи.
+    """
+
+    def select(
+            self,
+            utxos: list[Utxo],
+            target: int,
+            fee_rate: float,
+            base_vsize: int,
+            change_vsize: int,
+            builder: BitcoinTransactionBuilder) -> list[Utxo]:
+        raise NotImplementedError
+
+
+class LargestFirst(CoinSelection):
+
+    def select(self, utxos, target, fee_rate, base_vsize, change_vsize, builder):
+        selected, total, vsize = [], 0, base_vsize + change_vsize
+        for utxo in sorted(utxos, key=lambda item: item.value, reverse=True):
+            selected.append(utxo)
+            total += utxo.value
+            vsize += builder.input_vsize(utxo.address)
+            if total >= target + math.ceil(fee_rate * vsize):
+                return selected
+        raise btc_exceptions.NotEnoughBalance("Недостаточно непотраченных выходов для отправки")
+
+
+class BranchAndBound(CoinSelection):
+    """
+        Ищет набор входов без сдачи: сумма эффективных значений (за вычетом комиссии входа)
+        попадает в [цель, цель + стоимость сдачи]. Если за max_tries шагов набор не найден - fallback.
+    """
+
+    def __init__(self, max_tries: int = 100_000, fallback: Optional[CoinSelection] = None) -> None:
+        self._max_tries = max_tries
+        self._fallback = fallback or LargestFirst()
+
+    def select(self, utxos, target, fee_rate, base_vsize, change_vsize, builder):
+        candidates = sorted(
+            (
+                (utxo, utxo.value - fee_rate * builder.input_vsize(utxo.address))
+                for utxo in utxos
+            ),
+            key=lambda item: item[1],
+            reverse=True
+        )
+        candidates = [candidate for candidate in candidates if candidate[1] > 0]
+        target_value = target + fee_rate * base_vsize
+        upper_bound = target_value + fee_rate * (change_vsize + P2WPKH_INPUT_VSIZE)
+
+        remaining = [0.0] * (len(candidates) + 1)
+        for index in reversed(range(len(candidates))):
+            remaining[index] = remaining[index + 1] + candidates[index][1]
+
+        selected, total, index = [], 0.0, 0
+        best, best_waste = None, None
+        for _ in range(self._max_tries):
+            if total > upper_bound or total + remaining[index] < target_value:
+                backtrack = True
+            elif total >= target_value:
+                waste = total - target_value
+                if best_waste is None or waste < best_waste:
+                    best, best_waste = list(selected), waste
+                backtrack = True
+            else:
+                backtrack = False
+
+            if backtrack:
+                if not selected:
+                    break
+                index = selected.pop()
+                total -= candidates[index][1]
+                index += 1
+            else:
+                selected.append(index)
+                total += candidates[index][1]
+                index += 1
+
+        if best is None:
+            return self._fallback.select(utxos, target, fee_rate, base_vsize, change_vsize, builder)
+        return [candidates[position][0] for position in best]
+
+
+class UtxoSet:
+    """
+        Отслеживаемые непотраченные выходы адресов системы.
+        Синхронизируется с BlockChair, потраченные входы и сдача отмечаются сразу после отправки.
+    """
+
+    def __init__(self, repository_bitcoin_utxo: RepositoryBitcoinUtxo, block_chair_api: BlockChairApi) -> None:
+        self._repository_bitcoin_utxo = repository_bitcoin_utxo
+        self._block_chair_api = block_chair_api
+
+    async def sync(self, addresses: list[str]) -> None:
+        if not addresses:
+            return
+        utxos = await self._block_chair_api.get_utxos(addresses)
+        await run_sync(self._repository_bitcoin_utxo.replace_unspent, addresses, [utxo._asdict() for utxo in utxos])
+
+    async def list_unspent(self, addresses: list[str]) -> list[Utxo]:
+        return [
+            Utxo(txid=utxo.txid, vout=utxo.vout, value=utxo.value, address=utxo.address)
+            for utxo in await run_sync(self._repository_bitcoin_utxo.list_unspent, addresses)
+        ]
+
+    async def spend(self, inputs: list[Utxo], txid: str, change: Optional[Utxo] = None) -> None:
+        await run_sync(self._spend, inputs, txid, change)
+
+    def _spend(self, inputs: list[Utxo], txid: str, change: Optional[Utxo] = None) -> None:
+        self._repository_bitcoin_utxo.mark_spent([(utxo.txid, utxo.vout) for utxo in inputs], txid)
+        if change:
+            self._repository_bitcoin_utxo.bulk_create([change._asdict()])
+
+
 class Bitcoin(CryptocurrencyInterface):
 
     def __init__(
             self,
             block_chair_api: BlockChairApi,
             block_cypher_api: BlockCypherApi,
+            utxo_set: UtxoSet,
+            fee_oracle: FeeOracle,
+            coin_selection: Optional[CoinSelection] = None,
+            network: str = "main"
     ) -> None:
         self._block_chair_api = block_chair_api
         self._block_cypher_api = block_cypher_api
+        self._utxo_set = utxo_set
+        self._fee_oracle = fee_oracle
+        self._coin_selection = coin_selection or BranchAndBound()
+        self._builder = BitcoinTransactionBuilder(network)
 
     async def create_wallet(self) -> Wallet:
         """
-            Возвращает адресс, приватный и публичный ключ, wif.
-            Возвращаются данные в байтах.
+            Генерирует ключи локально, без запроса в BlockCypher.
+            Возвращает P2WPKH адрес, как и у HD кошелька, приватный ключ и сжатый публичный ключ в hex.
         """
-        return await self._block_cypher_api._create_btc_wallet()
+        private_key = secrets.token_bytes(32)
+        while not 0 < int.from_bytes(private_key, "big") < N:
+            private_key = secrets.token_bytes(32)
 
-    async def get_middle_cost_transaction(self) -> int:
-        return await self._block_cypher_api._get_middle_fee()
+        public_key = compress(privtopub(private_key.hex()))
+        return Wallet(
+            address=self._builder.p2wpkh_address(public_key),
+            private_key=private_key.hex(),
+            public_key=public_key
+        )
+
+    async def get_middle_cost_transaction(self, tier: FeeTier = FeeTier.standard) -> int:
+        return await self._fee_oracle.get(NetworkType.bitcoin_network, tier)
+
+    async def _get_fee_rate(self, tier: FeeTier = FeeTier.standard) -> float:
+        """
+            sat/vbyte.
+        """
+        return await self.get_middle_cost_transaction(tier) / 1000
+
+    async def sync_utxos(self, btc_addresses: list[str]) -> None:
+        await self._utxo_set.sync(btc_addresses)
+
+    async def _select_inputs(
+            self, sender_address: str, count: int, fee_rate: float, base_vsize: int, change_vsize: int
+    ):
+        utxos = await self._utxo_set.list_unspent([sender_address])
+        return self._coin_selection.select(utxos, count, fee_rate, base_vsize, change_vsize, self._builder)
 
     async def send_transaction(
             self,
@@ -363,16 +599,129 @@ class Bitcoin(CryptocurrencyInterface):
             destination_address: str,
             sender_address: str,
             transaction_price: Optional[int] = None,
-            use_transaction_price: bool = True
+            use_transaction_price: bool = True,
+            *_args, **_kwargs
     ) -> str:
-        return await self._block_cypher_api._send_transaction(
-            sender_address=sender_address,
-            destination_address=destination_address,
-            value_in_satoshi=count,
-            private_key=private_key,
-            public_key=public_key,
-            use_transaction_price=use_transaction_price
+        """
+            Транзакция собирается и подписывается локально из отслеживаемых выходов отправителя,
+            в сеть уходит один запрос с raw транзакцией.
+            use_transaction_price - комиссия вычитается из суммы, иначе оплачивается сверх неё.
+        """
+        fee_rate = await self._get_fee_rate()
+        recipient_script = self._builder.address_to_script(destination_address)
+        change_script = self._builder.address_to_script(sender_address)
+        base_vsize = TX_OVERHEAD_VSIZE + _output_vsize(recipient_script)
+        # при вычете комиссии из суммы входы должны покрыть только саму сумму
+        selection_fee_rate = 0 if use_transaction_price else fee_rate
+
+        try:
+            inputs = await self._select_inputs(
+                sender_address, count, selection_fee_rate, base_vsize, _output_vsize(change_script)
+            )
+        except btc_exceptions.NotEnoughBalance:
+            await self._utxo_set.sync([sender_address])
+            inputs = await self._select_inputs(
+                sender_address, count, selection_fee_rate, base_vsize, _output_vsize(change_script)
+            )
+
+        total = sum(utxo.value for utxo in inputs)
+        fee = math.ceil(fee_rate * (base_vsize + sum(self._builder.input_vsize(utxo.address) for utxo in inputs)))
+        amount = count - fee if use_transaction_price else count
+        if amount <= DUST_LIMIT:
+            raise btc_exceptions.NotEnoughFee(f"Сумма {count} не покрывает комиссию {fee}")
+
+        outputs = [(recipient_script, amount)]
+        change = total - amount - fee - math.ceil(fee_rate * _output_vsize(change_script))
+        if change > DUST_LIMIT:
+            outputs.append((change_script, change))
+
+        try:
+            txid, tx_hex = self._builder.build(inputs, outputs, {sender_address: private_key})
+        except ValueError:
+            raise btc_exceptions.SignError("Произошла ошибка при подписи объекта транзакции")
+
+        transaction_hash = await self._block_cypher_api._push_raw_transaction(tx_hex)
+        await self._utxo_set.spend(
+            inputs,
+            transaction_hash,
+            Utxo(txid=txid, vout=1, value=change, address=sender_address) if len(outputs) > 1 else None
         )
+        logger.info(f"BTC TRANSACTION {transaction_hash}: inputs={len(inputs)} fee={fee}")
+        return transaction_hash
+
+    @staticmethod
+    def _select_deposit_utxos(utxos: list[Utxo], amounts: dict[str, int]) -> dict[str, list[Utxo]]:
+        """
+            Для каждого адреса - самые старые выходы, покрывающие amounts[address].
+            Выходы сверх суммы пополнения (пришедшие после сканирования) не трогаются и ждут следующего сканирования.
+            Адрес без достаточных выходов в результат не попадает.
+        """
+        selected = {}
+        for address, amount in amounts.items():
+            address_utxos, total = [], 0
+            for utxo in utxos:
+                if utxo.address != address:
+                    continue
+                if total >= amount:
+                    break
+                address_utxos.append(utxo)
+                total += utxo.value
+            if address_utxos and total >= amount:
+                selected[address] = address_utxos
+        return selected
+
+    async def consolidate(
+            self,
+            private_keys: dict[str, str],
+            amounts: dict[str, int],
+            destination_address: str,
+            max_inputs: int,
+            max_fee_rate: float) -> Optional[tuple[str, dict[str, int]]]:
+        """
+            Сводит пополнения адресов private_keys в одну транзакцию на destination_address.
+            С адреса тратятся только самые старые выходы, покрывающие его пополнение amounts[address],
+            адрес попадает в транзакцию только целиком, пока входов не больше max_inputs.
+            Возвращает (hash, {адрес: потраченная сумма}) или None, если сеть дороже max_fee_rate sat/vbyte.
+            Сведение не срочное, поэтому идёт по медленной ставке.
+        """
+        fee_rate = await self._get_fee_rate(FeeTier.slow)
+        if fee_rate > max_fee_rate:
+            logger.info(f"BTC CONSOLIDATION DEFERRED: fee rate {fee_rate} > {max_fee_rate}")
+            return None
+
+        addresses = list(private_keys)
+        selected = self._select_deposit_utxos(await self._utxo_set.list_unspent(addresses), amounts)
+        missing = [address for address in addresses if address not in selected]
+        if missing:
+            await self._utxo_set.sync(missing)
+            selected = self._select_deposit_utxos(await self._utxo_set.list_unspent(addresses), amounts)
+
+        inputs, included = [], {}
+        for address in addresses:
+            address_utxos = selected.get(address)
+            if address_utxos and len(inputs) + len(address_utxos) <= max_inputs:
+                inputs += address_utxos
+                included[address] = sum(utxo.value for utxo in address_utxos)
+        if not inputs:
+            return None
+
+        script = self._builder.address_to_script(destination_address)
+        fee = math.ceil(fee_rate * (
+            TX_OVERHEAD_VSIZE + _output_vsize(script) + sum(self._builder.input_vsize(utxo.address) for utxo in inputs)
+        ))
+        amount = sum(utxo.value for utxo in inputs) - fee
+        if amount <= DUST_LIMIT:
+            raise btc_exceptions.NotEnoughFee(f"Сумма выходов не покрывает комиссию {fee}")
+
+        try:
+            _, tx_hex = self._builder.build(inputs, [(script, amount)], private_keys)
+        except ValueError:
+            raise btc_exceptions.SignError("Произошла ошибка при подписи объекта транзакции")
+
+        transaction_hash = await self._block_cypher_api._push_raw_transaction(tx_hex)
+        await self._utxo_set.spend(inputs, transaction_hash)
+        logger.info(f"BTC CONSOLIDATION {transaction_hash}: addresses={len(included)} inputs={len(inputs)} fee={fee}")
+        return transaction_hash, included
 
     async def check_transaction(self, transaction_id: str) -> StatusTransaction:
         return await self._block_cypher_api._get_transaction_by_hash(transaction_id)
@@ -385,7 +734,8 @@ class Bitcoin(CryptocurrencyInterface):
             btc_amount=count
         )
 
-    async def check_balances(self, btc_addresses: list[str]) -> dict:
+    async def check_balances(self, btc_addresses: list[str], metrics: Optional[list[ChunkMetric]] = None) -> dict:
         return await self._block_chair_api.check_balance(
-            btc_addresses=btc_addresses
+            btc_addresses=btc_addresses,
+            metrics=metrics
         )
\ No newline at end of file
@@ -1,6 +1,9 @@
-import httpx
+import asyncio
+import math
+import statistics
 
 from binascii import hexlify
+from contextlib import nullcontext
 from urllib.parse import urljoin
 from web3 import Web3 as erc20
 from web3.exceptions import TransactionNotFound
@@ -10,11 +13,17 @@ from app.schemas.alchemy import (
     WebhookAddedAndRemoved,
 )
 
-from app.models.wallets import CryptocurrencyType
+from app.core.http_client import HttpClient
+from app.models.wallets import CryptocurrencyType, NetworkType
 from app.services.crypto.base import StatusTransaction, Wallet, CryptocurrencyInterface
+from app.services.fee_oracle import FeeOracle, FeeTier
+from app.services.nonce_manager import NonceManager
+from app.utils.rate_limiter import RateLimiter
 from enum import Enum
 from app.exceptions import erc20_exceptions
 from typing import Optional
+from loguru import logger
+from redis import Redis
 
 
 class TypeErc20Token(Enum):
@@ -22,37 +31,45 @@ class TypeErc20Token(Enum):
     eth = "eth"
 
 
-class EtherscanAPI:
-    def __init__(self, base_url, api_key) -> None:
-        self.base_url = base_url
-        self.api_key = api_key
-
-    async def get_gas_price(self) -> dict:
-        url = urljoin(
-            base=self.base_url,
-            url=f"api?module=gastracker&action=gasoracle&apikey={self.api_key}"
-        )
-        response = httpx.get(url, timeout=30.0)
-
-        if response.status_code == 200:
-            if response.json().get("result").get("SafeGasPrice"):
-                safe_gas_price, _, _ = (
-                    int(response.json().get("result").get("SafeGasPrice")) / 1_000_000_000,
-                    None,
-                    None
-                )
-
-                return {
-                    "safe_gas_price": safe_gas_price,
-                    "propose_gas_price": None,
-                    "fast_gas_price": None
-                }
+class FeeHistoryApi:
+    """
+        Комиссии EIP-1559 по eth_feeHistory за последние block_count блоков:
+        base fee следующего блока и медиана priority fee блоков окна по каждому перцентилю.
+    """
+    PERCENTILES = (10, 50, 90)
+
+    def __init__(self, rpc_url: str, http_client: HttpClient, block_count: int = 20) -> None:
+        self._rpc_url = rpc_url
+        self._http_client = http_client
+        self._block_count = block_count
+
+    async def get_fees(self) -> tuple[int, list[int]]:
+        response = await self._http_client.post(self._rpc_url, json={
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "eth_feeHistory",
+            "params": [hex(self._block_count), "latest", list(self.PERCENTILES)]
+        })
+        response.raise_for_status()
+        data = response.json()
+        if data.get("error"):
+            raise erc20_exceptions.Erc20Error(f"eth_feeHistory: {data['error']}")
+
+        result = data["result"]
+        rewards = [[int(reward, 16) for reward in block] for block in result.get("reward") or [] if block]
+        priority_fees = [
+            int(statistics.median(block[index] for block in rewards)) if rewards else 0
+            for index in range(len(self.PERCENTILES))
+        ]
+        # последний элемент baseFeePerGas - base fee следующего блока
+        return int(result["baseFeePerGas"][-1], 16), priority_fees
 
 
 class AlchemyNotify:
-    def __init__(self, base_url, api_key) -> None:
+    def __init__(self, base_url, api_key, http_client: HttpClient) -> None:
         self._base_url = base_url
         self._api_key = api_key
+        self._http_client = http_client
 
     async def create_webhook(self, network: str, webhook_type: str, webhook_url: str) -> str:
         url = urljoin(base=self._base_url, url="create-webhook")
@@ -67,7 +84,7 @@ class AlchemyNotify:
             "X-Alchemy-Token": self._api_key,
             "content-type": "application/json"
         }
-        response = httpx.post(url=url, json=payload, headers=headers)
+        response = await self._http_client.post(url, json=payload, headers=headers)
         if response.status_code == 200:
             if response.json().get("data").get("id"):
                 return response.json().get('data').get('id')
@@ -78,7 +95,7 @@ class AlchemyNotify:
             "accept": "application/json",
             "X-Alchemy-Token": self._api_key
         }
-        response = httpx.delete(url=url, headers=headers)
+        response = await self._http_client.delete(url, headers=headers)
         if response.status_code == 200:
             return f"Webhook с ID: {webhook_id} успешно удален!"
 
@@ -90,7 +107,7 @@ class AlchemyNotify:
             "X-Alchemy-Token": self._api_key
         }
 
-        response = httpx.get(url=url, headers=headers)
+        response = await self._http_client.get(url, headers=headers)
         if response.status_code == 200:
             all_data = response.json().get("data")
             webhook_list = []
@@ -123,7 +140,7 @@ class AlchemyNotify:
             "X-Alchemy-Token": self._api_key,
             "content-type": "application/json"
         }
-        response = httpx.patch(url=url, json=payload, headers=headers)
+        response = await self._http_client.patch(url, json=payload, headers=headers)
         print(response.text)
         if response.status_code == 200:
             addresses_dict_with_webhook_id = {
@@ -144,11 +161,151 @@ class AlchemyNotify:
 
 
 class Ethereum(CryptocurrencyInterface):
+    TRANSFER_GAS = 21000
+    # нода принимает замену транзакции с тем же nonce, только если обе цены выросли минимум на 10%
+    REPLACEMENT_FEE_BUMP = 1.125
 
-    def __init__(self, etherscan_api: EtherscanAPI, alchemy: AlchemyNotify, ethereum_network_url: str) -> None:
-        self._etherscan_api = etherscan_api
+    def __init__(
+            self,
+            alchemy: AlchemyNotify,
+            ethereum_network_url: str,
+            rpc_http_client: HttpClient,
+            fee_oracle: FeeOracle,
+            nonce_manager: Optional[NonceManager] = None,
+            rpc_batch_size: int = 100
+    ) -> None:
+        self._fee_oracle = fee_oracle
+        self._nonce_manager = nonce_manager
         self.alchemy = alchemy
+        self._ethereum_network_url = ethereum_network_url
+        self._rpc_http_client = rpc_http_client
+        self._rpc_batch_size = rpc_batch_size
         self.network = erc20(erc20.HTTPProvider(ethereum_network_url))
+        self._chain_id: Optional[int] = None
+
+    async def get_chain_id(self) -> int:
+        if self._chain_id is None:
+            self._chain_id = await asyncio.to_thread(lambda: self.network.eth.chain_id)
+        return self._chain_id
+
+    async def _get_fee_fields(self, tier: FeeTier = FeeTier.standard, max_fee_per_gas: Optional[int] = None) -> dict:
+        """
+            Поля комиссии type-2 транзакции. max_fee_per_gas - потолок, под который уже оплачена комиссия.
+        """
+        estimate = await self._fee_oracle.get_estimate(NetworkType.erc20)
+        priority_fee = getattr(estimate, tier.value)
+        max_fee = max_fee_per_gas or 2 * estimate.base_fee + priority_fee
+        return {
+            "type": 2,
+            "chainId": await self.get_chain_id(),
+            "maxFeePerGas": max_fee,
+            "maxPriorityFeePerGas": min(priority_fee, max_fee),
+        }
+
+    def _is_nonce_managed(self, address: str) -> bool:
+        return bool(self._nonce_manager and self._nonce_manager.manages(address))
+
+    async def _get_nonce(self, sender_address: str) -> int:
+        sender_address = self.network.to_checksum_address(sender_address)
+        if self._is_nonce_managed(sender_address):
+            chain_nonce = None
+            if not self._nonce_manager.is_initialized(sender_address):
+                chain_nonce = await asyncio.to_thread(
+                    self.network.eth.get_transaction_count, sender_address, "pending"
+                )
+            return self._nonce_manager.reserve(sender_address, chain_nonce)
+        return await asyncio.to_thread(self.network.eth.get_transaction_count, sender_address)
+
+    async def _send_raw_transaction(self, transaction: dict, private_key: str) -> str:
+        signed_txn = self.network.eth.account.sign_transaction(transaction, private_key)
+        txn_hash = await asyncio.to_thread(self.network.eth.send_raw_transaction, signed_txn.rawTransaction)
+        return bytes.decode(hexlify(txn_hash))
+
+    @staticmethod
+    def _is_rejected(exc: Exception) -> bool:
+        """
+            Нода ответила ошибкой JSON-RPC - транзакция в сеть не попала. 'already known' - уже в пуле.
+        """
+        return (
+            isinstance(exc, ValueError) and bool(exc.args) and isinstance(exc.args[0], dict)
+            and exc.args[0].get("message") != "already known"
+        )
+
+    async def _sign_and_send(self, transaction: dict, private_key: str, sender_address: str) -> str:
+        """
+            Выданный менеджером nonce освобождается, только если нода отклонила транзакцию.
+            При неоднозначной ошибке (таймаут, обрыв соединения) транзакция могла уйти в сеть:
+            nonce записывается в in-flight под hash подписанной транзакции, и её сверяет sync_nonces -
+            замайненная уберётся, не дошедшая до ноды будет отправлена заново заменой.
+        """
+        if not self._is_nonce_managed(sender_address):
+            return await self._send_raw_transaction(transaction, private_key)
+
+        nonce = transaction["nonce"]
+        try:
+            signed_txn = self.network.eth.account.sign_transaction(transaction, private_key)
+        except Exception:
+            self._nonce_manager.release(sender_address, nonce)
+            raise
+        txn_hash = bytes.decode(hexlify(signed_txn.hash))
+        try:
+            await asyncio.to_thread(self.network.eth.send_raw_transaction, signed_txn.rawTransaction)
+        except Exception as exc:
+            if self._is_rejected(exc):
+                self._nonce_manager.release(sender_address, nonce)
+                raise
+            logger.warning(f"NONCE {sender_address}:{nonce} SEND RESULT UNKNOWN, KEPT IN-FLIGHT: {exc}")
+        self._nonce_manager.confirm(sender_address, nonce, txn_hash, transaction)
+        return txn_hash
+
+    async def sync_nonces(self, private_keys: dict[str, str]) -> dict[str, str]:
+        """
+            Синхронизирует nonce горячих кошельков с сетью и заменяет зависшие транзакции (replace-by-fee).
+            Возвращает {старый hash: новый hash} для записей, чей hash поменялся.
+        """
+        changed = {}
+        for address, private_key in private_keys.items():
+            if not self._is_nonce_managed(address):
+                continue
+            address = self.network.to_checksum_address(address)
+            chain_nonce = await asyncio.to_thread(self.network.eth.get_transaction_count, address, "latest")
+            for record in self._nonce_manager.sync(address, chain_nonce):
+                changed.update(await self._find_mined_replacement(record["transaction_ids"]))
+
+            for nonce, record in self._nonce_manager.list_stuck(address).items():
+                transaction = await self._bump_fees(record["transaction"])
+                try:
+                    txn_hash = await self._send_raw_transaction(transaction, private_key)
+                except (ValueError, TypeError) as exc:
+                    # nonce уже замайнен или замена отклонена - разберётся следующая синхронизация
+                    logger.warning(f"NONCE {address}:{nonce} REPLACEMENT ERROR: {exc}")
+                    continue
+                self._nonce_manager.replace(address, nonce, txn_hash, transaction)
+                changed[record["transaction_ids"][-1]] = txn_hash
+        return changed
+
+    async def _bump_fees(self, transaction: dict) -> dict:
+        fee_fields = await self._get_fee_fields()
+        priority_fee = max(
+            math.ceil(transaction["maxPriorityFeePerGas"] * self.REPLACEMENT_FEE_BUMP),
+            fee_fields["maxPriorityFeePerGas"]
+        )
+        max_fee = max(
+            math.ceil(transaction["maxFeePerGas"] * self.REPLACEMENT_FEE_BUMP),
+            fee_fields["maxFeePerGas"],
+            priority_fee
+        )
+        return {**transaction, "maxFeePerGas": max_fee, "maxPriorityFeePerGas": priority_fee}
+
+    async def _find_mined_replacement(self, transaction_ids: list[str]) -> dict[str, str]:
+        """
+            Из версий одной транзакции в блок попала только одна - не обязательно последняя.
+        """
+        statuses = await self._get_receipts_batch(transaction_ids)
+        for transaction_id in transaction_ids:
+            if statuses[transaction_id] != StatusTransaction.pending and transaction_id != transaction_ids[-1]:
+                return {transaction_ids[-1]: transaction_id}
+        return {}
 
     async def create_wallet(self) -> Wallet:
         acct = self.network.eth.account.create("KEYSMASH FJAFJKLDSKF7JKFDJ 1530")
@@ -158,8 +315,11 @@ class Ethereum(CryptocurrencyInterface):
 
         return Wallet(public_key=address, address=address, private_key=bytes.decode(hexlify(private_key)))
 
-    async def get_middle_cost_transaction(self) -> int:
-        return self.network.to_wei((await self._etherscan_api.get_gas_price()).get('safe_gas_price'), 'ether')
+    async def get_middle_cost_transaction(self, tier: FeeTier = FeeTier.standard) -> int:
+        """
+            Максимальная цена газа type-2 транзакции: 2 * base fee + priority fee.
+        """
+        return (await self._get_fee_fields(tier))["maxFeePerGas"]
 
     async def send_transaction(
             self,
@@ -181,13 +341,7 @@ class Ethereum(CryptocurrencyInterface):
                 use_transaction_price=use_transaction_price
             )
 
-            signed_txn = self.network.eth.account.sign_transaction(
-                transaction_dict=txn,
-                private_key=private_key
-            )
-
-            txn_hash = self.network.eth.send_raw_transaction(signed_txn.rawTransaction)
-            return bytes.decode(hexlify(txn_hash))
+            return await self._sign_and_send(txn, private_key, sender_address)
 
         except (ValueError, TypeError) as exc:
             await self._check_erc20token_exceptions(exc=exc)
@@ -219,7 +373,7 @@ class Ethereum(CryptocurrencyInterface):
 
     async def check_transaction(self, transaction_id: str) -> StatusTransaction:
         try:
-            receipt = self.network.eth.get_transaction_receipt(transaction_id)
+            receipt = await asyncio.to_thread(self.network.eth.get_transaction_receipt, transaction_id)
         except TransactionNotFound:
             return StatusTransaction.pending
 
@@ -228,6 +382,60 @@ class Ethereum(CryptocurrencyInterface):
         else:
             return StatusTransaction.failed
 
+    async def check_transactions(
+            self,
+            transaction_ids: list[str],
+            limiter: Optional[RateLimiter] = None
+    ) -> dict[str, StatusTransaction]:
+        """
+            Статусы транзакций через JSON-RPC batch eth_getTransactionReceipt,
+            по одному запросу на rpc_batch_size хэшей, limiter занимается на каждый batch.
+            Хэши из упавшего batch в результат не попадают, вызывающий считает их pending.
+        """
+        batches = [
+            transaction_ids[start:start + self._rpc_batch_size]
+            for start in range(0, len(transaction_ids), self._rpc_batch_size)
+        ]
+        results = await asyncio.gather(*[
+            self._get_receipts_batch(batch, limiter) for batch in batches
+        ], return_exceptions=True)
+        statuses = {}
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                logger.error(f"ERC20 RECEIPTS BATCH ({len(batch)} transactions) ERROR: {result}")
+            else:
+                statuses.update(result)
+        return statuses
+
+    async def _get_receipts_batch(
+            self,
+            transaction_ids: list[str],
+            limiter: Optional[RateLimiter] = None
+    ) -> dict[str, StatusTransaction]:
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "method": "eth_getTransactionReceipt",
+                "params": [transaction_id if transaction_id.startswith("0x") else f"0x{transaction_id}"]
+            } for request_id, transaction_id in enumerate(transaction_ids)
+        ]
+        async with limiter or nullcontext():
+            response = await self._rpc_http_client.post(self._ethereum_network_url, json=payload)
+        response.raise_for_status()
+
+        result = {}
+        for item in response.json():
+            transaction_id = transaction_ids[item["id"]]
+            receipt = item.get("result")
+            if item.get("error") or not receipt:
+                result[transaction_id] = StatusTransaction.pending
+            elif int(receipt["status"], base=16):
+                result[transaction_id] = StatusTransaction.success
+            else:
+                result[transaction_id] = StatusTransaction.failed
+        return result
+
     def from_minimal_part(self, count: int) -> float:
         return self.network.from_wei(count, 'ether')
 
@@ -241,33 +449,76 @@ class Ethereum(CryptocurrencyInterface):
             value: int,
             gas_price: Optional[int] = None,
             use_transaction_price: bool = True):
-        if not gas_price:
-            gas_price = await self.get_middle_cost_transaction()
-        if (value - gas_price * 21000) <= 0:
+        fee_fields = await self._get_fee_fields(max_fee_per_gas=gas_price)
+        max_fee = fee_fields["maxFeePerGas"] * self.TRANSFER_GAS
+        if (value - max_fee) <= 0:
             raise erc20_exceptions.NotEnoughBalance("Не хватает баланса.")
 
         if use_transaction_price:
-            price = value - gas_price * 21000
+            price = value - max_fee
         else:
             price = value
 
         txn_create = {
-            "nonce": self.network.eth.get_transaction_count(self.network.to_checksum_address(sender_address)),
             "to": self.network.to_checksum_address(destination_address),
             "value": price,
-            "gas": 21000,
-            "gasPrice": gas_price,
+            "gas": self.TRANSFER_GAS,
+            **fee_fields,
+            "nonce": await self._get_nonce(sender_address),
         }
 
         return txn_create
 
 
 class Erc20Token(Ethereum):
-
-    def __init__(self, contract_address: str, erc20_abi: list, decimals: int, *args, **kwargs) -> None:
+    GAS_ESTIMATE_KEY = "erc20:transfer_gas:{contract}"
+
+    MAX_SCRIPT = """
+        local current = tonumber(redis.call('GET', KEYS[1]) or 0)
+        local value = tonumber(ARGV[1])
+        if value > current then
+            redis.call('SET', KEYS[1], value)
+            return value
+        end
+        return current
+    """
+
+    def __init__(
+            self,
+            contract_address: str,
+            erc20_abi: list,
+            decimals: int,
+            redis: Redis,
+            gas_headroom: int = 20000,
+            *args, **kwargs
+    ) -> None:
         super().__init__(*args, **kwargs)
         self.erc20_token_contract = self.network.eth.contract(contract_address, abi=erc20_abi)
         self.decimals = decimals
+        self._redis = redis
+        self._gas_headroom = gas_headroom
+        self._max = redis.register_script(self.MAX_SCRIPT)
+
+    async def get_transfer_gas(self, sender_address: str, destination_address: str, count: int) -> int:
+        """
+            Верхняя граница газа transfer, общая для api и воркеров: максимум наблюдённых eth_estimateGas
+            в redis плюс gas_headroom. Расход зависит от балансов отправителя и получателя,
+            поэтому каждая оценка делается для своей пары адресов и только поднимает максимум.
+        """
+        estimate = await asyncio.to_thread(
+            self.erc20_token_contract.functions.transfer(
+                self.network.to_checksum_address(destination_address), count
+            ).estimate_gas,
+            {"from": self.network.to_checksum_address(sender_address)}
+        )
+        key = self.GAS_ESTIMATE_KEY.format(contract=self.erc20_token_contract.address.lower())
+        return int(self._max(keys=[key], args=[estimate])) + self._gas_headroom
+
+    def gas_from_funded_fee(self, funded_fee: int, gas_price: int) -> int:
+        """
+            Газ, под который оплачена комиссия вывода: вебхук переводит gas_price * (газ + TRANSFER_GAS).
+        """
+        return int(funded_fee) // int(gas_price) - self.TRANSFER_GAS
 
     def from_minimal_part(self, count: int) -> float:
         return count / 10 ** self.decimals
@@ -276,15 +527,18 @@ class Erc20Token(Ethereum):
         normalize_value = count * 10 ** self.decimals
         return int(normalize_value)
 
-    async def _get_dynamic_fee_transaction_erc20(self, sender_address: str, gas_price: Optional[int] = None):
-        if not gas_price:
-            gas_price = await self.get_middle_cost_transaction()
+    async def _get_dynamic_fee_transaction_erc20(
+            self,
+            sender_address: str,
+            destination_address: str,
+            count: int,
+            gas_price: Optional[int] = None,
+            gas: Optional[int] = None):
         txn_create = {
-            "chainId": self.network.eth.chain_id,
             "from": self.network.to_checksum_address(sender_address),
-            "gasPrice": gas_price,
-            # TODO add count gas
-            "nonce": self.network.eth.get_transaction_count(self.network.to_checksum_address(sender_address))
+            "gas": gas or await self.get_transfer_gas(sender_address, destination_address, count),
+            **(await self._get_fee_fields(max_fee_per_gas=gas_price)),
+            "nonce": await self._get_nonce(sender_address),
         }
 
         return txn_create
@@ -296,19 +550,33 @@ class Erc20Token(Ethereum):
             destination_address: str,
             sender_address: str,
             transaction_price: Optional[int] = None,
+            funded_fee: Optional[int] = None,
             *_args, **_kwargs
     ) -> str:
+        """
+            funded_fee - оплаченная комиссия вывода с депозитного адреса: газ берётся ровно тот,
+            под который она рассчитана, а не текущая граница из redis.
+        """
         try:
-            transaction = (await self._get_dynamic_fee_transaction_erc20(sender_address=sender_address,
-                                                                         gas_price=transaction_price))
-            trans = self.erc20_token_contract.functions.transfer(
-                self.network.to_checksum_address(
-                    destination_address
-                ), count
-            ).build_transaction(transaction)
-            signed_txn = self.network.eth.account.sign_transaction(trans, private_key)
-            txn_hash = self.network.eth.send_raw_transaction(signed_txn.rawTransaction)
-            return bytes.decode(hexlify(txn_hash))
+            transaction = await self._get_dynamic_fee_transaction_erc20(
+                sender_address=sender_address,
+                destination_address=destination_address,
+                count=count,
+                gas_price=transaction_price,
+                gas=self.gas_from_funded_fee(funded_fee, transaction_price)
+                if funded_fee and transaction_price else None
+            )
+            try:
+                trans = self.erc20_token_contract.functions.transfer(
+                    self.network.to_checksum_address(
+                        destination_address
+                    ), count
+                ).build_transaction(transaction)
+            except Exception:
+                if self._is_nonce_managed(sender_address):
+                    self._nonce_manager.release(sender_address, transaction["nonce"])
+                raise
+            return await self._sign_and_send(trans, private_key, sender_address)
         except (ValueError, TypeError) as exc:
             await self._check_erc20token_exceptions(exc=exc)
 
@@ -0,0 +1,104 @@
+from functools import lru_cache
+from typing import Optional
+
+import base58
+
+from bitcoin import (
+    bin_hash160,
+    bip32_ckd,
+    bip32_extract_key,
+    bip32_master_key,
+    compress,
+    decompress,
+    privtopub,
+)
+from eth_utils import keccak, to_checksum_address
+
+from app.models.wallets import NetworkType
+from app.services.crypto.base import Wallet
+from app.utils.bech32 import encode_segwit_v0
+
+HARDENED = 2 ** 31
+
+
+class HDWallet:
+    """
+        Детерминированные депозитные адреса (BIP32).
+
+        Адреса выводятся офлайн из account-level xpub каждой сети по индексу:
+            bitcoin  m/84'/0'/0'/0/i  (P2WPKH)
+            erc20    m/44'/60'/0'/0/i
+            trc20    m/44'/195'/0'/0/i
+        Приватный ключ не хранится в БД, а выводится по тому же пути из seed
+        только там, где он нужен для подписи.
+    """
+
+    PATHS = {
+        NetworkType.bitcoin_network: (84, 0),
+        NetworkType.erc20: (44, 60),
+        NetworkType.trc20: (44, 195),
+    }
+
+    def __init__(
+            self,
+            xpubs: dict[NetworkType, Optional[str]],
+            seed: Optional[str] = None,
+            bitcoin_network: str = "main"
+    ) -> None:
+        self._xpubs = {network: xpub for network, xpub in xpubs.items() if xpub}
+        self._seed = seed
+        self._testnet = bitcoin_network.startswith("test")
+        if self._seed:
+            self.verify()
+
+    def verify(self) -> None:
+        """
+            Проверяет, что xpub каждой сети выведен из seed: иначе выдаются адреса,
+            средства с которых вывод не сможет подписать.
+        """
+        for network in self._xpubs:
+            expected = self._build_wallet(network, compress(privtopub(self.derive_private_key(network, 0))))
+            if self.derive_wallet(network, 0).address != expected.address:
+                raise ValueError(f"xpub сети {network.value} не соответствует HD_WALLET_SEED")
+
+    def is_enabled(self, network: NetworkType) -> bool:
+        return network in self._xpubs
+
+    def derive_wallet(self, network: NetworkType, index: int) -> Wallet:
+        public_key = bip32_extract_key(bip32_ckd(self._external_chain(network), index))
+        return self._build_wallet(network, public_key)
+
+    def derive_private_key(self, network: NetworkType, index: int) -> str:
+        if not self._seed:
+            raise ValueError("HD_WALLET_SEED не задан")
+        private_key = bip32_extract_key(bip32_ckd(bip32_ckd(self._account_xprv(network), 0), index))
+        # bip32_extract_key возвращает ключ с суффиксом 01 (сжатый формат)
+        return private_key[:64]
+
+    @lru_cache(maxsize=None)
+    def _external_chain(self, network: NetworkType) -> str:
+        return bip32_ckd(self._xpubs[network], 0)
+
+    @lru_cache(maxsize=None)
+    def _account_xprv(self, network: NetworkType) -> str:
+        purpose, coin_type = self.PATHS[network]
+        if network == NetworkType.bitcoin_network and self._testnet:
+            coin_type = 1
+        key = bip32_master_key(bytes.fromhex(self._seed))
+        for child in (purpose + HARDENED, coin_type + HARDENED, HARDENED):
+            key = bip32_ckd(key, child)
+        return key
+
+    def _build_wallet(self, network: NetworkType, public_key: str) -> Wallet:
+        if network == NetworkType.bitcoin_network:
+            address = encode_segwit_v0("tb" if self._testnet else "bc", bin_hash160(bytes.fromhex(public_key)))
+            return Wallet(address=address, public_key=public_key, private_key=None)
+
+        # keccak от несжатого ключа без префикса 04
+        address_hash = keccak(bytes.fromhex(decompress(public_key))[1:])[-20:]
+        if network == NetworkType.erc20:
+            address = to_checksum_address(address_hash)
+            return Wallet(address=address, public_key=address, private_key=None)
+
+        address = base58.b58encode_check(b"\x41" + address_hash).decode()
+        return Wallet(address=address, public_key=decompress(public_key)[2:], private_key=None)
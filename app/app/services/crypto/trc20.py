@@ -1,12 +1,17 @@
+import asyncio
 import enum
-import httpx
 
+import base58
+
+from typing import Optional
 from urllib.parse import urljoin
 
 from loguru import logger
 from app.core.config import settings
+from app.core.http_client import HttpClient
 from app.models.wallets import CryptocurrencyType
 from app.services.crypto.base import Wallet, StatusTransaction
+from app.utils.rate_limiter import RateLimiter
 
 from tronpy import Tron
 from tronpy.keys import PrivateKey
@@ -20,10 +25,87 @@ class TRC20TransactionStatus(enum.Enum):
     success = "SUCCESS"
 
 
+class TronGridApi:
+    BALANCE_OF_SELECTOR = "balanceOf(address)"
+
+    def __init__(
+            self,
+            base_url: str,
+            http_client: HttpClient,
+            api_key: Optional[str] = None,
+            max_concurrency: int = 10,
+            rate_limit: float = 10
+    ) -> None:
+        self._base_url = base_url
+        self._http_client = http_client
+        self._api_key = api_key
+        self._max_concurrency = max_concurrency
+        self._rate_limit = rate_limit
+
+    @property
+    def _headers(self) -> dict:
+        headers = {"accept": "application/json"}
+        if self._api_key:
+            headers["TRON-PRO-API-KEY"] = self._api_key
+        return headers
+
+    @staticmethod
+    def _encode_address(address: str) -> str:
+        """
+            base58 адрес -> 32-байтный abi параметр (без префикса сети 0x41)
+        """
+        return base58.b58decode_check(address)[1:].hex().rjust(64, "0")
+
+    async def get_trc20_balances(self, contract_address: str, addresses: list[str]) -> dict[str, int]:
+        """
+        input:
+            contract_address - адрес trc20 контракта
+            addresses - ["address_1", "address_2"]
+
+        return:
+            {
+                "address_1": balance_1,
+                "address_2": balance_2
+            }
+            балансы в минимальных единицах токена,
+            адреса, по которым запрос не удался, в результат не попадают.
+        """
+        limiter = RateLimiter(self._max_concurrency, self._rate_limit)
+        balances = await asyncio.gather(*[
+            self._balance_of(contract_address, address, limiter) for address in addresses
+        ])
+        return {
+            address: balance for address, balance in zip(addresses, balances) if balance is not None
+        }
+
+    async def _balance_of(self, contract_address: str, address: str, limiter: RateLimiter) -> Optional[int]:
+        url = urljoin(self._base_url, "/wallet/triggerconstantcontract")
+        payload = {
+            "owner_address": address,
+            "contract_address": contract_address,
+            "function_selector": self.BALANCE_OF_SELECTOR,
+            "parameter": self._encode_address(address),
+            "visible": True
+        }
+        try:
+            async with limiter:
+                response = await self._http_client.post(url, json=payload, headers=self._headers)
+            constant_result = response.json().get("constant_result")
+        except Exception as _exc:
+            logger.error(f"BALANCE {address} ERROR: {_exc}")
+            return None
+
+        if not constant_result or not constant_result[0]:
+            logger.error(f"BALANCE {address} ERROR: {response.text}")
+            return None
+        return int(constant_result[0], base=16)
+
+
 class TRXService(CryptocurrencyInterface):
 
-    def __init__(self, tronscan_url: str) -> None:
+    def __init__(self, tronscan_url: str, http_client: HttpClient) -> None:
         self.tronscan_url = tronscan_url
+        self._http_client = http_client
         self.client = Tron()
 
     async def create_wallet(self) -> Wallet:
@@ -55,8 +137,7 @@ class TRXService(CryptocurrencyInterface):
                     to=destination_address,
                     amount=count
                 )
-            signed_txn = transaction.build().sign(private_key)
-            result = signed_txn.broadcast()
+            result = await asyncio.to_thread(lambda: transaction.build().sign(private_key).broadcast())
 
             logger.info(f"TXID: {result.txid}")
             return result.txid
@@ -74,7 +155,7 @@ class TRXService(CryptocurrencyInterface):
 
     async def check_transaction(self, transaction_id: str):
         try:
-            trx = self.client.get_transaction(txn_id=transaction_id)
+            trx = await asyncio.to_thread(self.client.get_transaction, txn_id=transaction_id)
             result = trx.get('ret')[0].get('contractRet')
         except TransactionNotFound:
             return StatusTransaction.pending
@@ -92,7 +173,7 @@ class TRXService(CryptocurrencyInterface):
             url=f"/api/account?address={address}&includeToken=true"
         )
         headers = {"accept": "application/json"}
-        response = httpx.get(url, headers=headers)
+        response = await self._http_client.get(url, headers=headers)
         data = response.json()
 
         if 'error' in data:
@@ -101,7 +182,7 @@ class TRXService(CryptocurrencyInterface):
         else:
             usdt_balance = 0.0
             for token in data['trc20token_balances']:
-                if token['tokenName'] == 'Tether USD':
+                if token['tokenId'] == settings.USDT_TRC20_CONTRACT_ADDRESS:
                     usdt_balance = round(float(token['balance']) * pow(10, -token['tokenDecimal']), 6)
                     return usdt_balance
             return usdt_balance
@@ -112,9 +193,13 @@ class USDTTrc20Service(TRXService):
     def __init__(
             self,
             usdt_trc20_contract_address: str,
-            tronscan_url: str
+            tronscan_url: str,
+            http_client: HttpClient,
+            trongrid_api: TronGridApi
     ) -> None:
-        super().__init__(tronscan_url)
+        super().__init__(tronscan_url, http_client)
+        self._usdt_trc20_contract_address = usdt_trc20_contract_address
+        self._trongrid_api = trongrid_api
         try:
             self.usdt_contract_address = self.client.get_contract(
                 usdt_trc20_contract_address
@@ -122,6 +207,12 @@ class USDTTrc20Service(TRXService):
         except Exception as _exc:
             logger.error(f"Error: {_exc}")
 
+    async def check_balances(self, addresses: list[str]) -> dict[str, int]:
+        return await self._trongrid_api.get_trc20_balances(
+            contract_address=self._usdt_trc20_contract_address,
+            addresses=addresses
+        )
+
     async def send_transaction(
             self,
             private_key: str,
@@ -137,11 +228,12 @@ class USDTTrc20Service(TRXService):
         logger.info(f"AMOUNT: {count}")
         try:
             private_key = PrivateKey(bytes.fromhex(private_key))
-            txn = self.usdt_contract_address.functions.transfer(
-                        destination_address,
-                        count
-            ).with_owner(sender_address).fee_limit(10_000_000_000).build().sign(private_key)
-            result = txn.broadcast()
+            result = await asyncio.to_thread(
+                lambda: self.usdt_contract_address.functions.transfer(
+                    destination_address,
+                    count
+                ).with_owner(sender_address).fee_limit(10_000_000_000).build().sign(private_key).broadcast()
+            )
             logger.info(f"RESULT USDT: {result.txid}")
             return result.txid
         except Exception as _exc:
@@ -0,0 +1,108 @@
+import asyncio
+
+from typing import Optional
+
+from loguru import logger
+
+from app.db.session import run_sync
+from app.models.wallets import NetworkType
+from app.repository.deposit_address import RepositoryDepositAddress
+from app.repository.wallet import RepositoryWallet
+from app.services.crypto import CryptoService
+from app.services.crypto.base import Wallet
+from app.services.crypto.hd_wallet import HDWallet
+from app.services.webhook_registrar import AlchemyWebhookRegistrar
+
+
+class DepositAddressPool:
+    """
+        Пул заранее сгенерированных депозитных адресов по сетям.
+
+        Фоновая задача дополняет пул до size, когда в сети остаётся меньше low_watermark адресов.
+        erc20 адреса выдаются только после регистрации в вебхуке alchemy, bitcoin и trc20 -
+        сразу: их сканеры читают адреса из таблицы кошельков.
+        При регистрации пользователя адрес забирается из пула, без генерации на пути запроса.
+    """
+
+    def __init__(
+            self,
+            repository_deposit_address: RepositoryDepositAddress,
+            repository_wallet: RepositoryWallet,
+            crypto_service: CryptoService,
+            hd_wallet: HDWallet,
+            webhook_registrar: AlchemyWebhookRegistrar,
+            size: int = 500,
+            low_watermark: int = 100
+    ) -> None:
+        self._repository_deposit_address = repository_deposit_address
+        self._repository_wallet = repository_wallet
+        self._crypto_service = crypto_service
+        self._hd_wallet = hd_wallet
+        self._webhook_registrar = webhook_registrar
+        self._size = size
+        self._low_watermark = low_watermark
+
+    async def _create_wallet(self, network: NetworkType, derivation_index: Optional[int]) -> Wallet:
+        """
+            Для сетей с настроенным xpub адрес выводится офлайн по индексу,
+            приватный ключ в БД не сохраняется.
+        """
+        if derivation_index is None:
+            return await self._crypto_service(network).create_wallet()
+        return self._hd_wallet.derive_wallet(network, derivation_index)
+
+    async def generate(self, networks: list[NetworkType]) -> list[dict]:
+        """
+            Новые адреса для списка сетей (сеть может повторяться), генерируются параллельно.
+        """
+        hd_networks = [network for network in networks if self._hd_wallet.is_enabled(network)]
+        derivation_indexes = iter(await run_sync(self._repository_wallet.next_derivation_indexes, len(hd_networks)))
+        indexes = [next(derivation_indexes) if self._hd_wallet.is_enabled(network) else None for network in networks]
+        created_wallets = await asyncio.gather(*[
+            self._create_wallet(network, index) for network, index in zip(networks, indexes)
+        ])
+        return [
+            {
+                "network": network,
+                "address": wallet.address,
+                "public_key": wallet.public_key,
+                "private_key": wallet.private_key,
+                "derivation_index": index,
+            } for network, index, wallet in zip(networks, indexes, created_wallets)
+        ]
+
+    def claim(self, network: NetworkType) -> Optional[dict]:
+        if not self._size:
+            return None
+        return self._repository_deposit_address.claim(network)
+
+    async def fill(self) -> dict[NetworkType, int]:
+        """
+            Дополняет сети, опустившиеся ниже low_watermark.
+        """
+        counts = await run_sync(self._repository_deposit_address.count_by_network)
+        networks = []
+        for network in NetworkType:
+            count = counts.get(network, 0)
+            if count < self._low_watermark:
+                networks += [network] * (self._size - count)
+        if not networks:
+            return {}
+
+        addresses = await self.generate(networks)
+        await run_sync(self._repository_deposit_address.bulk_create, [
+            {**address, "ready": address["network"] != NetworkType.erc20} for address in addresses
+        ])
+        return {network: networks.count(network) for network in set(networks)}
+
+    async def register_pending(self) -> int:
+        """
+            Регистрирует в вебхуке alchemy erc20 адреса пула, ещё не готовые к выдаче.
+        """
+        addresses = await run_sync(self._repository_deposit_address.list_not_ready_addresses, NetworkType.erc20)
+        if not addresses:
+            return 0
+        await self._webhook_registrar.register(addresses)
+        await run_sync(self._repository_deposit_address.mark_ready, addresses)
+        logger.info(f"DEPOSIT ADDRESS POOL: {len(addresses)} erc20 addresses registered in webhook")
+        return len(addresses)
@@ -0,0 +1,111 @@
+import asyncio
+import enum
+import json
+import time
+
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from loguru import logger
+from redis import Redis
+
+from app.exceptions.base import BaseNotFound
+from app.models.wallets import NetworkType
+
+if TYPE_CHECKING:
+    # сервисы сетей сами зависят от FeeOracle
+    from app.services.crypto.btc import BlockCypherApi
+    from app.services.crypto.erc20 import FeeHistoryApi
+
+
+class FeeTier(str, enum.Enum):
+    slow = "slow"
+    standard = "standard"
+    fast = "fast"
+
+
+class FeeEstimate(NamedTuple):
+    """
+        erc20 - priority fee в wei и base fee следующего блока, bitcoin - satoshi за kb.
+    """
+    slow: int
+    standard: int
+    fast: int
+    updated_at: float
+    base_fee: int = 0
+
+
+class FeeOracle:
+    """
+        Кеш комиссий сетей в redis, общий для api и воркеров.
+
+        Значения обновляются фоновой задачей раз в refresh_interval, поэтому на горячем пути
+        (вебхук, отправка транзакций) запросов к апстриму нет. Если значение старше ttl,
+        оно обновляется на месте, параллельные обновления одной сети в процессе сводятся в один запрос.
+        При ошибке апстрима возвращается последнее известное значение.
+    """
+    KEY = "fee_oracle:{network}"
+    NETWORKS = (NetworkType.erc20, NetworkType.bitcoin_network)
+
+    def __init__(
+            self,
+            redis: Redis,
+            fee_history_api: "FeeHistoryApi",
+            block_cypher_api: "BlockCypherApi",
+            ttl: int = 60
+    ) -> None:
+        self._redis = redis
+        self._fee_history_api = fee_history_api
+        self._block_cypher_api = block_cypher_api
+        self._ttl = ttl
+        self._refreshing: dict[NetworkType, asyncio.Task] = {}
+
+    async def get(self, network: NetworkType, tier: FeeTier = FeeTier.standard) -> int:
+        return getattr(await self.get_estimate(network), tier.value)
+
+    async def get_estimate(self, network: NetworkType) -> FeeEstimate:
+        estimate = self._load(network)
+        if estimate and time.time() - estimate.updated_at < self._ttl:
+            return estimate
+        try:
+            return await self.refresh(network)
+        except Exception as e:
+            if not estimate:
+                raise BaseNotFound(f"Нет данных о комиссии сети {network.value}: {e}")
+            logger.warning(f"FEE ORACLE {network.value}: refresh failed, using last known value: {e}")
+            return estimate
+
+    async def refresh(self, network: NetworkType) -> FeeEstimate:
+        task = self._refreshing.get(network)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._refresh(network))
+            self._refreshing[network] = task
+        return await asyncio.shield(task)
+
+    async def refresh_all(self) -> dict[NetworkType, FeeEstimate]:
+        results = await asyncio.gather(*[self.refresh(network) for network in self.NETWORKS], return_exceptions=True)
+        estimates = {}
+        for network, result in zip(self.NETWORKS, results):
+            if isinstance(result, Exception):
+                logger.warning(f"FEE ORACLE {network.value}: refresh failed: {result}")
+            else:
+                estimates[network] = result
+        return estimates
+
+    async def _refresh(self, network: NetworkType) -> FeeEstimate:
+        slow, standard, fast, base_fee = await self._fetch(network)
+        estimate = FeeEstimate(slow=slow, standard=standard, fast=fast, updated_at=time.time(), base_fee=base_fee)
+        self._redis.set(self.KEY.format(network=network.value), json.dumps(estimate._asdict()))
+        return estimate
+
+    async def _fetch(self, network: NetworkType) -> tuple[int, int, int, int]:
+        if network == NetworkType.erc20:
+            base_fee, (slow, standard, fast) = await self._fee_history_api.get_fees()
+            return slow, standard, fast, base_fee
+        if network == NetworkType.bitcoin_network:
+            fees = await self._block_cypher_api._get_fees()
+            return fees["low_fee_per_kb"], fees["medium_fee_per_kb"], fees["high_fee_per_kb"], 0
+        raise BaseNotFound(f"Комиссия сети {network.value} не поддерживается")
+
+    def _load(self, network: NetworkType) -> Optional[FeeEstimate]:
+        value = self._redis.get(self.KEY.format(network=network.value))
+        return FeeEstimate(**json.loads(value)) if value else None
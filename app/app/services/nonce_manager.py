@@ -0,0 +1,165 @@
+import json
+import time
+
+from typing import Optional
+
+from redis import Redis
+
+
+class NonceManager:
+    """
+        Локальная выдача nonce для горячих кошельков erc20 (ERC20_ADDRESS).
+
+        Состояние адреса в redis:
+            next      - следующий ещё не выданный nonce
+            free      - освобождённые nonce (нода отклонила транзакцию), выдаются первыми - так закрываются пропуски
+            reserved  - выданные, но ещё не отправленные nonce со временем выдачи
+            inflight  - отправленные и ещё не замайненные транзакции, нужны для replace-by-fee
+        Выдача и синхронизация с сетью выполняются lua скриптами и атомарны между процессами.
+    """
+    KEY = "nonce:{address}:{name}"
+
+    RESERVE_SCRIPT = """
+        local free = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+        local nonce
+        if free then
+            redis.call('ZREM', KEYS[2], free)
+            nonce = tonumber(free)
+        else
+            nonce = redis.call('INCR', KEYS[1]) - 1
+        end
+        redis.call('HSET', KEYS[3], nonce, ARGV[1])
+        return nonce
+    """
+
+    SYNC_SCRIPT = """
+        local chain = tonumber(ARGV[1])
+        local now = tonumber(ARGV[2])
+        local reserve_timeout = tonumber(ARGV[3])
+
+        local next_nonce = tonumber(redis.call('GET', KEYS[1]) or chain)
+        if next_nonce < chain then
+            next_nonce = chain
+        end
+        redis.call('SET', KEYS[1], next_nonce)
+        redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', '(' .. chain)
+
+        local reserved = redis.call('HGETALL', KEYS[3])
+        for i = 1, #reserved, 2 do
+            local nonce = tonumber(reserved[i])
+            if nonce < chain then
+                redis.call('HDEL', KEYS[3], reserved[i])
+            elseif now - tonumber(reserved[i + 1]) > reserve_timeout then
+                redis.call('HDEL', KEYS[3], reserved[i])
+                redis.call('ZADD', KEYS[2], nonce, reserved[i])
+            end
+        end
+
+        local mined = {}
+        local inflight = redis.call('HGETALL', KEYS[4])
+        for i = 1, #inflight, 2 do
+            if tonumber(inflight[i]) < chain then
+                redis.call('HDEL', KEYS[4], inflight[i])
+                table.insert(mined, inflight[i + 1])
+            end
+        end
+
+        for nonce = chain, next_nonce - 1 do
+            local member = tostring(nonce)
+            if not redis.call('ZSCORE', KEYS[2], member)
+                    and redis.call('HEXISTS', KEYS[3], member) == 0
+                    and redis.call('HEXISTS', KEYS[4], member) == 0 then
+                redis.call('ZADD', KEYS[2], nonce, member)
+            end
+        end
+        return mined
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            addresses: list[str],
+            reserve_timeout: int = 60,
+            stuck_timeout: int = 180,
+            max_replacements: int = 5
+    ) -> None:
+        self._redis = redis
+        self.addresses = [address.lower() for address in addresses]
+        self._reserve_timeout = reserve_timeout
+        self._stuck_timeout = stuck_timeout
+        self._max_replacements = max_replacements
+        self._reserve = redis.register_script(self.RESERVE_SCRIPT)
+        self._sync = redis.register_script(self.SYNC_SCRIPT)
+
+    def manages(self, address: str) -> bool:
+        return address.lower() in self.addresses
+
+    def is_initialized(self, address: str) -> bool:
+        return bool(self._redis.exists(self._key(address, "next")))
+
+    def reserve(self, address: str, chain_nonce: Optional[int] = None) -> int:
+        """
+            chain_nonce (pending nonce из сети) нужен только при первой выдаче, пока состояния адреса ещё нет.
+        """
+        if chain_nonce is not None:
+            self._redis.set(self._key(address, "next"), chain_nonce, nx=True)
+        return int(self._reserve(keys=self._keys(address)[:3], args=[time.time()]))
+
+    def release(self, address: str, nonce: int) -> None:
+        """
+            Нода отклонила транзакцию - nonce вернётся следующему отправителю.
+        """
+        pipeline = self._redis.pipeline()
+        pipeline.hdel(self._key(address, "reserved"), nonce)
+        pipeline.zadd(self._key(address, "free"), {nonce: nonce})
+        pipeline.execute()
+
+    def confirm(self, address: str, nonce: int, transaction_id: str, transaction: dict) -> None:
+        pipeline = self._redis.pipeline()
+        pipeline.hdel(self._key(address, "reserved"), nonce)
+        pipeline.hset(self._key(address, "inflight"), nonce, json.dumps({
+            "transaction_ids": [transaction_id],
+            "transaction": transaction,
+            "sent_at": time.time()
+        }))
+        pipeline.execute()
+
+    def replace(self, address: str, nonce: int, transaction_id: str, transaction: dict) -> None:
+        key = self._key(address, "inflight")
+        inflight = json.loads(self._redis.hget(key, nonce))
+        self._redis.hset(key, nonce, json.dumps({
+            "transaction_ids": [*inflight["transaction_ids"], transaction_id],
+            "transaction": transaction,
+            "sent_at": time.time()
+        }))
+
+    def sync(self, address: str, chain_nonce: int) -> list[dict]:
+        """
+            chain_nonce - число замайненных транзакций адреса.
+            Убирает замайненные nonce, возвращает зависшие резервы в free и заполняет пропуски.
+            Возвращает замайненные in-flight записи, которые заменялись (replace-by-fee):
+            в сеть могла попасть любая из их версий.
+        """
+        mined = self._sync(keys=self._keys(address), args=[chain_nonce, time.time(), self._reserve_timeout])
+        return [record for record in map(json.loads, mined) if len(record["transaction_ids"]) > 1]
+
+    def list_stuck(self, address: str) -> dict[int, dict]:
+        """
+            Отправленные транзакции, не замайненные за stuck_timeout и ещё не исчерпавшие лимит замен.
+        """
+        now = time.time()
+        return {
+            int(nonce): record
+            for nonce, record in (
+                (nonce, json.loads(value))
+                for nonce, value in self._redis.hgetall(self._key(address, "inflight")).items()
+            )
+            if now - record["sent_at"] > self._stuck_timeout
+            and len(record["transaction_ids"]) <= self._max_replacements
+        }
+
+    def _key(self, address: str, name: str) -> str:
+        return self.KEY.format(address=address.lower(), name=name)
+
+    def _keys(self, address: str) -> list[str]:
+        return [self._key(address, name) for name in ("next", "free", "reserved", "inflight")]
@@ -1,16 +1,17 @@
-import httpx
-
 from loguru import logger
 
+from app.core.http_client import HttpClient
+
 
 class CheckCurrentCryptoCost:
 
-    def __init__(self, base_url: str) -> None:
+    def __init__(self, base_url: str, http_client: HttpClient) -> None:
         self.base_url = base_url
+        self._http_client = http_client
 
     async def get_current_crypto_cost(self, crypto, to_crypto="USD"):
         logger.info(f"----------CRYPTO---------:{crypto}")
-        response = httpx.get(self.base_url.format(crypto=crypto, to_crypto=to_crypto))
+        response = await self._http_client.get(self.base_url.format(crypto=crypto, to_crypto=to_crypto))
         if response.status_code == 200:
             return response.json().get(to_crypto)
 
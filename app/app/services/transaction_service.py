@@ -1,30 +1,60 @@
-from app.repository.transactions import RepositoryCryptoTransaction
-from app.repository.wallet import RepositoryCryptoWallet
-from app.repository.user import RepositoryUser
+import datetime
+
+from typing import Optional
+
+from app.models.transactions import CryptoTransaction
+from app.models.wallets import CryptocurrencyType
+from app.repository.transactions import AsyncRepositoryCryptoTransaction
+from app.repository.wallet import AsyncRepositoryCryptoWallet
+from app.repository.user import AsyncRepositoryUser
+from app.utils.pagination import decode_cursor, paginate
 
 
 class CryptoTransactionService:
 
     def __init__(
             self,
-            repository_user: RepositoryUser,
-            repository_crypto_wallet: RepositoryCryptoWallet,
-            repository_crypto_transactions: RepositoryCryptoTransaction
+            repository_user: AsyncRepositoryUser,
+            repository_crypto_wallet: AsyncRepositoryCryptoWallet,
+            repository_crypto_transactions: AsyncRepositoryCryptoTransaction
     ):
         self._repository_user = repository_user
         self._repository_crypto_wallet = repository_crypto_wallet
         self._repository_crypto_transactions = repository_crypto_transactions
 
-    async def list(self, user_id: str):
-        user = self._repository_user.get(user_id=user_id)
-        btc_wallet, eth_wallet, usdt_wallet, trx_wallet, usdt_trc20_wallet = self._repository_crypto_wallet.list(
-            user_id=user.id
+    async def list(
+            self,
+            user_id: str,
+            cursor: Optional[str] = None,
+            limit: int = 50,
+            cryptocurrency: Optional[CryptocurrencyType] = None,
+            type: Optional[CryptoTransaction.TransactionType] = None,
+            status: Optional[CryptoTransaction.StatusCryptoTransaction] = None,
+            date_from: Optional[datetime.datetime] = None,
+            date_to: Optional[datetime.datetime] = None
+    ):
+        """
+            История по всем кошелькам пользователя страницами от новых к старым,
+            next_cursor передаётся в следующий запрос.
+        """
+        user = await self._repository_user.get(user_id=user_id)
+        transactions, next_cursor = paginate(
+            await self._repository_crypto_transactions.transaction_history(
+                user_id=user.id,
+                cryptocurrency=cryptocurrency,
+                type=type,
+                status=status,
+                date_from=date_from,
+                date_to=date_to,
+                after=decode_cursor(cursor),
+                limit=limit + 1
+            ),
+            limit
         )
-        return self._repository_crypto_transactions.transaction_history(wallet_crypto_id=btc_wallet.id) + \
-            self._repository_crypto_transactions.transaction_history(wallet_crypto_id=eth_wallet.id) + \
-            self._repository_crypto_transactions.transaction_history(wallet_crypto_id=usdt_wallet.id) + \
-            self._repository_crypto_transactions.transaction_history(wallet_crypto_id=trx_wallet.id) + \
-            self._repository_crypto_transactions.transaction_history(wallet_crypto_id=usdt_trc20_wallet.id)
+        return {
+            "items": transactions,
+            "next_cursor": next_cursor
+        }
 
     async def get(self, transaction_id: str):
-        return self._repository_crypto_transactions.get(id=transaction_id)
+        return await self._repository_crypto_transactions.get(id=transaction_id)
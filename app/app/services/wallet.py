@@ -1,16 +1,19 @@
+import datetime
+
 from loguru import logger
 
-from typing import Callable
-from uuid import UUID
 from typing import Optional
+from uuid import UUID, uuid4
 
 
-from app.repository.transactions import RepositoryCryptoTransaction
+from app.repository.transactions import RepositoryCryptoTransaction, AsyncRepositoryCryptoTransaction
 from app.repository.settings import RepositorySettings
-from app.repository.wallet import RepositoryWallet, RepositoryCryptoWallet
-from app.repository.user import RepositoryUser
+from app.repository.wallet import RepositoryWallet, RepositoryCryptoWallet, AsyncRepositoryCryptoWallet
+from app.repository.user import AsyncRepositoryUser
 
 from app.workers.add_address_to_webhook import AddAddressToWebhookErc20
+from app.services.webhook_registrar import AlchemyWebhookRegistrar
+from app.services.deposit_address_pool import DepositAddressPool
 
 from app.models.wallets import NetworkType, CryptocurrencyType
 from app.models.transactions import CryptoTransaction
@@ -19,9 +22,17 @@ from app.models.wallets import CryptocurrencyWallet
 from app.services.crypto import CryptoService
 
 from app.exceptions import wallet_exceptions
+from app.utils.pagination import decode_cursor, paginate
 
 
 class WalletService:
+    WALLET_CRYPTOCURRENCIES = (
+        (NetworkType.bitcoin_network, CryptocurrencyType.bitcoin),
+        (NetworkType.erc20, CryptocurrencyType.ethereum),
+        (NetworkType.erc20, CryptocurrencyType.usdt),
+        (NetworkType.trc20, CryptocurrencyType.trx),
+        (NetworkType.trc20, CryptocurrencyType.usdt_trc20),
+    )
 
     def __init__(
             self,
@@ -29,100 +40,107 @@ class WalletService:
             repository_cryptocurrency_wallet: RepositoryCryptoWallet,
             repository_crypto_transaction: RepositoryCryptoTransaction,
             add_address_to_webhook_erc20_task: AddAddressToWebhookErc20,
+            webhook_registrar: AlchemyWebhookRegistrar,
             crypto_service: CryptoService,
+            deposit_address_pool: DepositAddressPool,
             repository_settings: RepositorySettings,
-            repository_user: RepositoryUser
+            repository_user: AsyncRepositoryUser,
+            async_repository_cryptocurrency_wallet: AsyncRepositoryCryptoWallet,
+            async_repository_crypto_transaction: AsyncRepositoryCryptoTransaction
     ) -> None:
         self._repository_wallet = repository_wallet
         self._repository_cryptocurrency_wallet = repository_cryptocurrency_wallet
         self._crypto_service = crypto_service
+        self._deposit_address_pool = deposit_address_pool
         self._repository_crypto_transaction = repository_crypto_transaction
         self._add_address_to_webhook_erc20_task = add_address_to_webhook_erc20_task
+        self._webhook_registrar = webhook_registrar
         self._repository_settings = repository_settings
         self._repository_user = repository_user
-
-    async def _get_or_create_wallet_network(
-            self,
-            network: NetworkType,
-            user_id: UUID,
-            hook_after_create: Optional[Callable] = None
-    ):
-        wallet_db = self._repository_wallet.get(network=network, user_id=user_id)
-        if not wallet_db:
-            wallet = await self._crypto_service(network).create_wallet()
-            if hook_after_create:
-                hook_after_create(address=wallet.address)
-            wallet_db = self._repository_wallet.create(
-                obj_in={
-                    "network": network,
-                    "user_id": user_id,
-                    "address": wallet.address,
-                    "private_key": wallet.private_key,
-                    "public_key": wallet.public_key,
-                }
-            )
-
-        return wallet_db
-
-    async def _get_or_create_wallet_coin(
-            self,
-            network: NetworkType,
-            user_id: UUID,
-            cryptocurrency_type: CryptocurrencyType,
-            hook_after_create: Optional[Callable] = None
-    ):
-        wallet_network = await self._get_or_create_wallet_network(
-            network=network,
-            user_id=user_id,
-            hook_after_create=hook_after_create
-        )
-        if not self._repository_cryptocurrency_wallet.get(
-                wallet_id=wallet_network.id,
-                cryptocurrency=cryptocurrency_type
-        ):
-            return self._repository_cryptocurrency_wallet.create({
-                "wallet_id": wallet_network.id,
+        self._async_repository_cryptocurrency_wallet = async_repository_cryptocurrency_wallet
+        self._async_repository_crypto_transaction = async_repository_crypto_transaction
+
+    def _register_erc20_address(self, address: str):
+        """
+            Адрес встаёт в очередь регистрации в alchemy, полная пачка отправляется сразу,
+            остальное - периодической задачей.
+        """
+        if self._webhook_registrar.enqueue(address):
+            self._add_address_to_webhook_erc20_task.delay()
+
+    async def create_all_wallets(self, user_id: UUID):
+        """
+            Недостающие кошельки сетей забираются из пула готовых адресов,
+            если пул сети пуст - генерируются параллельно.
+            Кошельки и токен-кошельки пишутся в БД одним INSERT на таблицу.
+        """
+        wallets = {wallet.network: wallet.id for wallet in self._repository_wallet.list(user_id=user_id)}
+        networks = [network for network in NetworkType if network not in wallets]
+
+        claimed_wallets = []
+        for network in networks:
+            if claimed := self._deposit_address_pool.claim(network):
+                claimed_wallets.append({**claimed, "network": network})
+        generated_wallets = await self._deposit_address_pool.generate([
+            network for network in networks if network not in {wallet["network"] for wallet in claimed_wallets}
+        ])
+
+        new_wallets = []
+        for wallet in claimed_wallets + generated_wallets:
+            wallets[wallet["network"]] = uuid4()
+            new_wallets.append({**wallet, "id": wallets[wallet["network"]], "user_id": user_id})
+        self._repository_wallet.bulk_create(new_wallets)
+
+        cryptocurrencies = {
+            wallet.cryptocurrency for wallet in self._repository_cryptocurrency_wallet.list(user_id=user_id)
+        }
+        self._repository_cryptocurrency_wallet.bulk_create([
+            {
+                "wallet_id": wallets[network],
                 "cryptocurrency": cryptocurrency_type,
                 "user_id": user_id,
                 "balance": 0
-            })
+            } for network, cryptocurrency_type in self.WALLET_CRYPTOCURRENCIES
+            if cryptocurrency_type not in cryptocurrencies
+        ])
 
-    async def create_all_wallets(self, user_id: str):
-        await self._get_or_create_wallet_coin(
-            NetworkType.bitcoin_network,
-            user_id,
-            CryptocurrencyType.bitcoin
-        )
-        await self._get_or_create_wallet_coin(
-            NetworkType.erc20,
-            user_id,
-            CryptocurrencyType.ethereum,
-            self._add_address_to_webhook_erc20_task.delay
-        )
-        await self._get_or_create_wallet_coin(
-            NetworkType.erc20,
-            user_id,
-            CryptocurrencyType.usdt,
-            self._add_address_to_webhook_erc20_task.delay
-        )
-        await self._get_or_create_wallet_coin(
-            NetworkType.trc20,
-            user_id,
-            CryptocurrencyType.trx
-        )
-        await self._get_or_create_wallet_coin(
-            NetworkType.trc20,
-            user_id,
-            CryptocurrencyType.usdt_trc20
-        )
+        # адреса из пула уже зарегистрированы в вебхуке
+        for wallet in generated_wallets:
+            if wallet["network"] == NetworkType.erc20:
+                self._register_erc20_address(address=wallet["address"])
 
     async def get_wallets(self, user_id: str):
-        user = self._repository_user.get(user_id=user_id)
-        return self._repository_cryptocurrency_wallet.list(user_id=user.id)
+        user = await self._repository_user.get(user_id=user_id)
+        return await self._async_repository_cryptocurrency_wallet.list(user_id=user.id)
 
-    async def get_wallet(self, user_id: str, wallet_id: str):
-        user = self._repository_user.get(user_id=user_id)
-        wallet = self._repository_cryptocurrency_wallet.get(user_id=user.id, id=wallet_id)
+    async def get_wallet(
+            self,
+            user_id: str,
+            wallet_id: str,
+            cursor: Optional[str] = None,
+            limit: int = 50,
+            type: Optional[CryptoTransaction.TransactionType] = None,
+            status: Optional[CryptoTransaction.StatusCryptoTransaction] = None,
+            date_from: Optional[datetime.datetime] = None,
+            date_to: Optional[datetime.datetime] = None
+    ):
+        user = await self._repository_user.get(user_id=user_id)
+        wallet = await self._async_repository_cryptocurrency_wallet.get(user_id=user.id, id=wallet_id)
+        if not wallet:
+            raise wallet_exceptions.NotFoundWallet(f"Кошелёк {wallet_id} не найден")
+        transactions, next_cursor = paginate(
+            await self._async_repository_crypto_transaction.transaction_history(
+                user_id=user.id,
+                wallet_crypto_id=wallet.id,
+                type=type,
+                status=status,
+                date_from=date_from,
+                date_to=date_to,
+                after=decode_cursor(cursor),
+                limit=limit + 1
+            ),
+            limit
+        )
         crypto_transactions_and_deals = [
             {
                 "id": transaction.id,
@@ -137,12 +155,13 @@ class WalletService:
                     wallet.wallet.network,
                     wallet.cryptocurrency
                 ).from_minimal_part(transaction.comission) if transaction.comission else None
-            } for transaction in self._repository_crypto_transaction.transaction_history(wallet_crypto_id=wallet.id)
+            } for transaction in transactions
         ]
 
         return {
             "wallet": wallet,
-            "history": crypto_transactions_and_deals
+            "history": crypto_transactions_and_deals,
+            "next_cursor": next_cursor
         }
 
     async def get_wallet_by_coin_type_and_update(
@@ -0,0 +1,86 @@
+from urllib.parse import urljoin
+
+from loguru import logger
+from redis import Redis
+
+from app.core.config import settings
+from app.db.session import run_sync
+from app.exceptions import erc20_exceptions
+from app.models.webhook_erc20 import WebhookErc20Alchemy
+from app.repository.webhoook_erc20 import RepositoryWebhookErc20, RepositoryWebhookAddress
+from app.services.crypto.erc20 import AlchemyNotify
+
+
+class AlchemyWebhookRegistrar:
+    """
+        Копит новые erc20 адреса в redis-множестве (дубликаты отбрасываются)
+        и регистрирует их в alchemy пачками: один PATCH и один INSERT в webhook_addresses на вебхук.
+        Когда вебхук заполнен до max_addresses, создаётся следующий.
+    """
+    PENDING_KEY = "alchemy:webhook:pending_addresses"
+
+    def __init__(
+            self,
+            redis: Redis,
+            repository_webhook_erc20: RepositoryWebhookErc20,
+            repository_webhook_address: RepositoryWebhookAddress,
+            alchemy_api: AlchemyNotify,
+            batch_size: int = 500,
+            max_addresses: int = 50000
+    ) -> None:
+        self._redis = redis
+        self._repository_webhook_erc20 = repository_webhook_erc20
+        self._repository_webhook_address = repository_webhook_address
+        self._alchemy_api = alchemy_api
+        self._batch_size = batch_size
+        self._max_addresses = max_addresses
+
+    def enqueue(self, address: str) -> bool:
+        """
+            Возвращает True, если накопилась полная пачка и её пора отправить.
+        """
+        self._redis.sadd(self.PENDING_KEY, address)
+        return self._redis.scard(self.PENDING_KEY) >= self._batch_size
+
+    async def flush(self) -> int:
+        registered = 0
+        while addresses := self._redis.spop(self.PENDING_KEY, self._batch_size):
+            try:
+                await self.register(list(addresses))
+            except Exception:
+                self._redis.sadd(self.PENDING_KEY, *addresses)
+                raise
+            registered += len(addresses)
+            if len(addresses) < self._batch_size:
+                break
+        return registered
+
+    async def register(self, addresses: list[str]) -> None:
+        registered = await run_sync(self._repository_webhook_address.list_registered, addresses)
+        addresses = [address for address in addresses if address not in registered]
+        if not addresses:
+            return
+
+        counts = await run_sync(self._repository_webhook_address.count_by_webhook)
+        for webhook_db in await run_sync(self._repository_webhook_erc20.list):
+            free = self._max_addresses - counts.get(webhook_db.id, 0)
+            if addresses and free > 0:
+                await self._add_to_webhook(webhook_db, addresses[:free])
+                addresses = addresses[free:]
+
+        while addresses:
+            webhook_id = await self._alchemy_api.create_webhook(
+                network=settings.ERC20_NETWORK_TYPE, webhook_type="ADDRESS_ACTIVITY",
+                webhook_url=urljoin(settings.BASE_URL, "/api/v1/webhook/erc-20")
+            )
+            if not webhook_id:
+                raise erc20_exceptions.WebhookError("Alchemy: не удалось создать вебхук")
+            webhook_db = await run_sync(self._repository_webhook_erc20.create, {"webhook_id": webhook_id})
+            await self._add_to_webhook(webhook_db, addresses[:self._max_addresses])
+            addresses = addresses[self._max_addresses:]
+
+    async def _add_to_webhook(self, webhook_db: WebhookErc20Alchemy, addresses: list[str]) -> None:
+        if not await self._alchemy_api.add_addresses_to_web_hook(webhook_db.webhook_id, addresses, []):
+            raise erc20_exceptions.WebhookError(f"Alchemy: не удалось добавить адреса в вебхук {webhook_db.webhook_id}")
+        await run_sync(self._repository_webhook_address.bulk_add, webhook_db.id, addresses)
+        logger.info(f"WEBHOOK {webhook_db.webhook_id}: added {len(addresses)} addresses")
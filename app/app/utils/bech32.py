@@ -0,0 +1,65 @@
+"""
+    bech32 (BIP173) для segwit адресов версии 0.
+"""
+from typing import Optional
+
+CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+
+
+def _polymod(values: list[int]) -> int:
+    generator = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+        for i in range(5):
+            chk ^= generator[i] if ((top >> i) & 1) else 0
+    return chk
+
+
+def _expand_hrp(hrp: str) -> list[int]:
+    return [ord(char) >> 5 for char in hrp] + [0] + [ord(char) & 31 for char in hrp]
+
+
+def _convert_bits(data, from_bits: int, to_bits: int, pad: bool = True) -> Optional[list[int]]:
+    acc, bits, result = 0, 0, []
+    max_value = (1 << to_bits) - 1
+    for value in data:
+        acc = (acc << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            result.append((acc >> bits) & max_value)
+    if pad and bits:
+        result.append((acc << (to_bits - bits)) & max_value)
+    elif not pad and (bits >= from_bits or (acc << (to_bits - bits)) & max_value):
+        return None
+    return result
+
+
+def encode_segwit_v0(hrp: str, witness_program: bytes) -> str:
+    data = [0] + _convert_bits(witness_program, 8, 5)
+    polymod = _polymod(_expand_hrp(hrp) + data + [0] * 6) ^ 1
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join(CHARSET[d] for d in data + checksum)
+
+
+def decode_segwit_v0(hrp: str, address: str) -> Optional[bytes]:
+    """
+        witness program адреса или None, если адрес не bech32 v0 сети hrp.
+    """
+    if address.lower() != address and address.upper() != address:
+        return None
+    address = address.lower()
+    separator = address.rfind("1")
+    if address[:separator] != hrp or len(address) - separator < 7:
+        return None
+    if any(char not in CHARSET for char in address[separator + 1:]):
+        return None
+    data = [CHARSET.find(char) for char in address[separator + 1:]]
+    if _polymod(_expand_hrp(hrp) + data) != 1 or not data or data[0] != 0:
+        return None
+    program = _convert_bits(data[1:-6], 5, 8, pad=False)
+    if program is None or len(program) not in (20, 32):
+        return None
+    return bytes(program)
@@ -0,0 +1,72 @@
+import asyncio
+
+from typing import Optional
+
+from loguru import logger
+from redis import Redis
+
+from app.exceptions.base import LeaseNotAcquired, LeaseLost
+
+
+class LeaseLock:
+    """
+        Распределённая блокировка-аренда: SET NX PX в redis, пока блокировка удерживается,
+        аренда продлевается в фоне каждые ttl / 3 секунд. Упавший воркер ничего не продлевает,
+        и блокировка освобождается сама через ttl.
+
+        При захвате выдаётся fencing token - монотонно растущий номер аренды. ensure() перед побочным
+        эффектом проверяет, что аренда всё ещё принадлежит этому токену, и не даёт зависшему
+        воркеру продолжить работу после того, как блокировку забрал следующий.
+    """
+    KEY = "lease:{name}"
+    FENCE_KEY = "lease:{name}:fence"
+
+    RENEW_SCRIPT = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+        end
+        return 0
+    """
+    RELEASE_SCRIPT = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('DEL', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, redis: Redis, name: str, ttl: float = 60) -> None:
+        self._redis = redis
+        self._name = name
+        self._key = self.KEY.format(name=name)
+        self._ttl = ttl
+        self._renew = redis.register_script(self.RENEW_SCRIPT)
+        self._release = redis.register_script(self.RELEASE_SCRIPT)
+        self._renew_task: Optional[asyncio.Task] = None
+        self._lost = False
+        self.token: Optional[int] = None
+
+    async def __aenter__(self) -> "LeaseLock":
+        token = self._redis.incr(self.FENCE_KEY.format(name=self._name))
+        if not self._redis.set(self._key, token, nx=True, px=int(self._ttl * 1000)):
+            raise LeaseNotAcquired(f"Блокировка {self._name} занята")
+        self.token = token
+        self._lost = False
+        self._renew_task = asyncio.ensure_future(self._keep_alive())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._renew_task.cancel()
+        self._release(keys=[self._key], args=[self.token])
+
+    def ensure(self) -> None:
+        if self._lost or self._redis.get(self._key) != str(self.token):
+            self._lost = True
+            raise LeaseLost(f"Аренда {self._name} #{self.token} потеряна")
+
+    async def _keep_alive(self):
+        while True:
+            await asyncio.sleep(self._ttl / 3)
+            if not self._renew(keys=[self._key], args=[self.token, int(self._ttl * 1000)]):
+                self._lost = True
+                logger.warning(f"LEASE {self._name} #{self.token} LOST")
+                return
@@ -0,0 +1,33 @@
+import base64
+import datetime
+
+from typing import Optional
+from uuid import UUID
+
+from app.exceptions.base import InvalidCursor
+
+
+def encode_cursor(created_at: datetime.datetime, id: UUID) -> str:
+    """
+        Курсор keyset пагинации - позиция последней записи страницы (created_at, id).
+    """
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{id}".encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple[datetime.datetime, UUID]]:
+    if not cursor:
+        return None
+    try:
+        created_at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(created_at), UUID(id)
+    except ValueError:
+        raise InvalidCursor(f"Некорректный курсор: {cursor}")
+
+
+def paginate(rows: list, limit: int) -> tuple[list, Optional[str]]:
+    """
+        rows запрошены с limit + 1: лишняя запись означает, что есть следующая страница.
+    """
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > limit else None
+    return items, next_cursor
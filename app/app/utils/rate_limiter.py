@@ -0,0 +1,28 @@
+import asyncio
+
+
+class RateLimiter:
+    """
+        Ограничивает число одновременных запросов к апстриму и их частоту (запросов в секунду).
+        rate = 0 отключает ограничение по частоте.
+    """
+
+    def __init__(self, concurrency: int, rate: float = 0) -> None:
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._interval = 1 / rate if rate else 0
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        if self._interval:
+            async with self._lock:
+                now = asyncio.get_running_loop().time()
+                wait = self._next_slot - now
+                self._next_slot = max(now, self._next_slot) + self._interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore.release()
@@ -1,7 +1,13 @@
 from functools import wraps
+from typing import Optional
 from celery import Task
-from asgiref.sync import async_to_sync
-from app.db.session import SyncSession, scope
+from loguru import logger
+from redis import Redis
+from app.core.config import settings
+from app.db.session import SyncSession, run_sync, scope
+from app.exceptions.base import LeaseNotAcquired
+from app.utils.lease_lock import LeaseLock
+from app.workers.runtime import runtime
 from uuid import uuid4
 
 
@@ -12,8 +18,14 @@ class Base(Task):
     countdown = 5
     retry_kwargs = {}
 
-    def __init__(self, session: SyncSession, *args, **kwargs):
-        self.session = session.session
+    def __init__(
+            self,
+            session: SyncSession,
+            redis: Optional[Redis] = None,
+            *args, **kwargs
+    ):
+        self.session = session.scoped_session
+        self.redis = redis
         super().__init__(*args, **kwargs)
         if self.autoretry_for and not hasattr(self, '_orig_run'):
             @wraps(self.run)
@@ -32,6 +44,22 @@ class Base(Task):
     def before_start(self, task_id, *args, **kwargs):
         self.task_id = task_id
 
+    def lease(self, name: Optional[str] = None, ttl: float = settings.WORKER_LEASE_TTL) -> LeaseLock:
+        """
+            Не даёт запускам воркера пересекаться:
+                async with self.lease() as lease:
+                    ...
+                    lease.ensure()  # перед необратимым действием
+            Если блокировка занята, запуск пропускается.
+        """
+        return LeaseLock(self.redis, name or type(self).__name__, ttl)
+
+    def shard_name(self, shard: int, shards: int) -> str:
+        """
+            Имя блокировки шарда: запуски одного шарда не пересекаются, разные шарды идут параллельно.
+        """
+        return f"{type(self).__name__}:{shard}/{shards}"
+
     async def proccess(self, *args, **kwargs):
         raise NotImplementedError
 
@@ -39,17 +67,19 @@ class Base(Task):
         scope.set(str(uuid4()))
         try:
             await self.proccess(*args, **kwargs)
-            self.session.commit()
+            await run_sync(self.session.commit)
+        except LeaseNotAcquired as exc:
+            logger.info(f"{type(self).__name__} SKIPPED: {exc}")
         except self.autoretry_for as exc:
             if self.retries >= self.max_retries:
                 await self.on_retries_ecxeeded()
             else:
                 raise exc
         finally:
-            self.session.close()
+            await run_sync(self.session.remove)
 
     async def on_retries_ecxeeded(self):
         raise NotImplemented
 
     def run(self, *args, **kwargs):
-        async_to_sync(self.life_cycle)(*args, **kwargs)
\ No newline at end of file
+        runtime.run(self.life_cycle(*args, **kwargs))
\ No newline at end of file
@@ -1,17 +1,20 @@
 from .base import Base
 
+from app.db.session import run_sync
 from app.services.crypto.btc import Bitcoin
+from app.services.balance_scan import BalanceScanService
 
 from app.repository.wallet import RepositoryWallet, RepositoryCryptoWallet
 from app.repository.transactions import RepositoryCryptoTransaction
 from app.repository.settings import RepositorySettings
 
-from app.models.wallets import NetworkType
+from app.models.wallets import NetworkType, CryptocurrencyType
 from app.models.transactions import CryptoTransaction
-from app.models.settings import TaskType
 
 from app.core.config import settings
 
+from loguru import logger
+
 
 class CheckBitcoinWallet(Base):
 
@@ -22,75 +25,80 @@ class CheckBitcoinWallet(Base):
             repository_crypto_transaction: RepositoryCryptoTransaction,
             repository_cryptocurrency_wallet: RepositoryCryptoWallet,
             repository_settings: RepositorySettings,
+            balance_scan_service: BalanceScanService,
             *args, **kwargs
     ) -> None:
         self._bitcoin_service = bitcoin_service
+        self._balance_scan_service = balance_scan_service
         self._rep_wallet = repository_wallet
         self._rep_cryptocurrency_wallet = repository_cryptocurrency_wallet
         self._repository_crypto_transaction = repository_crypto_transaction
         self._repository_settings = repository_settings
         super().__init__(*args, **kwargs)
 
-    async def proccess(self, *args, **kwargs):
-        wallets_bitcoins = self._rep_wallet.get_list_addresses(network=NetworkType.bitcoin_network)
-        wallets_to_check = []
-        settings_db = self._repository_settings.get()
-
-        if settings_db.transaction_bitcoin_wallet_check != TaskType.not_working:
-            return
-
-        self._repository_settings.update(
-            db_obj=settings_db,
-            obj_in={
-                "transaction_bitcoin_wallet_check": TaskType.pending
-            }
-        )
-
-        self.session.commit()
-
-        for wallets_bitcoin in wallets_bitcoins:
-            wallets_to_check.append(wallets_bitcoin[0])
+    async def proccess(self, shard: int = 0, shards: int = 1, *args, **kwargs):
+        async with self.lease(self.shard_name(shard, shards)) as lease:
+            settings_db = await run_sync(self._repository_settings.get)
 
-        try:
-            result = await self._bitcoin_service.check_balances(wallets_to_check)
-        except Exception as e:
-            self._repository_settings.update(
-                db_obj=settings_db,
-                obj_in={
-                    "transaction_bitcoin_wallet_check": TaskType.not_working
-                }
+            wallets_to_check = await run_sync(
+                self._balance_scan_service.get_due_addresses, NetworkType.bitcoin_network, shard=shard, shards=shards
             )
-            self.session.commit()
-            raise e
-
-        if result:
-            for bitcoin_wallet in result.items():
-                wallet = self._rep_wallet.get(address=bitcoin_wallet[0])
-                wallet_cryptocurrency = self._rep_cryptocurrency_wallet.get(wallet_id=wallet.id)
-                new_count = bitcoin_wallet[1]
-                if new_count > 0 and \
-                        self._bitcoin_service.from_minimal_part(new_count) >= settings_db.minimum_bitcoin_in:
-                    if not self._repository_crypto_transaction.get(
-                            status=CryptoTransaction.StatusCryptoTransaction.pending,
-                            type=CryptoTransaction.TransactionType.in_system,
-                            wallet_crypto_id=wallet_cryptocurrency.id):
-                        self._repository_crypto_transaction.create({
-                            "network": wallet_cryptocurrency.wallet.network,
-                            "cryptocurrency": wallet_cryptocurrency.cryptocurrency,
-                            "count": bitcoin_wallet[1],
-                            "receive_address": settings.BITCOIN_ADDRESS,
-                            "type": CryptoTransaction.TransactionType.in_system,
-                            "wallet_crypto_id": wallet_cryptocurrency.id,
-                        })
-                        count = bitcoin_wallet[1]
-                        # TODO Добавить баланс пользователю.
-                        self.session.commit()
 
-        self._repository_settings.update(
-            db_obj=settings_db,
-            obj_in={
-                "transaction_bitcoin_wallet_check": TaskType.not_working
-            }
-        )
-
-        self.session.commit()
+            metrics = []
+            try:
+                result = await self._bitcoin_service.check_balances(wallets_to_check, metrics=metrics)
+            finally:
+                for metric in metrics:
+                    logger.info(
+                        f"BLOCKCHAIR CHUNK {metric.index}: size={metric.size} elapsed={metric.elapsed:.2f}s "
+                        f"attempts={metric.attempts} success={metric.success}"
+                    )
+
+            if result:
+                states = await run_sync(
+                    self._balance_scan_service.get_states, NetworkType.bitcoin_network, list(result)
+                )
+                deposits = {
+                    address: count
+                    for address, count in self._balance_scan_service.get_grown(result, states).items()
+                    if self._bitcoin_service.from_minimal_part(count) >= settings_db.minimum_bitcoin_in
+                }
+                new_transactions = []
+                open_sweeps = []
+                for wallet_cryptocurrency, has_in_system in await run_sync(
+                        self._rep_cryptocurrency_wallet.list_for_deposit_scan,
+                        addresses=list(deposits),
+                        cryptocurrency=CryptocurrencyType.bitcoin
+                ):
+                    if has_in_system:
+                        open_sweeps.append(wallet_cryptocurrency.wallet.address)
+                        continue
+                    new_transactions.append({
+                        "network": wallet_cryptocurrency.wallet.network,
+                        "cryptocurrency": wallet_cryptocurrency.cryptocurrency,
+                        "count": deposits[wallet_cryptocurrency.wallet.address],
+                        "receive_address": settings.BITCOIN_ADDRESS,
+                        "type": CryptoTransaction.TransactionType.in_system,
+                        "wallet_crypto_id": wallet_cryptocurrency.id,
+                    })
+                # TODO Добавить баланс пользователю.
+                lease.ensure()
+                await run_sync(self._repository_crypto_transaction.bulk_create, new_transactions)
+                try:
+                    # выходы пополненных адресов нужны для локальной сборки транзакций
+                    await self._bitcoin_service.sync_utxos([
+                        address for address in deposits if address not in open_sweeps
+                    ])
+                except Exception as e:
+                    logger.warning(f"BTC UTXO SYNC ERROR: {e}")
+                await run_sync(
+                    self._balance_scan_service.save,
+                    NetworkType.bitcoin_network,
+                    balances=result,
+                    states=states,
+                    block_height=max((metric.block_height for metric in metrics if metric.block_height), default=None),
+                    # баланс пополненного адреса не запоминается, пока вывод не завершился:
+                    # после неудачного вывода баланс снова окажется выше last_balance и пополнение найдётся заново
+                    keep_active=list(deposits)
+                )
+                await run_sync(self.session.commit)
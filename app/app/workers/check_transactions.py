@@ -1,25 +1,52 @@
-import httpx
+import asyncio
+
+from typing import Optional
 
 from .base import Base
 
+from app.db.session import run_sync
 from app.services.crypto.base import StatusTransaction
 from app.services.crypto import CryptoService
+from app.services.crypto.hd_wallet import HDWallet
 from app.services.rate import CheckCurrentCryptoCost
 
 from app.repository.wallet import RepositoryCryptoWallet
 from app.repository.transactions import RepositoryCryptoTransaction
-from app.repository.settings import RepositorySettings
 from app.repository.user import RepositoryUser
 
 from app.models.wallets import get_normal_name, NetworkType
 from app.models.transactions import CryptoTransaction
-from app.models.settings import TaskType
 
 from app.exceptions.erc20_exceptions import TransactionUnderPriced, TransactionInPool
 
+from app.utils.rate_limiter import RateLimiter
+from app.utils.lease_lock import LeaseLock
+
+from app.core.config import settings
+
 from loguru import logger
 
 
+def get_network_limiters() -> dict[NetworkType, RateLimiter]:
+    """
+        Свой лимит на каждый апстрим: BlockCypher, RPC ноды erc20 и Tron.
+    """
+    return {
+        NetworkType.bitcoin_network: RateLimiter(
+            settings.BLOCK_CYPHER_MAX_CONCURRENCY,
+            settings.BLOCK_CYPHER_RATE_LIMIT
+        ),
+        NetworkType.erc20: RateLimiter(
+            settings.ERC20_RPC_MAX_CONCURRENCY,
+            settings.ERC20_RPC_RATE_LIMIT
+        ),
+        NetworkType.trc20: RateLimiter(
+            settings.TRON_MAX_CONCURRENCY,
+            settings.TRON_RATE_LIMIT
+        ),
+    }
+
+
 class SendTransaction(Base):
 
     def __init__(
@@ -27,91 +54,208 @@ class SendTransaction(Base):
             repository_crypto_transaction: RepositoryCryptoTransaction,
             crypto_service: CryptoService,
             repository_crypto_wallet: RepositoryCryptoWallet,
-            settings_repository: RepositorySettings,
+            hd_wallet: HDWallet,
             *args, **kwargs
     ) -> None:
         self._repository_crypto_transaction = repository_crypto_transaction
         self._crypto_service = crypto_service
-        self._settings_repository = settings_repository
         self._repository_crypto_wallet = repository_crypto_wallet
+        self._hd_wallet = hd_wallet
         super().__init__(*args, **kwargs)
 
-    async def proccess(self, *args, **kwargs):
-        settings_db = self._settings_repository.get()
-        if settings_db.transaction_active != TaskType.not_working:
+    def _get_private_key(self, transaction: CryptoTransaction) -> str:
+        """
+            Ключ HD кошелька в БД не хранится и выводится из seed перед подписью.
+        """
+        if transaction.private_key:
+            return transaction.private_key
+        wallet = transaction.wallet_crypto.wallet
+        return self._hd_wallet.derive_private_key(wallet.network, wallet.derivation_index)
+
+    async def _consolidate_bitcoin(self, transactions: list[CryptoTransaction]):
+        """
+            Пополнения bitcoin уходят на BITCOIN_ADDRESS одной транзакцией,
+            все вошедшие в неё записи получают общий transaction_id.
+            С адреса тратятся только выходы, покрывающие сумму его записей. Если выходы дали больше
+            (выход крупнее пополнения), разница добавляется к последней записи адреса - ничего не выводится без записи.
+            Не вошедшие (лимит входов, дорогая сеть, ошибка) ждут следующего запуска.
+        """
+        if not transactions:
+            return
+        amounts = {}
+        for transaction in transactions:
+            amounts[transaction.sender_address] = amounts.get(transaction.sender_address, 0) + int(transaction.count)
+        try:
+            result = await self._crypto_service(NetworkType.bitcoin_network).consolidate(
+                private_keys={
+                    transaction.sender_address: self._get_private_key(transaction) for transaction in transactions
+                },
+                amounts=amounts,
+                destination_address=settings.BITCOIN_ADDRESS,
+                max_inputs=settings.BTC_CONSOLIDATION_MAX_INPUTS,
+                max_fee_rate=settings.BTC_CONSOLIDATION_MAX_FEE_RATE
+            )
+        except Exception as e:
+            logger.info(f"BTC CONSOLIDATION ERROR: {e}")
             return
-        self._settings_repository.update(
-            db_obj=settings_db,
-            obj_in={
-                "transaction_active": TaskType.pending
+        if not result:
+            return
+
+        transaction_id, swept = result
+        last_transactions = {transaction.sender_address: transaction for transaction in transactions}
+        updates = []
+        for transaction in transactions:
+            if transaction.sender_address not in swept:
+                continue
+            obj_in = {
+                "status": CryptoTransaction.StatusCryptoTransaction.pending,
+                "transaction_id": transaction_id
             }
-        )
+            if transaction is last_transactions[transaction.sender_address]:
+                obj_in["count"] = int(transaction.count) + swept[transaction.sender_address] - \
+                    amounts[transaction.sender_address]
+            updates.append((transaction, obj_in))
+        await run_sync(self._update_transactions, updates)
+
+    def _update_transactions(self, updates: list[tuple[CryptoTransaction, dict]]) -> None:
+        for transaction, obj_in in updates:
+            self._repository_crypto_transaction.update(db_obj=transaction, obj_in=obj_in)
+        self.session.commit()
+
+    async def _sync_erc20_nonces(self):
+        """
+            Nonce горячего кошелька выдаются локально (NonceManager), перед отправкой они сверяются с сетью,
+            зависшие транзакции заменяются с повышенной комиссией и записи получают новый transaction_id.
+        """
+        try:
+            changed = await self._crypto_service(NetworkType.erc20).sync_nonces(
+                {settings.ERC20_ADDRESS: settings.ERC20_PRIVATE_KEY}
+            )
+        except Exception as e:
+            logger.info(f"ERC20 NONCE SYNC ERROR: {e}")
+            return
+        await run_sync(self._replace_transaction_ids, changed)
+
+    def _replace_transaction_ids(self, changed: dict[str, str]) -> None:
+        for old_transaction_id, transaction_id in changed.items():
+            transaction = self._repository_crypto_transaction.get(transaction_id=old_transaction_id)
+            if transaction:
+                self._repository_crypto_transaction.update(
+                    db_obj=transaction,
+                    obj_in={
+                        "transaction_id": transaction_id
+                    }
+                )
         self.session.commit()
 
-        transactions = self._repository_crypto_transaction.list(
-            status=CryptoTransaction.StatusCryptoTransaction.not_send)
-        logger.info(f"TRANSACTIONS SEND: {transactions}")
+    @staticmethod
+    def _get_ready(transactions: list[CryptoTransaction]) -> list[CryptoTransaction]:
+        """
+            Граф зависимостей start_on_transaction_id уже в памяти (родитель загружен тем же запросом):
+            транзакция готова к отправке, если она ни от чего не зависит или родитель завершился успешно.
+        """
+        return [
+            transaction for transaction in transactions
+            if not transaction.start_on_transaction_id
+            or transaction.start_on_transaction.status == CryptoTransaction.StatusCryptoTransaction.success
+        ]
+
+    @staticmethod
+    def _group_by_sender(
+            transactions: list[CryptoTransaction]
+    ) -> dict[tuple[NetworkType, str], list[CryptoTransaction]]:
+        chains = {}
         for transaction in transactions:
-            try:
-                service = self._crypto_service(transaction.network, transaction.cryptocurrency)
-                if transaction.start_on_transaction_id:
-                    if self._repository_crypto_transaction.get(
-                            id=transaction.start_on_transaction_id).status != CryptoTransaction.StatusCryptoTransaction.success:
-                        continue
-                logger.info("SENDING TRANSACTION")
+            chains.setdefault((transaction.network, transaction.sender_address), []).append(transaction)
+        return chains
+
+    async def _send_chain(self, transactions: list[CryptoTransaction], limiter: RateLimiter, lease: LeaseLock):
+        """
+            Транзакции одного отправителя уходят по очереди в порядке создания,
+            разные отправители - параллельно.
+        """
+        for transaction in transactions:
+            # без действующей аренды отправлять нельзя: запуск мог перейти к другому воркеру
+            lease.ensure()
+            await self._send(transaction, limiter)
+
+    async def _send(self, transaction: CryptoTransaction, limiter: RateLimiter):
+        try:
+            service = self._crypto_service(transaction.network, transaction.cryptocurrency)
+            logger.info("SENDING TRANSACTION")
+            async with limiter:
                 transaction_id = await service.send_transaction(
                     public_key=transaction.public_key,
-                    private_key=transaction.private_key,
+                    private_key=self._get_private_key(transaction),
                     count=int(transaction.count),
                     destination_address=transaction.receive_address,
                     sender_address=transaction.sender_address,
                     transaction_price=transaction.transaction_price,
-                    use_transaction_price=transaction.use_transaction_price
+                    use_transaction_price=transaction.use_transaction_price,
+                    funded_fee=transaction.funded_fee
                 )
 
-                if not transaction_id:
-                    continue
+            if not transaction_id:
+                return
 
-                self._repository_crypto_transaction.update(
-                    db_obj=transaction,
+            await run_sync(self._update_transactions, [(transaction, {
+                "status": CryptoTransaction.StatusCryptoTransaction.pending,
+                "transaction_id": transaction_id
+            })])
+        except (TransactionUnderPriced, TransactionInPool):
+            pass
+        except Exception as e:
+            await run_sync(self._fail_transaction, transaction, e)
+
+    def _fail_transaction(self, transaction: CryptoTransaction, e: Exception) -> None:
+        if "401 Client Error: Unauthorized for url:" not in str(e):
+            logger.info(f"error: {e}")
+            self._repository_crypto_transaction.update(
+                db_obj=transaction,
+                obj_in={
+                    "status": CryptoTransaction.StatusCryptoTransaction.fail,
+                    "text": str(e)
+                }
+            )
+        if transaction.type in [CryptoTransaction.TransactionType.in_wallet,
+                                CryptoTransaction.TransactionType.out_system]:
+            if transaction.type == CryptoTransaction.TransactionType.out_system:
+                self._repository_crypto_wallet.update(
+                    db_obj=transaction.wallet_crypto,
                     obj_in={
-                        "status": CryptoTransaction.StatusCryptoTransaction.pending,
-                        "transaction_id": transaction_id
+                        "balance": transaction.wallet_crypto.balance + transaction.count + transaction.comission
+                        if transaction.comission else 0
                     }
                 )
-            except (TransactionUnderPriced, TransactionInPool):
-                pass
-            except Exception as e:
-                if "401 Client Error: Unauthorized for url:" not in str(e):
-                    logger.info(f"error: {e}")
-                    self._repository_crypto_transaction.update(
-                        db_obj=transaction,
-                        obj_in={
-                            "status": CryptoTransaction.StatusCryptoTransaction.fail,
-                            "text": str(e)
-                        }
-                    )
-                if transaction.type in [CryptoTransaction.TransactionType.in_wallet,
-                                        CryptoTransaction.TransactionType.out_system]:
-                    if transaction.type == CryptoTransaction.TransactionType.out_system:
-                        self._repository_crypto_wallet.update(
-                            db_obj=transaction.wallet_crypto,
-                            obj_in={
-                                "balance": transaction.wallet_crypto.balance + transaction.count + transaction.comission
-                                if transaction.comission else 0
-                            }
-                        )
-
-            self.session.commit()
-
-        self._settings_repository.update(
-            db_obj=settings_db,
-            obj_in={
-                "transaction_active": TaskType.not_working
-            }
-        )
+
         self.session.commit()
 
+    async def proccess(self, shard: int = 0, shards: int = 1, *args, **kwargs):
+        async with self.lease(self.shard_name(shard, shards)) as lease:
+            if shard == 0:
+                # горячий кошелёк один на все шарды, замены зависших транзакций делает только первый
+                await self._sync_erc20_nonces()
+
+            transactions = await run_sync(self._repository_crypto_transaction.list_for_send, shard=shard, shards=shards)
+            logger.info(f"TRANSACTIONS SEND: {transactions}")
+            if settings.BTC_CONSOLIDATION_ENABLED:
+                await self._consolidate_bitcoin([
+                    transaction for transaction in transactions
+                    if transaction.network == NetworkType.bitcoin_network
+                    and transaction.type == CryptoTransaction.TransactionType.in_system
+                ])
+                transactions = [
+                    transaction for transaction in transactions
+                    if transaction.network != NetworkType.bitcoin_network
+                    or transaction.type != CryptoTransaction.TransactionType.in_system
+                ]
+
+            limiters = get_network_limiters()
+            await asyncio.gather(*[
+                self._send_chain(chain, limiters[network], lease)
+                for (network, _), chain in self._group_by_sender(self._get_ready(transactions)).items()
+            ])
+
 
 class CheckTransaction(Base):
 
@@ -120,51 +264,127 @@ class CheckTransaction(Base):
             repository_crypto_transaction: RepositoryCryptoTransaction,
             repository_cryptocurrency_wallet: RepositoryCryptoWallet,
             crypto_service: CryptoService,
-            settings_repository: RepositorySettings,
             rate_service: CheckCurrentCryptoCost,
             repository_user: RepositoryUser, *args, **kwargs
     ):
         self._repository_crypto_transaction = repository_crypto_transaction
         self._rep_cryptocurrency_wallet = repository_cryptocurrency_wallet
-        self._settings_repository = settings_repository
         self._rate_service = rate_service
         self._repository_user = repository_user
         self._crypto_service = crypto_service
         super().__init__(*args, **kwargs)
 
-    async def proccess(self, *args, **kwargs):
-        settings_db = self._settings_repository.get()
-        if settings_db.transaction_check_active != TaskType.not_working:
-            return
-        self._settings_repository.update(
-            db_obj=settings_db,
-            obj_in={
-                "transaction_check_active": TaskType.pending
-            }
-        )
-        self.session.commit()
+    async def _check_status(
+            self,
+            transaction: CryptoTransaction,
+            limiter: RateLimiter
+    ) -> tuple[CryptoTransaction, StatusTransaction]:
+        service = self._crypto_service(transaction.network, transaction.cryptocurrency)
+        async with limiter:
+            try:
+                return transaction, await service.check_transaction(transaction.transaction_id)
+            except Exception as e:
+                logger.error(f"CHECK TRANSACTION {transaction.id} ERROR: {e}")
+                return transaction, StatusTransaction.pending
 
-        transactions = self._repository_crypto_transaction.list(
-            status=CryptoTransaction.StatusCryptoTransaction.pending
-        )
-        for transaction in transactions:
-            service = self._crypto_service(transaction.network, transaction.cryptocurrency)
-            result = await service.check_transaction(transaction.transaction_id)
+    async def _check_erc20_statuses(
+            self,
+            transactions: list[CryptoTransaction],
+            limiter: RateLimiter
+    ) -> list[tuple[CryptoTransaction, StatusTransaction]]:
+        """
+            Квитанции eth и токенов лежат в одной сети, поэтому запрашиваются одним batch вызовом.
+            limiter занимается на каждый batch запрос внутри check_transactions.
+        """
+        transaction_ids = [transaction.transaction_id for transaction in transactions if transaction.transaction_id]
+        statuses = {}
+        if transaction_ids:
+            try:
+                statuses = await self._crypto_service(NetworkType.erc20).check_transactions(transaction_ids, limiter)
+            except Exception as e:
+                logger.error(f"CHECK ERC20 TRANSACTIONS ERROR: {e}")
+        return [
+            (transaction, statuses.get(transaction.transaction_id, StatusTransaction.pending))
+            for transaction in transactions
+        ]
+
+    async def _check_bitcoin_statuses(
+            self,
+            transactions: list[CryptoTransaction],
+            limiter: RateLimiter
+    ) -> list[tuple[CryptoTransaction, StatusTransaction]]:
+        """
+            Сведённые пополнения делят один hash, каждый hash проверяется один раз.
+        """
+        service = self._crypto_service(NetworkType.bitcoin_network)
+
+        async def check(transaction_id: str) -> StatusTransaction:
+            async with limiter:
+                try:
+                    return await service.check_transaction(transaction_id)
+                except Exception as e:
+                    logger.error(f"CHECK BTC TRANSACTION {transaction_id} ERROR: {e}")
+                    return StatusTransaction.pending
+
+        transaction_ids = list({transaction.transaction_id for transaction in transactions})
+        statuses = dict(zip(transaction_ids, await asyncio.gather(*[
+            check(transaction_id) for transaction_id in transaction_ids
+        ])))
+        return [(transaction, statuses[transaction.transaction_id]) for transaction in transactions]
+
+    async def _get_rate(self, coin_name: str) -> Optional[float]:
+        try:
+            return await self._rate_service.get(coin_name)
+        except Exception as e:
+            logger.error(f"GET RATE {coin_name} ERROR: {e}")
+            return None
+
+    async def proccess(self, shard: int = 0, shards: int = 1, *args, **kwargs):
+        async with self.lease(self.shard_name(shard, shards)) as lease:
+            transactions = await run_sync(self._repository_crypto_transaction.list_pending, shard=shard, shards=shards)
+            limiters = get_network_limiters()
+            erc20_transactions = [
+                transaction for transaction in transactions if transaction.network == NetworkType.erc20
+            ]
+            bitcoin_transactions = [
+                transaction for transaction in transactions if transaction.network == NetworkType.bitcoin_network
+            ]
+            statuses, erc20_statuses, bitcoin_statuses = await asyncio.gather(
+                asyncio.gather(*[
+                    self._check_status(transaction, limiters[transaction.network])
+                    for transaction in transactions if transaction.network == NetworkType.trc20
+                ]),
+                self._check_erc20_statuses(erc20_transactions, limiters[NetworkType.erc20]),
+                self._check_bitcoin_statuses(bitcoin_transactions, limiters[NetworkType.bitcoin_network])
+            )
+            results = [*statuses, *erc20_statuses, *bitcoin_statuses]
+
+            rates = {}
+            for transaction, result in results:
+                if result == StatusTransaction.success and transaction.type == transaction.TransactionType.in_system:
+                    coin_name = get_normal_name(transaction.cryptocurrency)
+                    if coin_name not in rates:
+                        rates[coin_name] = await self._get_rate(coin_name)
+            await run_sync(self._apply_results, results, rates, lease)
+
+    def _apply_results(
+            self,
+            results: list[tuple[CryptoTransaction, StatusTransaction]],
+            rates: dict[str, Optional[float]],
+            lease: LeaseLock
+    ) -> None:
+        statuses = []
+        for transaction, result in results:
             logger.info(f"RESULT TRANSACTION: {result}")
+            service = self._crypto_service(transaction.network, transaction.cryptocurrency)
             if result == StatusTransaction.success:
-                self._repository_crypto_transaction.update(
-                    db_obj=transaction,
-                    obj_in={
-                        "status": CryptoTransaction.StatusCryptoTransaction.success,
-                    }
-                )
-
                 if transaction.type == transaction.TransactionType.in_system:
                     # POST ЗАПРОС НА ВЕБ ХУК
-                    new_count_balance = await self._rate_service.get(
-                        get_normal_name(transaction.cryptocurrency),
-                        count=service.from_minimal_part(transaction.count)
-                    )
+                    coin_name = get_normal_name(transaction.cryptocurrency)
+                    if rates[coin_name] is None:
+                        # без курса зачисление откладывается: транзакция остаётся pending до следующего запуска
+                        continue
+                    new_count_balance = rates[coin_name] * float(service.from_minimal_part(transaction.count))
                     self._rep_cryptocurrency_wallet.update(
                         db_obj=transaction.wallet_crypto,
                         obj_in={
@@ -172,14 +392,10 @@ class CheckTransaction(Base):
                             "actual_wallet_balance": new_count_balance
                         }
                     )
+                statuses.append({"id": transaction.id, "status": CryptoTransaction.StatusCryptoTransaction.success})
 
             elif result == StatusTransaction.failed:
-                self._repository_crypto_transaction.update(
-                    db_obj=transaction,
-                    obj_in={
-                        "status": CryptoTransaction.StatusCryptoTransaction.fail,
-                    }
-                )
+                statuses.append({"id": transaction.id, "status": CryptoTransaction.StatusCryptoTransaction.fail})
 
                 if transaction.type == transaction.TransactionType.out_system:
                     self._rep_cryptocurrency_wallet.update(
@@ -189,13 +405,9 @@ class CheckTransaction(Base):
                         }
                     )
 
-            self.session.commit()
-
-        self._settings_repository.update(
-            db_obj=settings_db,
-            obj_in={
-                "transaction_check_active": TaskType.not_working
-            }
-        )
+        # статусы - одним UPDATE, балансы кошельков - через сессию: один кошелёк может встретиться дважды
+        self._repository_crypto_transaction.bulk_update(statuses)
 
+        # зачисления применяются только пока аренда не перешла к другому воркеру
+        lease.ensure()
         self.session.commit()
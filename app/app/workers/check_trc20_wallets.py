@@ -1,6 +1,8 @@
 from .base import Base
 
+from app.db.session import run_sync
 from app.services.crypto.trc20 import TRXService, USDTTrc20Service
+from app.services.balance_scan import BalanceScanService
 
 from app.repository.wallet import RepositoryWallet, RepositoryCryptoWallet
 from app.repository.transactions import RepositoryCryptoTransaction
@@ -8,9 +10,9 @@ from app.repository.settings import RepositorySettings
 
 from app.models.wallets import NetworkType, CryptocurrencyType
 from app.models.transactions import CryptoTransaction
-from app.models.settings import TaskType
 
 from app.core.config import settings
+from app.utils.lease_lock import LeaseLock
 
 from loguru import logger
 
@@ -24,95 +26,101 @@ class CheckTRC20Wallets(Base):
             repository_crypto_transaction: RepositoryCryptoTransaction,
             repository_cryptocurrency_wallet: RepositoryCryptoWallet,
             repository_settings: RepositorySettings,
+            balance_scan_service: BalanceScanService,
             *args, **kwargs
     ) -> None:
         self._usdt_trc20_service = usdt_trc20_service
+        self._balance_scan_service = balance_scan_service
         self._rep_wallet = repository_wallet
         self._rep_cryptocurrency_wallet = repository_cryptocurrency_wallet
         self._repository_crypto_transaction = repository_crypto_transaction
         self._repository_settings = repository_settings
         super().__init__(*args, **kwargs)
 
-    async def proccess(self, *args, **kwargs):
-        wallets_usdt = self._rep_wallet.get_list_addresses(network=NetworkType.trc20)
-        settings_db = self._repository_settings.get()
-
-        if settings_db.transaction_trc20_check != TaskType.not_working:
-            return
-
-        self._repository_settings.update(
-            db_obj=settings_db,
-            obj_in={
-                "transaction_trc20_check": TaskType.pending
-            }
-        )
-
-        self.session.commit()
+    def _record_deposit(self, address: str, balance: int, settings_db, lease: LeaseLock) -> None:
+        """
+            Зачисление, комиссия trx и вывод на TRC20_ADDRESS, если у кошелька ещё нет незавершённого вывода.
+        """
+        wallet = self._rep_wallet.get(address=address)
+        wallet_cryptocurrency = self._rep_cryptocurrency_wallet.get(wallet_id=wallet.id)
+        if not self._repository_crypto_transaction.get(
+                status=CryptoTransaction.StatusCryptoTransaction.not_send,
+                type=CryptoTransaction.TransactionType.in_system,
+                wallet_crypto_id=wallet_cryptocurrency.id,
+                cryptocurrency=CryptocurrencyType.usdt_trc20
+        ):
+            if not self._repository_crypto_transaction.get(
+                status=CryptoTransaction.StatusCryptoTransaction.pending,
+                type=CryptoTransaction.TransactionType.in_system,
+                wallet_crypto_id=wallet_cryptocurrency.id,
+                cryptocurrency=CryptocurrencyType.usdt_trc20
+        ):
+
+                lease.ensure()
+                waiting_to_up_balance_transaction = self._repository_crypto_transaction.create({
+                    "network": NetworkType.trc20,
+                    "type": CryptoTransaction.TransactionType.in_wallet,
+                    "cryptocurrency": CryptocurrencyType.usdt_trc20,
+                    "count": balance,
+                    "status": CryptoTransaction.StatusCryptoTransaction.success,
+                    "receive_address": wallet.address,
+                    "wallet_crypto_id": wallet_cryptocurrency.id
+                })
+
+                transaction_commission = self._repository_crypto_transaction.create(
+                    {
+                        "network": wallet_cryptocurrency.wallet.network,
+                        "cryptocurrency": CryptocurrencyType.trx,
+                        "count": self._usdt_trc20_service.to_minimal_part(
+                            amount=settings_db.usdt_trc_fee_limit
+                        ),
+                        "receive_address": wallet.address,
+                        "type": CryptoTransaction.TransactionType.comission,
+                        "wallet_crypto_id": wallet_cryptocurrency.id,
+                        "status": CryptoTransaction.StatusCryptoTransaction.not_send,
+                        "start_on_transaction_id": waiting_to_up_balance_transaction.id
+                    }
+                )
+                self._repository_crypto_transaction.create(
+                    {
+                        "network": wallet_cryptocurrency.wallet.network,
+                        "cryptocurrency": CryptocurrencyType.usdt_trc20,
+                        "count": balance,
+                        "receive_address": settings.TRC20_ADDRESS,
+                        "type": CryptoTransaction.TransactionType.in_system,
+                        "wallet_crypto_id": wallet_cryptocurrency.id,
+                        "status": CryptoTransaction.StatusCryptoTransaction.not_send,
+                        "start_on_transaction_id": transaction_commission.id
+                    }
+                )
+
+                self.session.commit()
+
+    async def proccess(self, shard: int = 0, shards: int = 1, *args, **kwargs):
+        async with self.lease(self.shard_name(shard, shards)) as lease:
+            settings_db = await run_sync(self._repository_settings.get)
+
+            balances = await self._usdt_trc20_service.check_balances(
+                addresses=await run_sync(
+                    self._balance_scan_service.get_due_addresses, NetworkType.trc20, shard=shard, shards=shards
+                )
+            )
 
-        for wallet in wallets_usdt:
-            result = await self._usdt_trc20_service.check_balance(
-                address=wallet[0]
+            states = await run_sync(self._balance_scan_service.get_states, NetworkType.trc20, list(balances))
+            keep_active = []
+            for address, balance in self._balance_scan_service.get_grown(balances, states).items():
+                result = self._usdt_trc20_service.from_minimal_part(balance)
+                if result > 0 and result >= settings_db.minimum_usdt_trc_in:
+                    await run_sync(self._record_deposit, address, balance, settings_db, lease)
+                    # баланс не запоминается, пока вывод не завершился: после неудачного вывода
+                    # баланс снова окажется выше last_balance и пополнение найдётся заново
+                    keep_active.append(address)
+
+            await run_sync(
+                self._balance_scan_service.save,
+                NetworkType.trc20,
+                balances=balances,
+                states=states,
+                keep_active=keep_active
             )
-            if result > 0 and result >= settings_db.minimum_usdt_trc_in:
-                wallet = self._rep_wallet.get(address=wallet[0])
-                wallet_cryptocurrency = self._rep_cryptocurrency_wallet.get(wallet_id=wallet.id)
-                if not self._repository_crypto_transaction.get(
-                        status=CryptoTransaction.StatusCryptoTransaction.not_send,
-                        type=CryptoTransaction.TransactionType.in_system,
-                        wallet_crypto_id=wallet_cryptocurrency.id,
-                        cryptocurrency=CryptocurrencyType.usdt_trc20
-                ):
-                    if not self._repository_crypto_transaction.get(
-                        status=CryptoTransaction.StatusCryptoTransaction.pending,
-                        type=CryptoTransaction.TransactionType.in_system,
-                        wallet_crypto_id=wallet_cryptocurrency.id,
-                        cryptocurrency=CryptocurrencyType.usdt_trc20
-                ):
-
-                        waiting_to_up_balance_transaction = self._repository_crypto_transaction.create({
-                            "network": NetworkType.trc20,
-                            "type": CryptoTransaction.TransactionType.in_wallet,
-                            "cryptocurrency": CryptocurrencyType.usdt_trc20,
-                            "count": self._usdt_trc20_service.to_minimal_part(amount=result),
-                            "status": CryptoTransaction.StatusCryptoTransaction.success,
-                            "receive_address": wallet.address,
-                            "wallet_crypto_id": wallet_cryptocurrency.id
-                        })
-
-                        transaction_commission = self._repository_crypto_transaction.create(
-                            {
-                                "network": wallet_cryptocurrency.wallet.network,
-                                "cryptocurrency": CryptocurrencyType.trx,
-                                "count": self._usdt_trc20_service.to_minimal_part(
-                                    amount=settings_db.usdt_trc_fee_limit
-                                ),
-                                "receive_address": wallet.address,
-                                "type": CryptoTransaction.TransactionType.comission,
-                                "wallet_crypto_id": wallet_cryptocurrency.id,
-                                "status": CryptoTransaction.StatusCryptoTransaction.not_send,
-                                "start_on_transaction_id": waiting_to_up_balance_transaction.id
-                            }
-                        )
-                        self._repository_crypto_transaction.create(
-                            {
-                                "network": wallet_cryptocurrency.wallet.network,
-                                "cryptocurrency": CryptocurrencyType.usdt_trc20,
-                                "count": self._usdt_trc20_service.to_minimal_part(amount=result),
-                                "receive_address": settings.TRC20_ADDRESS,
-                                "type": CryptoTransaction.TransactionType.in_system,
-                                "wallet_crypto_id": wallet_cryptocurrency.id,
-                                "status": CryptoTransaction.StatusCryptoTransaction.not_send,
-                                "start_on_transaction_id": transaction_commission.id
-                            }
-                        )
-
-                        self.session.commit()
-
-        self._repository_settings.update(
-            db_obj=settings_db,
-            obj_in={
-                "transaction_trc20_check": TaskType.not_working
-            }
-        )
-
-        self.session.commit()
+            await run_sync(self.session.commit)
@@ -0,0 +1,13 @@
+from celery import group
+
+from app.core.celery import celery_app
+
+
+@celery_app.task(name="workers.fan_out")
+def fan_out(task_name: str, shards: int):
+    """
+        Запускает по подзадаче на каждый шард, шарды разбираются параллельно свободными воркерами.
+    """
+    group(
+        celery_app.signature(task_name, kwargs={"shard": shard, "shards": shards}) for shard in range(shards)
+    ).apply_async()
@@ -0,0 +1,29 @@
+from .base import Base
+
+from app.db.session import run_sync
+from app.services.deposit_address_pool import DepositAddressPool
+
+from loguru import logger
+
+
+class RefillDepositAddressPool(Base):
+
+    def __init__(
+            self,
+            deposit_address_pool: DepositAddressPool,
+            *args, **kwargs
+    ) -> None:
+        self._deposit_address_pool = deposit_address_pool
+        super().__init__(*args, **kwargs)
+
+    async def proccess(self, *args, **kwargs):
+        # пересекающиеся запуски прочитали бы один и тот же дефицит и оба дополнили бы пул
+        async with self.lease() as lease:
+            filled = await self._deposit_address_pool.fill()
+            if filled:
+                logger.info(f"DEPOSIT ADDRESS POOL FILLED: {filled}")
+            lease.ensure()
+            # адреса фиксируются до регистрации в alchemy, неудачная регистрация повторится на следующем запуске
+            await run_sync(self.session.commit)
+
+            await self._deposit_address_pool.register_pending()
@@ -0,0 +1,22 @@
+from .base import Base
+
+from app.services.fee_oracle import FeeOracle
+
+from loguru import logger
+
+
+class RefreshFees(Base):
+
+    def __init__(
+            self,
+            fee_oracle: FeeOracle,
+            *args, **kwargs
+    ) -> None:
+        self._fee_oracle = fee_oracle
+        super().__init__(*args, **kwargs)
+
+    async def proccess(self, *args, **kwargs):
+        for network, estimate in (await self._fee_oracle.refresh_all()).items():
+            logger.info(
+                f"FEE {network.value}: slow={estimate.slow} standard={estimate.standard} fast={estimate.fast}"
+            )
@@ -0,0 +1,39 @@
+import asyncio
+import os
+import threading
+
+from typing import Any, Coroutine, Optional
+
+
+class WorkerRuntime:
+    """
+        Один долгоживущий event loop на процесс воркера, работает в отдельном потоке.
+
+        Задачи celery только передают в него корутины и ждут результат. Всё, что привязано к loop
+        (пулы HttpClient, фоновые задачи FeeOracle и LeaseLock), живёт между запусками.
+        Запуски из разных потоков celery чередуются на await: внешние вызовы асинхронные, а работа
+        с синхронными репозиториями уходит в поток через run_sync и loop не блокирует. Каждый запуск
+        идёт в своём Task со своим контекстом, поэтому scope из life_cycle даёт ему отдельную сессию
+        scoped_session, и её же получает поток run_sync.
+        После fork (prefork пул) loop создаётся заново в дочернем процессе.
+    """
+
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                threading.Thread(target=self._loop.run_forever, name="worker-runtime", daemon=True).start()
+            return self._loop
+
+    def run(self, coroutine: Coroutine) -> Any:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+
+runtime = WorkerRuntime()
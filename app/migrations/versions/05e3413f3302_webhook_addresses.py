@@ -0,0 +1,53 @@
+"""webhook addresses
+
+Revision ID: 05e3413f3302
+Revises: 2a5834d2f1ec
+Create Date: 2026-10-18 11:03:57.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '05e3413f3302'
+down_revision = '2a5834d2f1ec'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('webhook_addresses',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('webhook_id', sa.UUID(), nullable=True),
+    sa.Column('address', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['webhook_id'], ['webhookerc20alchemies.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_webhook_addresses_webhook_id'), 'webhook_addresses', ['webhook_id'], unique=False)
+    op.create_index(op.f('ix_webhook_addresses_address'), 'webhook_addresses', ['address'], unique=True)
+
+    # gen_random_uuid() появился только в postgres 13
+    op.execute("""
+        INSERT INTO webhook_addresses (id, webhook_id, address)
+        SELECT md5(random()::text || clock_timestamp()::text)::uuid, webhook.id, address.value
+        FROM webhookerc20alchemies AS webhook,
+             jsonb_array_elements_text(COALESCE(webhook.address, '[]'::jsonb)) AS address(value)
+        ON CONFLICT (address) DO NOTHING
+    """)
+    op.drop_column('webhookerc20alchemies', 'address')
+
+
+def downgrade() -> None:
+    op.add_column('webhookerc20alchemies', sa.Column('address', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.execute("""
+        UPDATE webhookerc20alchemies AS webhook
+        SET address = COALESCE(
+            (SELECT jsonb_agg(webhook_address.address) FROM webhook_addresses AS webhook_address
+             WHERE webhook_address.webhook_id = webhook.id),
+            '[]'::jsonb
+        )
+    """)
+    op.drop_index(op.f('ix_webhook_addresses_address'), table_name='webhook_addresses')
+    op.drop_index(op.f('ix_webhook_addresses_webhook_id'), table_name='webhook_addresses')
+    op.drop_table('webhook_addresses')
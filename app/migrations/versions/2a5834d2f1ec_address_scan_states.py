@@ -0,0 +1,37 @@
+"""address scan states
+
+Revision ID: 2a5834d2f1ec
+Revises: a3382965340a
+Create Date: 2026-10-18 10:12:31.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '2a5834d2f1ec'
+down_revision = 'a3382965340a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('addressscanstates',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('network', postgresql.ENUM('bitcoin_network', 'erc20', 'trc20', name='networktype', create_type=False), nullable=False),
+    sa.Column('address', sa.String(), nullable=False),
+    sa.Column('last_balance', sa.Numeric(precision=30, scale=0), nullable=True),
+    sa.Column('last_block_height', sa.BigInteger(), nullable=True),
+    sa.Column('idle_checks', sa.Integer(), nullable=True),
+    sa.Column('last_checked_at', sa.DateTime(), nullable=True),
+    sa.Column('next_check_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('network', 'address', name='uq_addressscanstates_network_address')
+    )
+    op.create_index(op.f('ix_addressscanstates_next_check_at'), 'addressscanstates', ['next_check_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_addressscanstates_next_check_at'), table_name='addressscanstates')
+    op.drop_table('addressscanstates')
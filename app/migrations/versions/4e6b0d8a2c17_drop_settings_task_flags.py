@@ -0,0 +1,36 @@
+"""drop settings task flags
+
+Revision ID: 4e6b0d8a2c17
+Revises: d3e7a1c4f920
+Create Date: 2026-10-18 16:05:12.604417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '4e6b0d8a2c17'
+down_revision = 'd3e7a1c4f920'
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    'transaction_active',
+    'transaction_check_active',
+    'transaction_bitcoin_wallet_check',
+    'transaction_trc20_check',
+)
+
+
+def upgrade() -> None:
+    for column in COLUMNS:
+        op.drop_column('settings', column)
+    postgresql.ENUM(name='tasktype').drop(op.get_bind(), checkfirst=True)
+
+
+def downgrade() -> None:
+    task_type = postgresql.ENUM('not_working', 'pending', 'stoping', name='tasktype')
+    task_type.create(op.get_bind(), checkfirst=True)
+    for column in COLUMNS:
+        op.add_column('settings', sa.Column(column, postgresql.ENUM(name='tasktype', create_type=False), nullable=True))
@@ -0,0 +1,30 @@
+"""hd wallet derivation index
+
+Revision ID: 7c41d9e2b6a8
+Revises: 05e3413f3302
+Create Date: 2026-10-18 14:02:17.305561
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7c41d9e2b6a8'
+down_revision = '05e3413f3302'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('wallets_derivation_index_seq', start=0, minvalue=0)))
+    op.add_column('wallets', sa.Column('derivation_index', sa.Integer(), nullable=True))
+    op.create_index(
+        'uq_wallets_network_derivation_index', 'wallets', ['network', 'derivation_index'],
+        unique=True, postgresql_where=sa.text('derivation_index IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_wallets_network_derivation_index', table_name='wallets')
+    op.drop_column('wallets', 'derivation_index')
+    op.execute(sa.schema.DropSequence(sa.Sequence('wallets_derivation_index_seq')))
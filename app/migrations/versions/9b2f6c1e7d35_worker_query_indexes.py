@@ -0,0 +1,86 @@
+"""worker query indexes
+
+Revision ID: 9b2f6c1e7d35
+Revises: 4e6b0d8a2c17
+Create Date: 2026-10-18 17:20:41.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9b2f6c1e7d35'
+down_revision = '4e6b0d8a2c17'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    (
+        'ix_cryptocurrencytransactions_active', 'cryptocurrencytransactions', ['status', 'created_at', 'id'],
+        dict(postgresql_where=sa.text("status IN ('not_send', 'pending')"))
+    ),
+    (
+        'ix_cryptocurrencytransactions_wallet_type_status', 'cryptocurrencytransactions',
+        ['wallet_crypto_id', 'type', 'status', 'cryptocurrency'], dict()
+    ),
+    (
+        'uq_cryptocurrencytransactions_transaction_id', 'cryptocurrencytransactions',
+        ['transaction_id', 'wallet_crypto_id'],
+        dict(unique=True, postgresql_where=sa.text('transaction_id IS NOT NULL'))
+    ),
+    ('uq_wallets_address', 'wallets', ['address'], dict(unique=True)),
+    ('ix_wallets_user_id_network', 'wallets', ['user_id', 'network'], dict()),
+    ('ix_tokenwallets_wallet_id_cryptocurrency', 'tokenwallets', ['wallet_id', 'cryptocurrency'], dict()),
+    ('ix_tokenwallets_user_id', 'tokenwallets', ['user_id'], dict()),
+)
+
+
+def _index_state(name: str):
+    """
+        None, если индекса нет, иначе indisvalid: после прерванного CREATE INDEX CONCURRENTLY
+        остаётся INVALID индекс, который не используется запросами и мешает создать его заново.
+    """
+    return op.get_bind().execute(
+        sa.text(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND pg_catalog.pg_table_is_visible(c.oid)"
+        ),
+        {"name": name}
+    ).scalar()
+
+
+def _check_duplicates(name: str, table: str, columns: list, kwargs: dict) -> None:
+    where = kwargs.get('postgresql_where')
+    keys = ', '.join(columns)
+    duplicates = op.get_bind().execute(sa.text(
+        f"SELECT {keys}, count(*) FROM {table} "
+        f"{f'WHERE {where.text} ' if where is not None else ''}"
+        f"GROUP BY {keys} HAVING count(*) > 1 LIMIT 10"
+    )).fetchall()
+    if duplicates:
+        raise RuntimeError(
+            f"Cannot create unique index {name}: {table} has duplicate ({keys}), "
+            f"remove them and re-run the migration. Examples: {[tuple(row) for row in duplicates]}"
+        )
+
+
+def upgrade() -> None:
+    for name, table, columns, kwargs in INDEXES:
+        if kwargs.get('unique') and not _index_state(name):
+            _check_duplicates(name, table, columns, kwargs)
+    # CONCURRENTLY не блокирует запись в таблицы, но не может выполняться внутри транзакции.
+    # Уже созданные индексы пропускаются, поэтому миграцию можно перезапустить после сбоя.
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            state = _index_state(name)
+            if state:
+                continue
+            if state is not None:
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            op.create_index(name, table, columns, postgresql_concurrently=True, **kwargs)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
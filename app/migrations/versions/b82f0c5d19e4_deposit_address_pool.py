@@ -0,0 +1,37 @@
+"""deposit address pool
+
+Revision ID: b82f0c5d19e4
+Revises: 7c41d9e2b6a8
+Create Date: 2026-10-18 14:41:08.927314
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'b82f0c5d19e4'
+down_revision = '7c41d9e2b6a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('depositaddresses',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('network', postgresql.ENUM('bitcoin_network', 'erc20', 'trc20', name='networktype', create_type=False), nullable=False),
+    sa.Column('address', sa.String(), nullable=False),
+    sa.Column('public_key', sa.String(), nullable=True),
+    sa.Column('private_key', sa.String(), nullable=True),
+    sa.Column('derivation_index', sa.Integer(), nullable=True),
+    sa.Column('ready', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('address')
+    )
+    op.create_index('ix_depositaddresses_network_ready', 'depositaddresses', ['network', 'ready'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_depositaddresses_network_ready', table_name='depositaddresses')
+    op.drop_table('depositaddresses')
@@ -0,0 +1,35 @@
+"""bitcoin utxos
+
+Revision ID: d3e7a1c4f920
+Revises: b82f0c5d19e4
+Create Date: 2026-10-18 15:20:44.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd3e7a1c4f920'
+down_revision = 'b82f0c5d19e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('bitcoinutxos',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('txid', sa.String(), nullable=False),
+    sa.Column('vout', sa.Integer(), nullable=False),
+    sa.Column('address', sa.String(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.Column('spent_txid', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('txid', 'vout', name='uq_bitcoinutxos_txid_vout')
+    )
+    op.create_index(op.f('ix_bitcoinutxos_address'), 'bitcoinutxos', ['address'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_bitcoinutxos_address'), table_name='bitcoinutxos')
+    op.drop_table('bitcoinutxos')
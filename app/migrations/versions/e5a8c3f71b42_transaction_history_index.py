@@ -0,0 +1,30 @@
+"""transaction history index
+
+Revision ID: e5a8c3f71b42
+Revises: 9b2f6c1e7d35
+Create Date: 2026-10-18 18:03:27.540912
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e5a8c3f71b42'
+down_revision = '9b2f6c1e7d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_cryptocurrencytransactions_wallet_created_at', 'cryptocurrencytransactions',
+            ['wallet_crypto_id', 'created_at', 'id'], postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_cryptocurrencytransactions_wallet_created_at', table_name='cryptocurrencytransactions',
+            postgresql_concurrently=True
+        )
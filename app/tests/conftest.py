@@ -0,0 +1,20 @@
+import os
+
+# Settings читаются из окружения при импорте app.core.config, тестам хватает заглушек
+for name in (
+    "SECRET_KEY", "PROJECT_NAME", "BASE_URL",
+    "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_SERVER", "POSTGRES_DB",
+    "BITCOIN_ADDRESS", "BITCOIN_PUBLIC_KEY", "BITCOIN_PRIVATE_KEY",
+    "ERC20_ADDRESS", "ERC20_PUBLIC_KEY", "ERC20_PRIVATE_KEY",
+    "TRC20_ADDRESS", "TRC20_PUBLIC_KEY", "TRC20_PRIVATE_KEY",
+    "ALCHEMY_API_KEY", "WEBHOOK_ALCHEMY_TOKEN", "WEBHOOK_ALCHEMY_URL",
+    "CHECK_RATES_URL_TOKENS",
+    "BLOCK_CYPHER_API_URL", "BLOCK_CYPHER_API_TOKEN", "BLOCK_CYPHER_API_URL_NETWORK",
+    "BLOCKCHAIR_API_URL", "BLOCK_CHAIR_NETWORK", "USDT_TRC20_CONTRACT_ADDRESS", "TRONSCAN_URL",
+):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("REDIS_HOST", "localhost")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("ALCHEMY_API_URL", "http://127.0.0.1:1")
+os.environ.setdefault("USDT_ERC20_ABI_CONTRACT", "[]")
+os.environ.setdefault("USDT_ERC20_ADDRESS_CONTRACT", "0xdAC17F958D2ee523a2206206994597C13D831ec7")
@@ -0,0 +1,116 @@
+import asyncio
+
+from coincurve import PrivateKey
+
+from app.services.crypto.btc import Bitcoin, BitcoinTransactionBuilder, Utxo
+
+BUILDER = BitcoinTransactionBuilder()
+PRIVATE_KEYS = ["11" * 32, "22" * 32]
+ADDRESSES = [
+    BUILDER.p2wpkh_address(PrivateKey(bytes.fromhex(private_key)).public_key.format(compressed=True).hex())
+    for private_key in PRIVATE_KEYS
+]
+FIRST, SECOND = ADDRESSES
+DESTINATION = BUILDER.p2wpkh_address("03ad1d8e89212f0b92c74d23bb710c00662ad1470198ac48c43f7d6f93a2a26873")
+
+
+class StubUtxoSet:
+    def __init__(self, utxos: list[Utxo]):
+        self.utxos = utxos
+        self.synced = []
+        self.spent = []
+
+    async def list_unspent(self, addresses: list[str]) -> list[Utxo]:
+        return [utxo for utxo in self.utxos if utxo.address in addresses]
+
+    async def sync(self, addresses: list[str]) -> None:
+        self.synced.append(addresses)
+
+    async def spend(self, inputs: list[Utxo], txid: str, change=None) -> None:
+        self.spent.append((inputs, txid))
+
+
+class StubFeeOracle:
+    def __init__(self, fee: int):
+        self.fee = fee
+
+    async def get(self, network, tier) -> int:
+        return self.fee
+
+
+class StubBlockCypherApi:
+    def __init__(self):
+        self.pushed = []
+
+    async def _push_raw_transaction(self, tx_hex: str) -> str:
+        self.pushed.append(tx_hex)
+        return "hash"
+
+
+def utxo(index: int, value: int, address: str) -> Utxo:
+    return Utxo(txid=f"{index:064x}", vout=0, value=value, address=address)
+
+
+def make_bitcoin(utxos: list[Utxo], fee: int = 2000) -> Bitcoin:
+    return Bitcoin(
+        block_chair_api=None,
+        block_cypher_api=StubBlockCypherApi(),
+        utxo_set=StubUtxoSet(utxos),
+        fee_oracle=StubFeeOracle(fee)
+    )
+
+
+def consolidate(bitcoin: Bitcoin, amounts: dict[str, int], max_inputs: int = 10, max_fee_rate: float = 10):
+    return asyncio.run(bitcoin.consolidate(
+        private_keys=dict(zip(ADDRESSES, PRIVATE_KEYS)),
+        amounts=amounts,
+        destination_address=DESTINATION,
+        max_inputs=max_inputs,
+        max_fee_rate=max_fee_rate
+    ))
+
+
+def test_select_deposit_utxos_takes_oldest_covering_outputs():
+    utxos = [utxo(0, 4000, FIRST), utxo(1, 3000, FIRST), utxo(2, 5000, FIRST), utxo(3, 1000, SECOND)]
+
+    selected = Bitcoin._select_deposit_utxos(utxos, {FIRST: 6000, SECOND: 2000})
+
+    # третий выход FIRST пришёл после сканирования и не трогается, SECOND не покрывает пополнение
+    assert selected == {FIRST: utxos[:2]}
+
+
+def test_consolidate_spends_only_deposit_outputs():
+    utxos = [utxo(0, 4000, FIRST), utxo(1, 5000, FIRST), utxo(2, 3000, SECOND)]
+    bitcoin = make_bitcoin(utxos)
+
+    result = consolidate(bitcoin, {FIRST: 4000, SECOND: 3000})
+
+    assert result == ("hash", {FIRST: 4000, SECOND: 3000})
+    assert bitcoin._utxo_set.spent == [([utxos[0], utxos[2]], "hash")]
+    assert len(bitcoin._block_cypher_api.pushed) == 1
+
+
+def test_consolidate_syncs_addresses_without_outputs():
+    bitcoin = make_bitcoin([utxo(0, 4000, FIRST)])
+
+    result = consolidate(bitcoin, {FIRST: 4000, SECOND: 3000})
+
+    assert bitcoin._utxo_set.synced == [[SECOND]]
+    assert result == ("hash", {FIRST: 4000})
+
+
+def test_consolidate_keeps_address_whole_within_max_inputs():
+    utxos = [utxo(0, 2000, FIRST), utxo(1, 2000, FIRST), utxo(2, 3000, SECOND)]
+    bitcoin = make_bitcoin(utxos)
+
+    result = consolidate(bitcoin, {FIRST: 4000, SECOND: 3000}, max_inputs=2)
+
+    # FIRST занимает оба входа, SECOND ждёт следующего запуска
+    assert result == ("hash", {FIRST: 4000})
+
+
+def test_consolidate_deferred_when_network_is_expensive():
+    bitcoin = make_bitcoin([utxo(0, 4000, FIRST)], fee=20000)
+
+    assert consolidate(bitcoin, {FIRST: 4000}) is None
+    assert bitcoin._block_cypher_api.pushed == []
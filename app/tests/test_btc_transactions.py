@@ -0,0 +1,112 @@
+import hashlib
+
+import pytest
+
+from bitcoin import bin_hash160
+
+from app.exceptions import btc_exceptions
+from app.services.crypto.btc import (
+    BitcoinTransactionBuilder, BranchAndBound, LargestFirst, Utxo, _p2pkh_script
+)
+
+# BIP143, пример P2SH-P2WPKH: одна транзакция с одним segwit входом
+VECTOR_PRIVATE_KEY = "eb696a065ef48a2192da5b28b694f87544b30fae8327c4510137a922f32c6dcf"
+VECTOR_PUBLIC_KEY = "03ad1d8e89212f0b92c74d23bb710c00662ad1470198ac48c43f7d6f93a2a26873"
+VECTOR_OUTPOINT_HASH = "db6b1b20aa0fd7b23880be2ecbd4a98130974cf4748fb66092ac4d3ceb1a5477"
+VECTOR_OUTPUTS = [
+    (bytes.fromhex("76a914a457b684d7f0d539a46a45bbc043f35b59d0d96388ac"), 199996600),
+    (bytes.fromhex("76a914fd270b1ee6abcaea97fea7ad0402e8bd8ad6d77c88ac"), 800000000),
+]
+VECTOR_UNSIGNED = (
+    "0100000001db6b1b20aa0fd7b23880be2ecbd4a98130974cf4748fb66092ac4d3ceb1a54770100000000feffffff02b8b4eb0b0000"
+    "00001976a914a457b684d7f0d539a46a45bbc043f35b59d0d96388ac0008af2f000000001976a914fd270b1ee6abcaea97fea7ad04"
+    "02e8bd8ad6d77c88ac92040000"
+)
+VECTOR_SIGHASH = "64f3b0f4dd2bb3aa1ce8566d220cc74dda9df97d8490cc81d89d735c92e59fb6"
+VECTOR_SIGNATURE = (
+    "3044022047ac8e878352d3ebbde1c94ce3a10d057c24175747116f8288e5d794d12d482f0220217f36a485cae903c713331d877c1f"
+    "64677e3622ad4010726870540656fe9dcb01"
+)
+
+
+class VectorBuilder(BitcoinTransactionBuilder):
+    """
+        Поля транзакции из вектора BIP143, у BitcoinTransactionBuilder они другие.
+    """
+    VERSION = (1).to_bytes(4, "little")
+    SEQUENCE = bytes.fromhex("feffffff")
+    LOCKTIME = (1170).to_bytes(4, "little")
+
+
+def vector_utxo(address: str) -> Utxo:
+    return Utxo(txid=bytes.fromhex(VECTOR_OUTPOINT_HASH)[::-1].hex(), vout=1, value=1000000000, address=address)
+
+
+def test_segwit_sighash_matches_bip143():
+    builder = VectorBuilder()
+    script_code = _p2pkh_script(bin_hash160(bytes.fromhex(VECTOR_PUBLIC_KEY)))
+
+    sighash = builder._segwit_sighash([vector_utxo("")], VECTOR_OUTPUTS, 0, script_code)
+
+    assert sighash.hex() == VECTOR_SIGHASH
+
+
+def test_build_signs_p2wpkh_input():
+    builder = VectorBuilder()
+    address = builder.p2wpkh_address(VECTOR_PUBLIC_KEY)
+
+    txid, raw = builder.build([vector_utxo(address)], VECTOR_OUTPUTS, {address: VECTOR_PRIVATE_KEY})
+
+    # witness: маркер и флаг после версии, подпись и ключ перед locktime; подпись детерминирована (RFC6979)
+    witness = "02" + "47" + VECTOR_SIGNATURE + "21" + VECTOR_PUBLIC_KEY
+    assert raw == VECTOR_UNSIGNED[:8] + "0001" + VECTOR_UNSIGNED[8:-8] + witness + VECTOR_UNSIGNED[-8:]
+    # txid считается без witness
+    unsigned = bytes.fromhex(VECTOR_UNSIGNED)
+    assert txid == hashlib.sha256(hashlib.sha256(unsigned).digest()).digest()[::-1].hex()
+
+
+BUILDER = BitcoinTransactionBuilder()
+ADDRESS = BUILDER.p2wpkh_address(VECTOR_PUBLIC_KEY)
+
+
+def make_utxos(*values: int) -> list[Utxo]:
+    return [Utxo(txid=f"{index:064x}", vout=0, value=value, address=ADDRESS) for index, value in enumerate(values)]
+
+
+@pytest.mark.parametrize("selection", [BranchAndBound(), LargestFirst()])
+def test_selection_exact_match(selection):
+    utxos = make_utxos(5000, 3000, 2000)
+
+    selected = selection.select(utxos, 8000, 0, 0, 0, BUILDER)
+
+    assert sorted(utxo.value for utxo in selected) == [3000, 5000]
+
+
+def test_branch_and_bound_avoids_change():
+    utxos = make_utxos(6000, 5000, 3000)
+
+    # 6000 дал бы сдачу, 5000 + 3000 закрывают цель точно
+    selected = BranchAndBound().select(utxos, 8000, 0, 0, 0, BUILDER)
+
+    assert sorted(utxo.value for utxo in selected) == [3000, 5000]
+
+
+@pytest.mark.parametrize("selection", [BranchAndBound(), LargestFirst()])
+def test_selection_with_change(selection):
+    utxos = make_utxos(6000, 5000, 1000)
+    fee_rate, base_vsize, change_vsize = 2, 50, 31
+
+    selected = selection.select(utxos, 7000, fee_rate, base_vsize, change_vsize, BUILDER)
+
+    # точного набора нет: BranchAndBound уходит в LargestFirst, сумма покрывает цель и комиссию со сдачей
+    assert [utxo.value for utxo in selected] == [6000, 5000]
+    vsize = base_vsize + change_vsize + sum(BUILDER.input_vsize(utxo.address) for utxo in selected)
+    assert sum(utxo.value for utxo in selected) >= 7000 + fee_rate * vsize
+
+
+@pytest.mark.parametrize("selection", [BranchAndBound(), LargestFirst()])
+def test_selection_insufficient_funds(selection):
+    utxos = make_utxos(3000, 2000)
+
+    with pytest.raises(btc_exceptions.NotEnoughBalance):
+        selection.select(utxos, 5000, 1, 50, 31, BUILDER)
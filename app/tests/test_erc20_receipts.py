@@ -0,0 +1,112 @@
+import asyncio
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.http_client import HttpClient
+from app.services.crypto.base import StatusTransaction
+from app.services.crypto.erc20 import Ethereum
+
+SUCCESS = "0x" + "01" * 32
+FAILED = "0x" + "02" * 32
+MISSING = "0x" + "03" * 32
+ERROR = "0x" + "04" * 32
+BROKEN_BATCH = "0x" + "05" * 32  # весь batch с этим хэшем отвечает 500
+
+
+class JsonRpcStandIn(BaseHTTPRequestHandler):
+    batches = []
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.batches.append(payload)
+        hashes = [item["params"][0] for item in payload]
+        if BROKEN_BATCH in hashes:
+            self.send_response(500)
+            self.end_headers()
+            return
+
+        response = []
+        for item in payload:
+            transaction_id = item["params"][0]
+            if transaction_id == ERROR:
+                response.append({"jsonrpc": "2.0", "id": item["id"], "error": {"code": -32000, "message": "boom"}})
+            elif transaction_id == MISSING:
+                response.append({"jsonrpc": "2.0", "id": item["id"], "result": None})
+            else:
+                status = "0x1" if transaction_id == SUCCESS else "0x0"
+                response.append({"jsonrpc": "2.0", "id": item["id"], "result": {"status": status}})
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    async def __aenter__(self):
+        self.acquired += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+@pytest.fixture
+def rpc_url():
+    JsonRpcStandIn.batches = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), JsonRpcStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def make_ethereum(rpc_url: str) -> Ethereum:
+    return Ethereum(
+        alchemy=None,
+        ethereum_network_url=rpc_url,
+        rpc_http_client=HttpClient(),
+        fee_oracle=None,
+        rpc_batch_size=2
+    )
+
+
+def test_check_transactions_maps_receipts(rpc_url):
+    limiter = CountingLimiter()
+    statuses = asyncio.run(
+        make_ethereum(rpc_url).check_transactions([SUCCESS, FAILED, MISSING, ERROR[2:]], limiter)
+    )
+
+    assert statuses == {
+        SUCCESS: StatusTransaction.success,
+        FAILED: StatusTransaction.failed,
+        MISSING: StatusTransaction.pending,
+        ERROR[2:]: StatusTransaction.pending,
+    }
+    assert [len(batch) for batch in JsonRpcStandIn.batches] == [2, 2]
+    assert limiter.acquired == 2
+
+
+def test_check_transactions_skips_failed_batch(rpc_url):
+    limiter = CountingLimiter()
+    statuses = asyncio.run(
+        make_ethereum(rpc_url).check_transactions([SUCCESS, FAILED, BROKEN_BATCH, MISSING], limiter)
+    )
+
+    # хэши упавшего batch не попадают в результат, остальные batch обработаны
+    assert statuses == {
+        SUCCESS: StatusTransaction.success,
+        FAILED: StatusTransaction.failed,
+    }
+    assert limiter.acquired == 2
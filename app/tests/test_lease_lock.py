@@ -0,0 +1,65 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.exceptions.base import LeaseNotAcquired, LeaseLost
+from app.utils.lease_lock import LeaseLock
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_lease_is_exclusive_and_released(redis):
+    async def run():
+        async with LeaseLock(redis, "job") as lease:
+            with pytest.raises(LeaseNotAcquired):
+                async with LeaseLock(redis, "job"):
+                    pass
+            lease.ensure()
+        async with LeaseLock(redis, "job") as lease:
+            lease.ensure()
+
+    asyncio.run(run())
+    assert not redis.exists("lease:job")
+
+
+def test_fencing_tokens_grow(redis):
+    async def run():
+        tokens = []
+        for _ in range(3):
+            async with LeaseLock(redis, "job") as lease:
+                tokens.append(lease.token)
+        return tokens
+
+    tokens = asyncio.run(run())
+    assert tokens == sorted(tokens) and len(set(tokens)) == 3
+
+
+def test_lease_is_renewed_while_held(redis):
+    async def run():
+        async with LeaseLock(redis, "job", ttl=0.3) as lease:
+            await asyncio.sleep(0.6)
+            lease.ensure()
+
+    asyncio.run(run())
+
+
+def test_ensure_fails_after_lease_taken_over(redis):
+    async def run():
+        async with LeaseLock(redis, "job", ttl=0.3) as lease:
+            # аренда истекла и досталась следующему воркеру с новым токеном
+            redis.set("lease:job", lease.token + 1)
+            with pytest.raises(LeaseLost):
+                lease.ensure()
+            # возврат ключа не восстанавливает потерянную аренду
+            redis.set("lease:job", lease.token)
+            with pytest.raises(LeaseLost):
+                lease.ensure()
+            redis.set("lease:job", lease.token + 1)
+        # чужая аренда при выходе не снимается
+        assert redis.get("lease:job") == str(lease.token + 1)
+
+    asyncio.run(run())
@@ -0,0 +1,146 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+import requests
+
+from eth_account import Account
+
+from app.core.http_client import HttpClient
+from app.services.crypto.erc20 import Ethereum
+from app.services.nonce_manager import NonceManager
+
+PRIVATE_KEY = "0x" + "11" * 32
+ADDRESS = Account.from_key(PRIVATE_KEY).address
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def make_manager(redis, **kwargs) -> NonceManager:
+    return NonceManager(redis, [ADDRESS], **kwargs)
+
+
+def inflight(redis) -> dict:
+    return redis.hgetall(f"nonce:{ADDRESS.lower()}:inflight")
+
+
+def test_reserve_starts_from_chain_nonce(redis):
+    manager = make_manager(redis)
+
+    assert not manager.is_initialized(ADDRESS)
+    assert [manager.reserve(ADDRESS, 7), manager.reserve(ADDRESS), manager.reserve(ADDRESS)] == [7, 8, 9]
+    # после первой выдачи nonce сети состояние не перезаписывает
+    assert manager.is_initialized(ADDRESS)
+    assert manager.reserve(ADDRESS, 3) == 10
+
+
+def test_release_returns_nonce_first(redis):
+    manager = make_manager(redis)
+    first, second = manager.reserve(ADDRESS, 0), manager.reserve(ADDRESS)
+
+    manager.release(ADDRESS, first)
+
+    assert manager.reserve(ADDRESS) == first
+    assert manager.reserve(ADDRESS) == second + 1
+
+
+def test_confirm_moves_nonce_in_flight(redis):
+    manager = make_manager(redis)
+    nonce = manager.reserve(ADDRESS, 0)
+
+    manager.confirm(ADDRESS, nonce, "0xaa", {"nonce": nonce})
+
+    assert redis.hgetall(f"nonce:{ADDRESS.lower()}:reserved") == {}
+    assert json.loads(inflight(redis)[str(nonce)])["transaction_ids"] == ["0xaa"]
+
+
+def test_sync_drops_mined_and_returns_replaced(redis):
+    manager = make_manager(redis)
+    for nonce in range(3):
+        manager.reserve(ADDRESS, 0)
+        manager.confirm(ADDRESS, nonce, f"0x{nonce}", {"nonce": nonce})
+    manager.replace(ADDRESS, 1, "0x1b", {"nonce": 1})
+
+    mined = manager.sync(ADDRESS, 2)
+
+    # вернулась только заменявшаяся запись: в сеть могла попасть любая её версия
+    assert [record["transaction_ids"] for record in mined] == [["0x1", "0x1b"]]
+    assert list(inflight(redis)) == ["2"]
+
+
+def test_sync_frees_stale_reserves_and_moves_next_to_chain(redis):
+    # любой резерв считается зависшим
+    manager = make_manager(redis, reserve_timeout=-1)
+    for _ in range(3):
+        manager.reserve(ADDRESS, 0)
+
+    manager.sync(ADDRESS, 1)
+
+    # nonce 0 замайнен, 1 и 2 не отправлены и выдаются заново
+    assert [manager.reserve(ADDRESS) for _ in range(3)] == [1, 2, 3]
+
+    manager.sync(ADDRESS, 10)
+    assert manager.reserve(ADDRESS) == 10
+
+
+def make_ethereum(manager: NonceManager) -> Ethereum:
+    return Ethereum(
+        alchemy=None,
+        ethereum_network_url="http://127.0.0.1:1",
+        rpc_http_client=HttpClient(),
+        fee_oracle=None,
+        nonce_manager=manager
+    )
+
+
+def make_transaction(nonce: int) -> dict:
+    return {
+        "type": 2,
+        "chainId": 1,
+        "nonce": nonce,
+        "to": ADDRESS,
+        "value": 1,
+        "gas": 21000,
+        "maxFeePerGas": 2 * 10 ** 9,
+        "maxPriorityFeePerGas": 10 ** 9,
+    }
+
+
+def send(ethereum: Ethereum, nonce: int) -> str:
+    return asyncio.run(ethereum._sign_and_send(make_transaction(nonce), PRIVATE_KEY, ADDRESS))
+
+
+def test_rejected_transaction_releases_nonce(redis, monkeypatch):
+    manager = make_manager(redis)
+    ethereum = make_ethereum(manager)
+    nonce = manager.reserve(ADDRESS, 0)
+
+    def reject(raw_transaction):
+        raise ValueError({"code": -32000, "message": "insufficient funds for gas * price + value"})
+
+    monkeypatch.setattr(ethereum.network.eth, "send_raw_transaction", reject)
+    with pytest.raises(ValueError):
+        send(ethereum, nonce)
+
+    assert inflight(redis) == {}
+    assert manager.reserve(ADDRESS) == nonce
+
+
+def test_ambiguous_failure_keeps_nonce_in_flight(redis, monkeypatch):
+    manager = make_manager(redis)
+    ethereum = make_ethereum(manager)
+    nonce = manager.reserve(ADDRESS, 0)
+
+    def timeout(raw_transaction):
+        raise requests.exceptions.ReadTimeout("timed out")
+
+    monkeypatch.setattr(ethereum.network.eth, "send_raw_transaction", timeout)
+    txn_hash = send(ethereum, nonce)
+
+    # транзакция могла дойти до ноды: nonce не выдаётся повторно, её сверит sync_nonces
+    assert json.loads(inflight(redis)[str(nonce)])["transaction_ids"] == [txn_hash]
+    assert manager.reserve(ADDRESS) == nonce + 1
@@ -0,0 +1,38 @@
+import uuid
+
+from sqlalchemy.dialects import postgresql
+
+from app.models.transactions import CryptoTransaction
+from app.repository.base import values_update
+
+Status = CryptoTransaction.StatusCryptoTransaction
+
+
+def compile_sql(mappings: list[dict]) -> str:
+    statement = values_update(CryptoTransaction, mappings)
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_values_update_is_one_statement():
+    sql = compile_sql([
+        {"id": uuid.UUID(int=1), "status": Status.success},
+        {"id": uuid.UUID(int=2), "status": Status.fail},
+    ])
+
+    assert sql == (
+        "UPDATE cryptocurrencytransactions SET status=CAST(data.status AS statuscryptotransaction) "
+        "FROM (VALUES ('00000000-0000-0000-0000-000000000001', 'success'), "
+        "('00000000-0000-0000-0000-000000000002', 'fail')) AS data (id, status) "
+        "WHERE cryptocurrencytransactions.id = CAST(data.id AS UUID)"
+    )
+
+
+def test_values_update_takes_columns_from_first_mapping():
+    sql = compile_sql([
+        {"id": uuid.UUID(int=1), "status": Status.fail, "text": "boom"},
+        {"id": uuid.UUID(int=2), "status": Status.success, "text": None},
+    ])
+
+    assert "AS data (id, status, text)" in sql
+    assert "SET status=CAST(data.status AS statuscryptotransaction), text=CAST(data.text AS VARCHAR)" in sql
+    assert "('00000000-0000-0000-0000-000000000002', 'success', NULL)" in sql